@@ -1,27 +1,41 @@
 # app.py
 
 import os
-import json
+import time
 from typing import Any, Tuple
 
 import streamlit as st
 from dotenv import load_dotenv
-from pydantic import SecretStr
 
-from langchain_openai import OpenAIEmbeddings
-from langchain_postgres import PGVector
-from langchain_core.prompts import PromptTemplate
-
-from app.kualitatif.core.data import SKJ_DATA, QUESTIONS_DATA
-from app.kualitatif.core.llm import llm
+from app.kualitatif.core.catalog import PAGE_SIZE, get_catalog
+from app.kualitatif.core.embeddings import EMBEDDING_MODEL, get_embeddings
+from app.kualitatif.core.ingest import PERMENPAN_COLLECTION, SKJ_COLLECTION
+from app.kualitatif.core.retrieval import DualCollectionRetriever
+from app.kualitatif.core.local_index import load_local_retrievers
+from app.kualitatif.core.assessment import stream_answer_rag_structured, stream_answer_rag_free
+from app.kualitatif.core.packing import RETRIEVAL_CANDIDATES
+from app.kualitatif.core.profile import assess_profile, stream_gap_analysis
+from app.kualitatif.core.reembed import model_mismatches
+from app.kualitatif.core.results import AssessmentResult
+from app.kualitatif.core.batch import (
+    BATCH_MAX_WORKERS,
+    BATCH_RPM,
+    BATCH_WORKERS,
+    BatchRunner,
+    BatchStore,
+    export_bytes,
+    job_id_for,
+    read_table,
+    validate_table,
+)
 
 # ================== CONFIG & SETUP ==================
 
 load_dotenv()
 
-OPENROUTER_API_KEY = os.getenv("API_KEY")
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "qwen/qwen3-embedding-8b")
 DATABASE_URL = os.getenv("VECTOR_DB_URL")
+# "pgvector" (default) atau "local" (index mmap hasil `python -m app.kualitatif.core.local_index export`)
+RETRIEVER_BACKEND = os.getenv("RAG_RETRIEVER_BACKEND", "pgvector")
 
 st.set_page_config(
     page_title="Demo Penilaian Kompetensi ASN",
@@ -33,158 +47,59 @@ st.markdown(
     "<h2 style='color:#3C6CE7;'>🧭 Sistem Penilaian Kualitatif</h2>",
     unsafe_allow_html=True,
 )
-st.caption("Mode Asesmen: Soal terstruktur & kasus/jawaban bebas")
-
-
-# ================== PROMPT DEFINITIONS ==================
-
-PROMPT_STRUCTURED = PromptTemplate(
-    template="""
-ANDA ADALAH ASESOR KOMPETENSI ASN BERDASARKAN:
-- PERMENPAN RB No. 38 Tahun 2017
-- STANDAR KOMPETENSI JABATAN (SKJ) UNTUK JABATAN TERKAIT
-
-KONTEKS PERMENPAN (STRUKTUR KOMPETENSI & LEVEL 1–5):
-{context_permenpan}
-
-KONTEKS SKJ (UNTUK JABATAN & KOMPETENSI INI):
-{context_skj}
-
-DATA KASUS:
-- Nama: {nama}
-- Jabatan: {jabatan}
-- Kompetensi yang Dinilai: {kompetensi}
-- Level Target Jabatan: {level_target}
-- Soal: {soal}
-- Jawaban Peserta: {jawaban}
-
-TUGAS ANDA:
-1. Baca konteks PermenPAN dan SKJ di atas.
-2. Petakan perilaku dalam jawaban peserta ke LEVEL KOMPETENSI 1–5.
-3. Bandingkan level aktual dengan level target jabatan.
-4. Berikan rekomendasi pengembangan yang spesifik.
-
-ATURAN PENILAIAN (RINGKAS):
-- Level 1: Perilaku dasar, belum konsisten.
-- Level 2: Mulai konsisten, masih butuh banyak arahan.
-- Level 3: Kompeten & cukup mandiri pada situasi umum.
-- Level 4: Menjadi rujukan/teladan di unitnya.
-- Level 5: Role model organisasi, dampak luas.
-
-FORMAT OUTPUT (WAJIB, JANGAN TAMBAH LABEL LAIN):
-LEVEL_PREDIKSI: [1-5] /n
-RINGKASAN_PERILAKU: [...]
-ALASAN: [...]
-GAP: [di bawah / sesuai / di atas level_target + alasan singkat]
-REKOMENDASI: [...]
-
-HASIL PENILAIAN:
-""",
-    input_variables=[
-        "context_permenpan",
-        "context_skj",
-        "nama",
-        "jabatan",
-        "kompetensi",
-        "level_target",
-        "soal",
-        "jawaban",
-    ],
-)
+st.caption("Mode Asesmen: Soal terstruktur, kasus/jawaban bebas & batch (satu kohort)")
 
-PROMPT_FREE = PromptTemplate(
-    template="""
-ANDA ADALAH ASESOR KOMPETENSI ASN BERDASARKAN:
-- PERMENPAN RB No. 38 Tahun 2017
-- STANDAR KOMPETENSI JABATAN (SKJ) UNTUK JABATAN TERKAIT
-
-KONTEKS PERMENPAN (STRUKTUR KOMPETENSI & LEVEL 1–5):
-{context_permenpan}
-
-KONTEKS SKJ (UNTUK JABATAN & KOMPETENSI INI):
-{context_skj}
-
-DATA KASUS BEBAS:
-- Nama: {nama}
-- Jabatan: {jabatan}
-- Kompetensi yang Dinilai: {kompetensi}
-- Level Target Jabatan: {level_target}
-- Deskripsi Situasi/Kasus: {kasus}
-- Jawaban/Perilaku Peserta: {jawaban}
-
-TUGAS ANDA:
-1. Baca konteks resmi dan data kasus bebas di atas.
-2. Identifikasi perilaku utama peserta.
-3. Petakan perilaku peserta ke LEVEL KOMPETENSI 1–5.
-4. Bandingkan level aktual dengan level target jabatan.
-5. Berikan rekomendasi pengembangan yang spesifik dan realistis.
-
-FORMAT OUTPUT (WAJIB, JANGAN TAMBAH LABEL LAIN):
-LEVEL_PREDIKSI: [1-5]
-RINGKASAN_PERILAKU: [...]
-ALASAN: [...]
-GAP: [di bawah / sesuai / di atas level_target + alasan singkat]
-REKOMENDASI: [...]
-
-HASIL PENILAIAN:
-""",
-    input_variables=[
-        "context_permenpan",
-        "context_skj",
-        "nama",
-        "jabatan",
-        "kompetensi",
-        "level_target",
-        "kasus",
-        "jawaban",
-    ],
-)
 
 # ================== HELPER: LOAD RETRIEVERS ==================
 
-@st.cache_resource(show_spinner="Menghubungkan ke PGVector (PermenPAN & SKJ)...")
+@st.cache_resource(show_spinner="Memuat retriever (PermenPAN & SKJ)...")
 def load_retrievers() -> Tuple[Any | None, Any | None]:
     """
     Connect ke Postgres PGVector.
     Asumsi: Data sudah di-ingest ke tabel vector dengan collection_name:
     1. 'permenpan_index'
     2. 'skj_index'
+    (lihat `python -m app.kualitatif.core.ingest all`)
     """
-    
+
+    if RETRIEVER_BACKEND == "local":
+        try:
+            return load_local_retrievers(get_embeddings(), k=RETRIEVAL_CANDIDATES)
+        except (OSError, ValueError) as e:
+            st.error(f"Gagal memuat index vektor lokal: {e}")
+            st.info("Jalankan `python -m app.kualitatif.core.local_index export` atau set RAG_RETRIEVER_BACKEND=pgvector.")
+            return None, None
+
     if not DATABASE_URL:
         st.error("DATABASE_URL tidak ditemukan di .env")
         return None, None
 
-    embeddings = OpenAIEmbeddings(
-        api_key=SecretStr(OPENROUTER_API_KEY),
-        base_url="https://openrouter.ai/api/v1",
-        model=EMBEDDING_MODEL,
-    )
+    # Satu instance (dengan cache) dipakai kedua store -> query identik hanya di-embed sekali
+    embeddings = get_embeddings()
 
     permenpan_retriever = None
     skj_retriever = None
 
     try:
-        # --- PERUBAHAN 3: Inisialisasi PGVector Store ---
-        
-        # 1. Load PermenPAN Store
-        permenpan_store = PGVector(
-            embeddings=embeddings,
-            collection_name="permenpan_index",
-            connection=DATABASE_URL,
-            use_jsonb=True,
-        )
-        permenpan_retriever = permenpan_store.as_retriever(search_kwargs={"k": 4})
-
-        # 2. Load SKJ Store
-        skj_store = PGVector(
-            embeddings=embeddings,
-            collection_name="skj_index",
-            connection=DATABASE_URL,
-            use_jsonb=True,
+        # Kedua store dikelola satu DualCollectionRetriever, supaya pencarian PermenPAN & SKJ
+        # bisa jalan bersamaan (mode async / satu SQL, lihat RAG_RETRIEVAL_MODE)
+        dual = DualCollectionRetriever(
+            DATABASE_URL,
+            embeddings,
+            collections=(PERMENPAN_COLLECTION, SKJ_COLLECTION),
+            # Kandidat lebih banyak dari yang masuk prompt; dipadatkan di core/packing.py
+            k=RETRIEVAL_CANDIDATES,
         )
-        skj_retriever = skj_store.as_retriever(search_kwargs={"k": 4})
-        
+        permenpan_retriever = dual.retriever(PERMENPAN_COLLECTION)
+        skj_retriever = dual.retriever(SKJ_COLLECTION)
+
+        stale = model_mismatches(DATABASE_URL, EMBEDDING_MODEL)
+        if stale:
+            st.warning(
+                f"Model embedding koleksi tidak cocok / tidak tercatat: {', '.join(stale)}. Model aktif: {EMBEDDING_MODEL}. "
+                "Jalankan `python -m app.kualitatif.core.reembed`."
+            )
+
     except Exception as e:
         st.error(f"Gagal menghubungkan ke Database PGVector: {e}")
         st.info("Pastikan container Docker PostgreSQL sudah berjalan dan connection string benar.")
@@ -192,182 +107,82 @@ def load_retrievers() -> Tuple[Any | None, Any | None]:
     return permenpan_retriever, skj_retriever
 
 
-def _join_docs(docs) -> str:
-    return "\n\n---\n\n".join(d.page_content for d in docs)
-
-
-# ================== RAG ASSESSMENT FUNCTIONS ==================
-
-def _build_contexts(
-    jabatan_name: str,
-    kompetensi_name: str,
-    query: str,
-    permenpan_retriever: Any | None,
-    skj_retriever: Any | None,
-    komp_info: dict,
-) -> tuple[str, str]:
-    """Ambil konteks PermenPAN & SKJ dari retriever, dengan fallback ke SKJ_DATA."""
-    context_permenpan = ""
-    context_skj = ""
-
-    if permenpan_retriever is not None:
-        docs_p = permenpan_retriever.invoke(query)
-        context_permenpan = _join_docs(docs_p)
-
-    if skj_retriever is not None:
-        docs_s = skj_retriever.invoke(query)
-        context_skj = _join_docs(docs_s)
-
-    # Safety fallback kalau dua-duanya kosong
-    if not context_permenpan and not context_skj:
-        context_skj = json.dumps(
-            {
-                "jabatan": jabatan_name,
-                "kompetensi": kompetensi_name,
-                "deskripsi": komp_info["deskripsi"],
-                "level_target": komp_info["level_target"],
-            },
-            ensure_ascii=False,
-        )
-
-    return context_permenpan, context_skj
-
-
-def assess_answer_rag_structured(
-    jabatan_name: str,
-    kompetensi_name: str,
-    soal_id: str,
-    jawaban_peserta: str,
-    nama_peserta: str,
-    permenpan_retriever: Any | None,
-    skj_retriever: Any | None,
-) -> tuple[str, str, str]:
-    """Mode 1: Soal terstruktur (ambil soal dari QUESTIONS_DATA)."""
-
-    if jabatan_name not in SKJ_DATA:
-        raise ValueError(f"Jabatan '{jabatan_name}' tidak dikenal.")
-
-    skj_info = SKJ_DATA[jabatan_name]
-    if kompetensi_name not in skj_info["kompetensi"]:
-        raise ValueError(f"Kompetensi '{kompetensi_name}' tidak ada di jabatan '{jabatan_name}'.")
-
-    komp = skj_info["kompetensi"][kompetensi_name]
-    level_target = komp["level_target"]
-
-    # Ambil soal
-    soal_list = QUESTIONS_DATA.get(jabatan_name, {}).get(kompetensi_name, [])
-    if not soal_list:
-        raise ValueError(f"Tidak ada soal untuk jabatan '{jabatan_name}', kompetensi '{kompetensi_name}'.")
-
-    try:
-        soal_obj = next(s for s in soal_list if s["id_soal"] == soal_id)
-    except StopIteration:
-        raise ValueError(f"Soal dengan id '{soal_id}' tidak ditemukan.")
-
-    soal_text = soal_obj["teks"]
-
-    # Query untuk RAG
-    query = (
-        f"Jabatan: {jabatan_name}. Kompetensi: {kompetensi_name}. "
-        f"Soal: {soal_text}. Jawaban: {jawaban_peserta}."
-    )
-
-    context_permenpan, context_skj = _build_contexts(
-        jabatan_name, kompetensi_name, query, permenpan_retriever, skj_retriever, komp
-    )
+def show_level(slot, level: int, level_target: int) -> None:
+    """Dipanggil begitu LEVEL_PREDIKSI muncul di stream (sebelum output selesai)."""
+    slot.metric("Level Prediksi", level, delta=level - level_target)
 
-    chain = PROMPT_STRUCTURED | llm
-
-    result = chain.invoke(
-        {
-            "context_permenpan": context_permenpan,
-            "context_skj": context_skj,
-            "nama": nama_peserta,
-            "jabatan": jabatan_name,
-            "kompetensi": kompetensi_name,
-            "level_target": str(level_target),
-            "soal": soal_text,
-            "jawaban": jawaban_peserta,
-        }
-    )
 
-    return result.content, context_permenpan, context_skj
+def render_result(result: AssessmentResult, level_target: int, stream=None) -> None:
+    """Ringkasan setelah stream selesai: waktu, status cache/parse, dan hasil terstruktur."""
+    if stream is not None and stream.ttft_s is not None:
+        st.caption(f"⏱️ Token pertama {stream.ttft_s:.2f} detik · selesai {stream.total_s:.2f} detik")
+    if result.cached:
+        st.caption("♻️ Hasil tersimpan untuk input identik (tanpa panggilan LLM ulang).")
+    if not result.parsed:
+        st.warning("Format output LLM tidak bisa di-parse; hasil tidak disimpan.")
+        return
+    with st.expander("🧩 Hasil terstruktur"):
+        st.markdown(f"**Level prediksi:** {result.level_prediksi} (target {level_target})")
+        st.markdown(f"**Ringkasan perilaku:** {result.ringkasan_perilaku}")
+        st.markdown(f"**Alasan:** {result.alasan}")
+        st.markdown(f"**Gap:** {result.gap}")
+        st.markdown(f"**Rekomendasi:** {result.rekomendasi}")
 
 
-def assess_answer_rag_free(
-    jabatan_name: str,
-    kompetensi_name: str,
-    kasus_text: str,
-    jawaban_peserta: str,
-    nama_peserta: str,
-    permenpan_retriever: Any | None,
-    skj_retriever: Any | None,
-) -> tuple[str, str, str]:
-    """Mode 2: Kasus / jawaban bebas (user isi sendiri kasus & jawaban)."""
+def render_chunks_used(result: AssessmentResult) -> None:
+    rows = [{"slot": slot, **c} for slot, chunks in (result.chunks_used or {}).items() for c in chunks]
+    if rows:
+        st.markdown("**Chunk yang dipakai (setelah dedup, rerank & budget token):**")
+        st.dataframe(rows, use_container_width=True)
 
-    if jabatan_name not in SKJ_DATA:
-        raise ValueError(f"Jabatan '{jabatan_name}' tidak dikenal.")
 
-    skj_info = SKJ_DATA[jabatan_name]
-    if kompetensi_name not in skj_info["kompetensi"]:
-        raise ValueError(f"Kompetensi '{kompetensi_name}' tidak ada di jabatan '{jabatan_name}'.")
+@st.cache_resource
+def get_batch_store() -> BatchStore:
+    return BatchStore()
 
-    komp = skj_info["kompetensi"][kompetensi_name]
-    level_target = komp["level_target"]
 
-    # Query untuk RAG
-    query = (
-        f"Jabatan: {jabatan_name}. Kompetensi: {kompetensi_name}. "
-        f"Kasus: {kasus_text}. Jawaban: {jawaban_peserta}."
-    )
-
-    context_permenpan, context_skj = _build_contexts(
-        jabatan_name, kompetensi_name, query, permenpan_retriever, skj_retriever, komp
-    )
-
-    chain = PROMPT_FREE | llm
-
-    result = chain.invoke(
-        {
-            "context_permenpan": context_permenpan,
-            "context_skj": context_skj,
-            "nama": nama_peserta,
-            "jabatan": jabatan_name,
-            "kompetensi": kompetensi_name,
-            "level_target": str(level_target),
-            "kasus": kasus_text,
-            "jawaban": jawaban_peserta,
-        }
-    )
-
-    return result.content, context_permenpan, context_skj
-
-
-# ================== UI STREAMLIT (2 TAB) ==================
+# ================== UI STREAMLIT (4 TAB) ==================
 
 permenpan_retriever, skj_retriever = load_retrievers()
+catalog = get_catalog()
 
 # Pilihan jabatan & kompetensi (global untuk kedua tab)
 col_side, col_main = st.columns([1.1, 3])
 
 with col_side:
     st.subheader("📂 Pilihan Asesmen")
-    jabatan_list = list(SKJ_DATA.keys())
+    # Katalog bisa ribuan jabatan: tampilkan maksimal PAGE_SIZE hasil pencarian (prefix, lalu substring)
+    cari_jabatan = st.text_input("Cari Jabatan", placeholder="Ketik nama jabatan...")
+    jabatan_list = catalog.search_jabatan(cari_jabatan, limit=PAGE_SIZE)
+    if not jabatan_list:
+        st.warning("Jabatan tidak ditemukan.")
+        st.stop()
     jabatan = st.selectbox("Pilih Jabatan", jabatan_list)
+    st.caption(f"{len(jabatan_list)} dari {catalog.count_jabatan()} jabatan")
 
-    kompetensi_list = list(SKJ_DATA[jabatan]["kompetensi"].keys())
-    kompetensi = st.selectbox("Pilih Kompetensi", kompetensi_list)
+    kompetensi_map = catalog.kompetensi(jabatan)
+    if not kompetensi_map:
+        st.warning("Belum ada kompetensi untuk jabatan ini.")
+        st.stop()
+    kompetensi = st.selectbox("Pilih Kompetensi", list(kompetensi_map))
 
-    komp_info = SKJ_DATA[jabatan]["kompetensi"][kompetensi]
+    komp_info = kompetensi_map[kompetensi]
 
 with col_main:
-    tab1, tab2 = st.tabs(["📌 Mode Soal Terstruktur", "📝 Mode Kasus / Jawaban Bebas"])
+    tab1, tab2, tab3, tab4 = st.tabs(
+        ["📌 Mode Soal Terstruktur", "📝 Mode Kasus / Jawaban Bebas", "📦 Mode Batch", "👤 Profil Lengkap"]
+    )
 
     # ===== TAB 1: Soal Terstruktur =====
     with tab1:
         st.markdown("### 📌 Soal Terstruktur")
 
-        soal_list = QUESTIONS_DATA.get(jabatan, {}).get(kompetensi, [])
+        total_soal = catalog.count_soal(jabatan, kompetensi)
+        halaman = 1
+        if total_soal > PAGE_SIZE:
+            n_halaman = -(-total_soal // PAGE_SIZE)
+            halaman = st.number_input(f"Halaman soal (1-{n_halaman})", min_value=1, max_value=n_halaman, value=1)
+        soal_list = catalog.soal_page(jabatan, kompetensi, offset=(halaman - 1) * PAGE_SIZE, limit=PAGE_SIZE)
         if not soal_list:
             st.warning("Belum ada soal untuk kombinasi jabatan & kompetensi ini.")
         else:
@@ -387,30 +202,34 @@ with col_main:
                 if not jawaban_peserta.strip():
                     st.error("Jawaban tidak boleh kosong.")
                 else:
-                    with st.spinner("Menilai jawaban dengan RAG (PermenPAN + SKJ)..."):
-                        try:
-                            hasil, ctx_perm, ctx_skj = assess_answer_rag_structured(
-                                jabatan_name=jabatan,
-                                kompetensi_name=kompetensi,
-                                soal_id=soal["id_soal"],
-                                jawaban_peserta=jawaban_peserta,
-                                nama_peserta=nama_peserta,
-                                permenpan_retriever=permenpan_retriever,
-                                skj_retriever=skj_retriever,
-                            )
-                        except Exception as e:
-                            st.error(f"Terjadi error saat penilaian: {e}")
-                        else:
-                            st.success("Penilaian selesai.")
-                            st.markdown("#### 🎯 Hasil Penilaian")
-                            st.write(hasil)
-
-                            with st.expander("📁 Konteks RAG yang digunakan (PermenPAN + SKJ)"):
-                                st.markdown("**Konteks PermenPAN (potongan):**")
-                                st.text((ctx_perm or "")[:1500] or "[kosong]")
-                                st.markdown("---")
-                                st.markdown("**Konteks SKJ (potongan):**")
-                                st.text((ctx_skj or "")[:1500] or "[kosong]")
+                    try:
+                        st.markdown("#### 🎯 Hasil Penilaian")
+                        level_slot = st.empty()
+                        stream = stream_answer_rag_structured(
+                            jabatan_name=jabatan,
+                            kompetensi_name=kompetensi,
+                            soal_id=soal["id_soal"],
+                            jawaban_peserta=jawaban_peserta,
+                            nama_peserta=nama_peserta,
+                            permenpan_retriever=permenpan_retriever,
+                            skj_retriever=skj_retriever,
+                            on_level=lambda lv: show_level(level_slot, lv, komp_info["level_target"]),
+                        )
+                        st.write_stream(iter(stream))
+                    except Exception as e:
+                        st.error(f"Terjadi error saat penilaian: {e}")
+                    else:
+                        hasil = stream.result
+                        st.success("Penilaian selesai.")
+                        render_result(hasil, komp_info["level_target"], stream)
+
+                        with st.expander("📁 Konteks RAG yang digunakan (PermenPAN + SKJ)"):
+                            st.markdown("**Konteks PermenPAN (potongan):**")
+                            st.text((hasil.context_permenpan or "")[:1500] or "[kosong]")
+                            st.markdown("---")
+                            st.markdown("**Konteks SKJ (potongan):**")
+                            st.text((hasil.context_skj or "")[:1500] or "[kosong]")
+                            render_chunks_used(hasil)
 
     # ===== TAB 2: Kasus / Jawaban Bebas =====
     with tab2:
@@ -432,31 +251,204 @@ with col_main:
             if not kasus_text.strip() or not jawaban_bebas.strip():
                 st.error("Deskripsi kasus dan jawaban tidak boleh kosong.")
             else:
-                with st.spinner("Menilai kasus & jawaban dengan RAG (PermenPAN + SKJ)..."):
-                    try:
-                        hasil2, ctx_perm2, ctx_skj2 = assess_answer_rag_free(
-                            jabatan_name=jabatan,
-                            kompetensi_name=kompetensi,
-                            kasus_text=kasus_text,
-                            jawaban_peserta=jawaban_bebas,
-                            nama_peserta=nama_peserta2,
-                            permenpan_retriever=permenpan_retriever,
-                            skj_retriever=skj_retriever,
-                        )
-                    except Exception as e:
-                        st.error(f"Terjadi error saat penilaian: {e}")
-                    else:
-                        st.success("Penilaian selesai.")
-                        st.markdown("#### 🎯 Hasil Penilaian (Mode Kasus Bebas)")
-                        st.write(hasil2)
-
-                        with st.expander("📁 Konteks RAG yang digunakan (PermenPAN + SKJ)"):
-                            st.markdown("**Konteks PermenPAN (potongan):**")
-                            st.text((ctx_perm2 or "")[:1500] or "[kosong]")
-                            st.markdown("---")
-                            st.markdown("**Konteks SKJ (potongan):**")
-                            st.text((ctx_skj2 or "")[:1500] or "[kosong]")
-
+                try:
+                    st.markdown("#### 🎯 Hasil Penilaian (Mode Kasus Bebas)")
+                    level_slot2 = st.empty()
+                    stream2 = stream_answer_rag_free(
+                        jabatan_name=jabatan,
+                        kompetensi_name=kompetensi,
+                        kasus_text=kasus_text,
+                        jawaban_peserta=jawaban_bebas,
+                        nama_peserta=nama_peserta2,
+                        permenpan_retriever=permenpan_retriever,
+                        skj_retriever=skj_retriever,
+                        on_level=lambda lv: show_level(level_slot2, lv, komp_info["level_target"]),
+                    )
+                    st.write_stream(iter(stream2))
+                except Exception as e:
+                    st.error(f"Terjadi error saat penilaian: {e}")
+                else:
+                    hasil2 = stream2.result
+                    st.success("Penilaian selesai.")
+                    render_result(hasil2, komp_info["level_target"], stream2)
+
+                    with st.expander("📁 Konteks RAG yang digunakan (PermenPAN + SKJ)"):
+                        st.markdown("**Konteks PermenPAN (potongan):**")
+                        st.text((hasil2.context_permenpan or "")[:1500] or "[kosong]")
+                        st.markdown("---")
+                        st.markdown("**Konteks SKJ (potongan):**")
+                        st.text((hasil2.context_skj or "")[:1500] or "[kosong]")
+                        render_chunks_used(hasil2)
+
+
+    # ===== TAB 3: Batch satu kohort =====
+    with tab3:
+        st.markdown("### 📦 Mode Batch (CSV / Excel)")
+        st.caption(
+            "Kolom: `nama`, `jabatan`, `kompetensi`, `jawaban`, dan `soal_id` (soal terstruktur) "
+            "atau `kasus` (kasus bebas). Upload ulang file yang sama untuk melanjutkan job yang terputus."
+        )
+        batch_store = get_batch_store()
+
+        run_job = None
+        uploaded = st.file_uploader("Upload file peserta", type=["csv", "xlsx"], key="batch_file")
+        c_workers, c_rpm = st.columns(2)
+        batch_workers = c_workers.slider("Worker paralel", 1, BATCH_MAX_WORKERS, BATCH_WORKERS, key="batch_workers")
+        batch_rpm = c_rpm.number_input("Batas request / menit", 1, 10_000, BATCH_RPM, key="batch_rpm")
+
+        if uploaded is not None:
+            data = uploaded.getvalue()
+            try:
+                df_input = read_table(uploaded.name, data)
+            except Exception as e:
+                st.error(f"Gagal membaca file: {e}")
+            else:
+                problems = validate_table(df_input)
+                st.dataframe(df_input.head(20), use_container_width=True)
+                if problems:
+                    for msg in problems:
+                        st.error(msg)
+                elif st.button(f"▶️ Nilai {len(df_input)} baris", key="batch_start"):
+                    job_id = job_id_for(data)
+                    batch_store.create_job(job_id, uploaded.name, df_input)
+                    st.session_state["batch_job_id"] = job_id
+                    run_job = job_id
+
+        jobs = batch_store.jobs()
+        if jobs:
+            labels = {
+                j["id"]: f"{j['filename']} – {j['done'] or 0}/{j['total']} selesai, {j['errors'] or 0} error"
+                for j in jobs
+            }
+            ids = list(labels)
+            current = st.session_state.get("batch_job_id")
+            selected = st.selectbox(
+                "Job batch",
+                ids,
+                index=ids.index(current) if current in ids else 0,
+                format_func=lambda i: labels[i],
+                key="batch_job_select",
+            )
+            c_run, c_del = st.columns([1, 1])
+            if c_run.button("🔁 Lanjutkan / ulangi baris gagal", key="batch_resume"):
+                run_job = selected
+            if c_del.button("🗑️ Hapus job", key="batch_delete"):
+                batch_store.delete(selected)
+                st.session_state.pop("batch_job_id", None)
+                st.rerun()
+
+            job = next(j for j in jobs if j["id"] == selected)
+            if run_job == selected and (job["done"] or 0) < job["total"]:
+                st.session_state["batch_job_id"] = selected
+                progress = st.progress(0.0, text="Menyiapkan...")
+                started = time.perf_counter()
+
+                def _on_progress(counts: dict) -> None:
+                    finished = counts.get("done", 0) + counts.get("error", 0)
+                    elapsed = time.perf_counter() - started
+                    progress.progress(
+                        finished / job["total"],
+                        text=f"{finished}/{job['total']} baris ({counts.get('error', 0)} error) · {elapsed:.0f} detik",
+                    )
+
+                runner = BatchRunner(batch_store, permenpan_retriever, skj_retriever, workers=batch_workers, rpm=batch_rpm)
+                counts = runner.run(selected, on_progress=_on_progress)
+                st.success(
+                    f"Batch selesai: {counts.get('done', 0)} dinilai, {counts.get('error', 0)} error "
+                    f"dalam {time.perf_counter() - started:.0f} detik."
+                )
+
+            df_result = batch_store.results(selected)
+            st.dataframe(df_result, use_container_width=True)
+            c_csv, c_xlsx = st.columns(2)
+            c_csv.download_button(
+                "⬇️ Unduh CSV", export_bytes(df_result, "csv"), file_name=f"hasil_{selected}.csv", mime="text/csv"
+            )
+            try:
+                xlsx = export_bytes(df_result, "xlsx")
+            except ImportError:
+                c_xlsx.caption("Ekspor Excel butuh paket `openpyxl`.")
+            else:
+                c_xlsx.download_button(
+                    "⬇️ Unduh Excel",
+                    xlsx,
+                    file_name=f"hasil_{selected}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                )
+
+    # ===== TAB 4: Profil Lengkap =====
+    with tab4:
+        st.markdown(f"### 👤 Profil Lengkap – {jabatan}")
+        st.caption(
+            "Semua kompetensi jabatan dinilai bersamaan, lalu dirangkum dalam satu analisis gap. "
+            "Kompetensi tanpa jawaban dilewati."
+        )
+        nama_profil = st.text_input("Nama Peserta", value="Peserta Demo", key="nama_profil")
+
+        profil_answers = {}
+        for nama_komp, info in kompetensi_map.items():
+            with st.expander(f"{nama_komp} (target level {info['level_target']})"):
+                soal_komp = catalog.soal_page(jabatan, nama_komp, limit=PAGE_SIZE)
+                answer = {}
+                if soal_komp:
+                    pilihan = st.selectbox(
+                        "Soal",
+                        options=[s["id_soal"] for s in soal_komp],
+                        format_func=lambda i, soal_komp=soal_komp: next(
+                            f"{s['id_soal']} – {s['teks'][:100]}" for s in soal_komp if s["id_soal"] == i
+                        ),
+                        key=f"profil_soal_{nama_komp}",
+                    )
+                    answer["soal_id"] = pilihan
+                else:
+                    answer["kasus"] = st.text_area("Deskripsi kasus", height=100, key=f"profil_kasus_{nama_komp}")
+                answer["jawaban"] = st.text_area("Jawaban peserta", height=150, key=f"profil_jawaban_{nama_komp}")
+                if answer["jawaban"].strip():
+                    profil_answers[nama_komp] = answer
+
+        if st.button(f"🧭 Nilai Profil ({len(profil_answers)} kompetensi)", key="profil_start", disabled=not profil_answers):
+            progress = st.progress(0.0, text="Menilai kompetensi...")
+            rows_slot = st.empty()
+            rows = []
+
+            def _on_profile_result(nama_komp, outcome):
+                if isinstance(outcome, Exception):
+                    rows.append({"kompetensi": nama_komp, "level_prediksi": None, "status": f"error: {outcome}"})
+                else:
+                    rows.append(
+                        {
+                            "kompetensi": nama_komp,
+                            "level_prediksi": outcome.level_prediksi,
+                            "level_target": kompetensi_map[nama_komp]["level_target"],
+                            "status": "cache" if outcome.cached else "selesai",
+                        }
+                    )
+                progress.progress(len(rows) / len(profil_answers), text=f"{len(rows)}/{len(profil_answers)} kompetensi")
+                rows_slot.dataframe(rows, use_container_width=True)
+
+            profile = assess_profile(
+                jabatan,
+                nama_profil,
+                profil_answers,
+                permenpan_retriever,
+                skj_retriever,
+                on_result=_on_profile_result,
+            )
+            if profile.assess_s is not None:
+                st.caption(
+                    f"⏱️ {len(profile.results)} kompetensi dalam {profile.assess_s:.2f} detik "
+                    f"(penilaian tunggal paling lambat {profile.slowest_s:.2f} detik)"
+                )
+            for nama_komp, hasil_komp in sorted(profile.results.items()):
+                with st.expander(f"Hasil {nama_komp}: level {hasil_komp.level_prediksi}"):
+                    st.write(hasil_komp.raw)
+
+            if profile.results:
+                st.markdown("#### 📈 Analisis Gap Kompetensi")
+                try:
+                    st.write_stream(stream_gap_analysis(profile))
+                except Exception as e:
+                    st.error(f"Terjadi error saat analisis gap: {e}")
 
 # ===== Sidebar info SKJ ringkas =====
 # with st.sidebar:
@@ -0,0 +1,457 @@
+# core/ann.py - pengelolaan index ANN (HNSW / IVFFlat) untuk koleksi PGVector
+#
+# Tabel langchain_pg_embedding dipakai bersama semua koleksi dan kolom `embedding` bertipe
+# `vector` tanpa dimensi, jadi index dibuat sebagai *partial expression index* per koleksi:
+#   CREATE INDEX ... USING hnsw ((embedding::vector(768)) vector_cosine_ops) WHERE collection_id = '<uuid>'
+# Dimensi > 2000 memakai halfvec (batas index pgvector: 2000 untuk vector, 4000 untuk halfvec).
+# Query yang ingin memakai index harus ORDER BY ekspresi yang sama -> lihat `distance_expr`
+# (dipakai mode retrieval "async" & "sql" di core/retrieval.py).
+#
+# Kuantisasi (RAG_VECTOR_QUANTIZATION): index dibuat atas representasi halfvec atau biner
+# (binary_quantize -> bit, jarak Hamming) yang jauh lebih kecil; pencarian mengambil
+# k * RAG_RESCORE_FACTOR kandidat lewat index itu lalu di-skor ulang secara eksak terhadap vektor
+# float32 asli di tabel (lihat `rescoring_sql`). Biner juga bisa meng-index dimensi > 4000.
+#
+# Contoh:
+#   uv run python -m app.kualitatif.core.ann status
+#   uv run python -m app.kualitatif.core.ann create --method hnsw --m 16 --ef-construction 64
+#   uv run python -m app.kualitatif.core.ann bench --ef-search 10 20 40 80 160 --k 4 --sample 50
+#   uv run python -m app.kualitatif.core.ann bench-quant --quantization none halfvec binary --k 4
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+from app.kualitatif.core.db import psycopg3_url
+from app.kualitatif.core.ingest import PERMENPAN_COLLECTION, SKJ_COLLECTION
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("VECTOR_DB_URL")
+
+ANN_METHODS = ("hnsw", "ivfflat")
+QUANTIZATIONS = ("none", "halfvec", "binary")
+VECTOR_MAX_INDEX_DIM = 2000
+HALFVEC_MAX_INDEX_DIM = 4000
+BIT_MAX_INDEX_DIM = 64000
+
+VECTOR_QUANTIZATION = os.getenv("RAG_VECTOR_QUANTIZATION", "none")
+RESCORE_FACTOR = int(os.getenv("RAG_RESCORE_FACTOR", "8"))   # kandidat = k * ini, lalu skor eksak
+
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 64
+MAINTENANCE_WORK_MEM = "512MB"
+
+# Setting saat query (retriever); None = default server (ef_search 40, probes 1)
+HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "0")) or None
+IVFFLAT_PROBES = int(os.getenv("RAG_IVFFLAT_PROBES", "0")) or None
+
+SQL_COLLECTION_INFO = """
+SELECT c.uuid::text AS uuid,
+       (SELECT count(*) FROM langchain_pg_embedding e WHERE e.collection_id = c.uuid) AS n_rows,
+       (SELECT vector_dims(e.embedding) FROM langchain_pg_embedding e WHERE e.collection_id = c.uuid LIMIT 1) AS dim
+FROM langchain_pg_collection c
+WHERE c.name = :name
+"""
+SQL_EXISTING_INDEXES = """
+SELECT indexname, indexdef, pg_relation_size(format('%I.%I', schemaname, indexname)::regclass) AS bytes
+FROM pg_indexes
+WHERE tablename = 'langchain_pg_embedding' AND indexname LIKE 'ix_lpe_%'
+"""
+
+
+def vector_type(dim: int) -> str:
+    """Tipe cast untuk index & query: vector(dim) atau halfvec(dim) kalau dimensinya besar."""
+    if dim <= VECTOR_MAX_INDEX_DIM:
+        return f"vector({dim})"
+    if dim <= HALFVEC_MAX_INDEX_DIM:
+        return f"halfvec({dim})"
+    raise ValueError(
+        f"Dimensi embedding {dim} melebihi batas index pgvector ({HALFVEC_MAX_INDEX_DIM} untuk halfvec). "
+        "Pakai model/dimensi embedding yang lebih kecil."
+    )
+
+
+def distance_expr(dim: int, param: str = "q") -> str:
+    """Ekspresi jarak cosine yang cocok dengan expression index koleksi berdimensi `dim`."""
+    vt = vector_type(dim)
+    return f"(embedding::{vt} <=> CAST(:{param} AS {vt}))"
+
+
+def _opclass(dim: int) -> str:
+    return "vector_cosine_ops" if dim <= VECTOR_MAX_INDEX_DIM else "halfvec_cosine_ops"
+
+
+def uuid_literal(uuid: str) -> str:
+    """
+    uuid koleksi sebagai literal SQL. Partial index hanya terpakai kalau predikat
+    `collection_id = '<uuid>'` berupa konstanta (bukan parameter plan generik).
+    """
+    if not re.fullmatch(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", uuid):
+        raise ValueError(f"uuid koleksi tidak valid: {uuid}")
+    return f"'{uuid}'::uuid"
+
+
+def index_name(collection: str, method: str, quantization: str = "none") -> str:
+    suffix = {"none": "", "halfvec": "_half", "binary": "_bit"}[quantization]
+    return f"ix_lpe_{re.sub(r'[^a-z0-9_]', '_', collection.lower())}_{method}{suffix}"
+
+
+def _quantized_parts(dim: int, quantization: str) -> tuple[str, str, str, str]:
+    """(ekspresi kolom, ekspresi query, operator, opclass) untuk index terkuantisasi."""
+    if quantization == "binary":
+        if dim > BIT_MAX_INDEX_DIM:
+            raise ValueError(f"Dimensi {dim} melebihi batas index bit ({BIT_MAX_INDEX_DIM}).")
+        return (
+            f"(binary_quantize(embedding)::bit({dim}))",
+            f"binary_quantize(CAST(:q AS vector))::bit({dim})",
+            "<~>",
+            "bit_hamming_ops",
+        )
+    if quantization == "halfvec":
+        if dim > HALFVEC_MAX_INDEX_DIM:
+            raise ValueError(f"Dimensi {dim} melebihi batas index halfvec ({HALFVEC_MAX_INDEX_DIM}); pakai binary.")
+        return f"(embedding::halfvec({dim}))", f"CAST(:q AS halfvec({dim}))", "<=>", "halfvec_cosine_ops"
+    raise ValueError(f"quantization harus salah satu dari {QUANTIZATIONS[1:]}")
+
+
+def rescoring_sql(uuid: str, dim: int, quantization: str, limit_param: str = "k") -> str:
+    """
+    Kandidat (:candidates) lewat index terkuantisasi, lalu diurutkan ulang dengan jarak cosine eksak
+    pada vektor asli. Kolom hasil: id, document, cmetadata, distance.
+    """
+    column, query, op, _ = _quantized_parts(dim, quantization)
+    return (
+        "SELECT id, document, cmetadata, embedding <=> CAST(:q AS vector) AS distance FROM ("
+        "SELECT id, document, cmetadata, embedding FROM langchain_pg_embedding "
+        f"WHERE collection_id = {uuid_literal(uuid)} ORDER BY {column} {op} {query} LIMIT :candidates"
+        f") candidates ORDER BY distance LIMIT :{limit_param}"
+    )
+
+
+def ivfflat_lists(n_rows: int) -> int:
+    # Rekomendasi pgvector: rows/1000 (<= 1 juta baris), sqrt(rows) di atasnya
+    if n_rows <= 1_000_000:
+        return max(10, n_rows // 1000)
+    return int(n_rows ** 0.5)
+
+
+def collection_info(conn, name: str) -> dict | None:
+    r = conn.execute(text(SQL_COLLECTION_INFO), {"name": name}).mappings().first()
+    return dict(r) if r else None
+
+
+def existing_indexes(conn) -> list[dict]:
+    return [dict(r) for r in conn.execute(text(SQL_EXISTING_INDEXES)).mappings()]
+
+
+def create_index_sql(
+    collection: str,
+    uuid: str,
+    dim: int,
+    method: str,
+    n_rows: int = 0,
+    m: int = HNSW_M,
+    ef_construction: int = HNSW_EF_CONSTRUCTION,
+    lists: int | None = None,
+    quantization: str = "none",
+) -> str:
+    if method not in ANN_METHODS:
+        raise ValueError(f"method harus salah satu dari {ANN_METHODS}")
+    if quantization == "none":
+        column, opclass = f"(embedding::{vector_type(dim)})", _opclass(dim)
+    else:
+        column, _, _, opclass = _quantized_parts(dim, quantization)
+    if method == "hnsw":
+        with_ = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+    else:
+        with_ = f"lists = {int(lists or ivfflat_lists(n_rows))}"
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name(collection, method, quantization)} "
+        f"ON langchain_pg_embedding USING {method} ({column} {opclass}) "
+        f"WITH ({with_}) WHERE collection_id = {uuid_literal(uuid)}"
+    )
+
+
+def ensure_index(engine, collection: str, method: str = "hnsw", rebuild: bool = False, quantization: str = "none", **opts) -> dict:
+    """
+    Pastikan partial index ANN untuk koleksi ada (CONCURRENTLY, tidak memblok ingestion/pencarian).
+    Index metode lain untuk koleksi yang sama dihapus supaya planner tidak bingung memilih.
+    """
+    with engine.connect() as conn:
+        info = collection_info(conn, collection)
+    if not info or not info["n_rows"]:
+        return {"collection": collection, "status": "skip (koleksi kosong / tidak ada)"}
+
+    name = index_name(collection, method, quantization)
+    ddl = create_index_sql(collection, info["uuid"], info["dim"], method, info["n_rows"], quantization=quantization, **opts)
+    started = time.perf_counter()
+    # CREATE/DROP INDEX CONCURRENTLY tidak boleh di dalam transaksi
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        conn.execute(text(f"SET maintenance_work_mem = '{MAINTENANCE_WORK_MEM}'"))
+        for other in ANN_METHODS:
+            if other != method or rebuild:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name(collection, other, quantization)}"))
+        conn.execute(text(ddl))
+        conn.execute(text("RESET maintenance_work_mem"))
+        conn.execute(text("ANALYZE langchain_pg_embedding"))
+    return {
+        "collection": collection,
+        "index": name,
+        "rows": info["n_rows"],
+        "dim": info["dim"],
+        "build_s": round(time.perf_counter() - started, 2),
+    }
+
+
+def search_settings(ef_search: int | None = HNSW_EF_SEARCH, probes: int | None = IVFFLAT_PROBES) -> dict:
+    out = {}
+    if ef_search:
+        out["hnsw.ef_search"] = str(int(ef_search))
+    if probes:
+        out["ivfflat.probes"] = str(int(probes))
+    return out
+
+
+def apply_search_settings_sql(settings: dict) -> str | None:
+    """SELECT set_config(..., true) -> berlaku hanya untuk transaksi berjalan."""
+    if not settings:
+        return None
+    return "SELECT " + ", ".join(f"set_config('{k}', '{v}', true)" for k, v in settings.items())
+
+
+def connect_options(settings: dict) -> dict:
+    """connect_args psycopg supaya setting juga berlaku untuk koneksi milik PGVector (mode sequential)."""
+    if not settings:
+        return {}
+    return {"options": " ".join(f"-c {k}={v}" for k, v in settings.items())}
+
+
+# ================== RECALL vs LATENCY BENCHMARK ==================
+
+def _topk_ids(conn, uuid: str, order_expr: str, vector_literal: str, k: int) -> list[str]:
+    rows = conn.execute(
+        text(f"SELECT id FROM langchain_pg_embedding WHERE collection_id = {uuid_literal(uuid)} ORDER BY {order_expr} LIMIT :k"),
+        {"q": vector_literal, "k": k},
+    )
+    return [str(r.id) for r in rows]
+
+
+def benchmark(engine, collection: str, k: int = 4, sample: int = 50, ef_search_grid=(10, 20, 40, 80, 160), probes_grid=(1, 5, 10, 20)) -> dict:
+    """
+    Recall@k (vs pencarian eksak) dan latency per setting ef_search/probes, memakai embedding
+    chunk yang sudah ter-ingest sebagai query (tanpa panggilan embedding).
+    """
+    with engine.connect() as conn:
+        info = collection_info(conn, collection)
+        if not info or not info["n_rows"]:
+            return {"collection": collection, "status": "skip (koleksi kosong / tidak ada)"}
+        method = next(
+            (m for m in ANN_METHODS for ix in existing_indexes(conn) if ix["indexname"] == index_name(collection, m)),
+            None,
+        )
+        queries = [
+            r.v
+            for r in conn.execute(
+                text(
+                    "SELECT embedding::text AS v FROM langchain_pg_embedding "
+                    "WHERE collection_id = CAST(:c AS uuid) ORDER BY random() LIMIT :n"
+                ),
+                {"c": info["uuid"], "n": sample},
+            )
+        ]
+
+        # Ground truth: ekspresi jarak pada kolom mentah tidak cocok dengan expression index -> scan eksak
+        exact, exact_ms = [], []
+        for q in queries:
+            started = time.perf_counter()
+            exact.append(_topk_ids(conn, info["uuid"], "embedding <=> CAST(:q AS vector)", q, k))
+            exact_ms.append((time.perf_counter() - started) * 1000)
+
+    report = {
+        "collection": collection,
+        "rows": info["n_rows"],
+        "dim": info["dim"],
+        "index": method,
+        "k": k,
+        "queries": len(queries),
+        "exact_p50_ms": round(statistics.median(exact_ms), 2) if exact_ms else None,
+        "settings": [],
+    }
+    if method is None:
+        report["status"] = "belum ada index ANN (jalankan `create` dulu)"
+        return report
+
+    grid = [{"hnsw.ef_search": str(v)} for v in ef_search_grid] if method == "hnsw" else [{"ivfflat.probes": str(v)} for v in probes_grid]
+    expr = distance_expr(info["dim"])
+    for settings in grid:
+        recalls, timings = [], []
+        with engine.begin() as conn:
+            conn.execute(text(apply_search_settings_sql(settings)))
+            for q, truth in zip(queries, exact):
+                started = time.perf_counter()
+                got = _topk_ids(conn, info["uuid"], expr, q, k)
+                timings.append((time.perf_counter() - started) * 1000)
+                recalls.append(len(set(got) & set(truth)) / max(len(truth), 1))
+        timings.sort()
+        report["settings"].append(
+            {
+                **settings,
+                "recall_at_k": round(statistics.fmean(recalls), 4),
+                "p50_ms": round(statistics.median(timings), 2),
+                "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+            }
+        )
+    return report
+
+
+# ================== KUANTISASI: UKURAN, BUILD, LATENCY & RECALL ==================
+
+def benchmark_quantization(
+    engine,
+    collection: str,
+    k: int = 4,
+    sample: int = 50,
+    quantizations=QUANTIZATIONS,
+    method: str = "hnsw",
+    rescore_factor: int = RESCORE_FACTOR,
+    rebuild: bool = False,
+) -> dict:
+    """
+    Bandingkan setup sekarang (index float, "none") dengan index halfvec/biner + skor ulang eksak:
+    ukuran index, waktu build, latency p50/p95 dan recall@k terhadap pencarian eksak.
+    Index yang belum ada dibuat dulu (build_s hanya bermakna untuk index yang baru dibuat / --rebuild).
+    """
+    with engine.connect() as conn:
+        info = collection_info(conn, collection)
+        if not info or not info["n_rows"]:
+            return {"collection": collection, "status": "skip (koleksi kosong / tidak ada)"}
+        vector_bytes = conn.execute(
+            text("SELECT sum(pg_column_size(embedding)) FROM langchain_pg_embedding WHERE collection_id = CAST(:c AS uuid)"),
+            {"c": info["uuid"]},
+        ).scalar()
+        queries = [
+            r.v
+            for r in conn.execute(
+                text(
+                    "SELECT embedding::text AS v FROM langchain_pg_embedding "
+                    "WHERE collection_id = CAST(:c AS uuid) ORDER BY random() LIMIT :n"
+                ),
+                {"c": info["uuid"], "n": sample},
+            )
+        ]
+        exact, exact_ms = [], []
+        for q in queries:
+            started = time.perf_counter()
+            exact.append(_topk_ids(conn, info["uuid"], "embedding <=> CAST(:q AS vector)", q, k))
+            exact_ms.append((time.perf_counter() - started) * 1000)
+
+    report = {
+        "collection": collection,
+        "rows": info["n_rows"],
+        "dim": info["dim"],
+        "k": k,
+        "candidates": k * rescore_factor,
+        "queries": len(queries),
+        "vector_bytes": vector_bytes,
+        "exact_p50_ms": round(statistics.median(exact_ms), 2) if exact_ms else None,
+        "quantizations": [],
+    }
+    for quantization in quantizations:
+        row = {"quantization": quantization, "index": index_name(collection, method, quantization)}
+        try:
+            row["build_s"] = ensure_index(engine, collection, method, rebuild=rebuild, quantization=quantization)["build_s"]
+        except ValueError as e:   # dimensi melebihi batas tipe index ini
+            report["quantizations"].append({**row, "status": f"skip ({e})"})
+            continue
+        if quantization == "none":
+            sql = (
+                f"SELECT id FROM langchain_pg_embedding WHERE collection_id = {uuid_literal(info['uuid'])} "
+                f"ORDER BY {distance_expr(info['dim'])} LIMIT :k"
+            )
+        else:
+            sql = f"SELECT id FROM ({rescoring_sql(info['uuid'], info['dim'], quantization)}) r"
+        recalls, timings = [], []
+        with engine.begin() as conn:
+            settings = search_settings()
+            if settings:
+                conn.execute(text(apply_search_settings_sql(settings)))
+            row["index_bytes"] = next(
+                (ix["bytes"] for ix in existing_indexes(conn) if ix["indexname"] == row["index"]), None
+            )
+            for q, truth in zip(queries, exact):
+                started = time.perf_counter()
+                got = [str(r.id) for r in conn.execute(text(sql), {"q": q, "k": k, "candidates": k * rescore_factor})]
+                timings.append((time.perf_counter() - started) * 1000)
+                recalls.append(len(set(got) & set(truth)) / max(len(truth), 1))
+        timings.sort()
+        row.update(
+            recall_at_k=round(statistics.fmean(recalls), 4) if recalls else None,
+            p50_ms=round(statistics.median(timings), 2) if timings else None,
+            p95_ms=round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2) if timings else None,
+        )
+        report["quantizations"].append(row)
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Kelola index ANN (HNSW/IVFFlat) koleksi PGVector PermenPAN & SKJ.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Info koleksi & index yang ada")
+    p_create = sub.add_parser("create", help="Buat / pastikan partial index ANN per koleksi")
+    p_create.add_argument("--method", choices=ANN_METHODS, default="hnsw")
+    p_create.add_argument("--m", type=int, default=HNSW_M)
+    p_create.add_argument("--ef-construction", type=int, default=HNSW_EF_CONSTRUCTION)
+    p_create.add_argument("--lists", type=int, default=None, help="IVFFlat lists (default: rows/1000)")
+    p_create.add_argument("--rebuild", action="store_true")
+    p_create.add_argument("--quantization", choices=QUANTIZATIONS, default=VECTOR_QUANTIZATION)
+    p_bench = sub.add_parser("bench", help="Recall@k vs latency untuk beberapa ef_search/probes")
+    p_bench.add_argument("--k", type=int, default=4)
+    p_bench.add_argument("--sample", type=int, default=50)
+    p_bench.add_argument("--ef-search", type=int, nargs="+", default=[10, 20, 40, 80, 160])
+    p_bench.add_argument("--probes", type=int, nargs="+", default=[1, 5, 10, 20])
+    p_quant = sub.add_parser("bench-quant", help="Ukuran index, build, latency & recall: float vs halfvec vs biner")
+    p_quant.add_argument("--k", type=int, default=4)
+    p_quant.add_argument("--sample", type=int, default=50)
+    p_quant.add_argument("--method", choices=ANN_METHODS, default="hnsw")
+    p_quant.add_argument("--quantization", choices=QUANTIZATIONS, nargs="+", default=list(QUANTIZATIONS))
+    p_quant.add_argument("--rescore-factor", type=int, default=RESCORE_FACTOR)
+    p_quant.add_argument("--rebuild", action="store_true", help="Bangun ulang index supaya build_s terukur")
+    for p in (p_create, p_bench, p_quant):
+        p.add_argument("--collection", nargs="+", default=[PERMENPAN_COLLECTION, SKJ_COLLECTION])
+    args = parser.parse_args(argv)
+    if not DATABASE_URL:
+        print("VECTOR_DB_URL tidak ditemukan di .env", file=sys.stderr)
+        return 1
+
+    engine = create_engine(psycopg3_url(DATABASE_URL))
+    if args.command == "status":
+        with engine.connect() as conn:
+            for name in (PERMENPAN_COLLECTION, SKJ_COLLECTION):
+                print(json.dumps({"collection": name, **(collection_info(conn, name) or {})}, default=str))
+            for ix in existing_indexes(conn):
+                print(json.dumps(ix, default=str))
+        return 0
+    for name in args.collection:
+        if args.command == "create":
+            opts = {"m": args.m, "ef_construction": args.ef_construction, "lists": args.lists}
+            result = ensure_index(engine, name, args.method, rebuild=args.rebuild, quantization=args.quantization, **opts)
+        elif args.command == "bench-quant":
+            result = benchmark_quantization(
+                engine, name, args.k, args.sample, args.quantization, args.method, args.rescore_factor, args.rebuild
+            )
+        else:
+            result = benchmark(engine, name, args.k, args.sample, args.ef_search, args.probes)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
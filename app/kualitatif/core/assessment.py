@@ -0,0 +1,472 @@
+# core/assessment.py - penilaian kompetensi berbasis RAG (PermenPAN + SKJ)
+# Dipakai oleh UI (app/kualitatif/app.py) dan mode batch (core/batch.py).
+import json
+import threading
+import time
+from typing import Any
+
+from langchain_core.documents import Document
+from langchain_core.prompts import PromptTemplate
+from sqlalchemy import create_engine
+
+from app.kualitatif.core.ann import VECTOR_QUANTIZATION
+from app.kualitatif.core.catalog import get_catalog
+from app.kualitatif.core.db import psycopg3_url
+from app.kualitatif.core.embeddings import EMBEDDING_MODEL
+from app.kualitatif.core.ingest import PERMENPAN_COLLECTION, SKJ_COLLECTION, canonical_kompetensi, collection_stamps
+from app.kualitatif.core.llm import get_llm
+from app.kualitatif.core.packing import (
+    CONTEXT_BUDGET_PERMENPAN,
+    CONTEXT_BUDGET_SKJ,
+    RETRIEVAL_CANDIDATES,
+    estimate_tokens,
+    pack_context,
+)
+from app.kualitatif.core.results import (
+    AssessmentResult,
+    get_result_store,
+    input_hash,
+    level_from_partial,
+    llm_identity,
+    parse_with_format_retry,
+    template_version,
+)
+from app.kualitatif.core.retrieval import DATABASE_URL, RETRIEVAL_MODE, retrieve_pair
+from app.kualitatif.core.scope import METADATA_FILTER, scope_filters
+
+CORPUS_STAMP_TTL_S = 30   # versi koleksi PGVector dibaca ulang paling sering tiap sekian detik
+
+
+# ================== PROMPT DEFINITIONS ==================
+
+PROMPT_STRUCTURED = PromptTemplate(
+    template="""
+ANDA ADALAH ASESOR KOMPETENSI ASN BERDASARKAN:
+- PERMENPAN RB No. 38 Tahun 2017
+- STANDAR KOMPETENSI JABATAN (SKJ) UNTUK JABATAN TERKAIT
+
+KONTEKS PERMENPAN (STRUKTUR KOMPETENSI & LEVEL 1–5):
+{context_permenpan}
+
+KONTEKS SKJ (UNTUK JABATAN & KOMPETENSI INI):
+{context_skj}
+
+DATA KASUS:
+- Nama: {nama}
+- Jabatan: {jabatan}
+- Kompetensi yang Dinilai: {kompetensi}
+- Level Target Jabatan: {level_target}
+- Soal: {soal}
+- Jawaban Peserta: {jawaban}
+
+TUGAS ANDA:
+1. Baca konteks PermenPAN dan SKJ di atas.
+2. Petakan perilaku dalam jawaban peserta ke LEVEL KOMPETENSI 1–5.
+3. Bandingkan level aktual dengan level target jabatan.
+4. Berikan rekomendasi pengembangan yang spesifik.
+
+ATURAN PENILAIAN (RINGKAS):
+- Level 1: Perilaku dasar, belum konsisten.
+- Level 2: Mulai konsisten, masih butuh banyak arahan.
+- Level 3: Kompeten & cukup mandiri pada situasi umum.
+- Level 4: Menjadi rujukan/teladan di unitnya.
+- Level 5: Role model organisasi, dampak luas.
+
+FORMAT OUTPUT (WAJIB, JANGAN TAMBAH LABEL LAIN):
+LEVEL_PREDIKSI: [1-5] /n
+RINGKASAN_PERILAKU: [...]
+ALASAN: [...]
+GAP: [di bawah / sesuai / di atas level_target + alasan singkat]
+REKOMENDASI: [...]
+
+HASIL PENILAIAN:
+""",
+    input_variables=[
+        "context_permenpan",
+        "context_skj",
+        "nama",
+        "jabatan",
+        "kompetensi",
+        "level_target",
+        "soal",
+        "jawaban",
+    ],
+)
+
+PROMPT_FREE = PromptTemplate(
+    template="""
+ANDA ADALAH ASESOR KOMPETENSI ASN BERDASARKAN:
+- PERMENPAN RB No. 38 Tahun 2017
+- STANDAR KOMPETENSI JABATAN (SKJ) UNTUK JABATAN TERKAIT
+
+KONTEKS PERMENPAN (STRUKTUR KOMPETENSI & LEVEL 1–5):
+{context_permenpan}
+
+KONTEKS SKJ (UNTUK JABATAN & KOMPETENSI INI):
+{context_skj}
+
+DATA KASUS BEBAS:
+- Nama: {nama}
+- Jabatan: {jabatan}
+- Kompetensi yang Dinilai: {kompetensi}
+- Level Target Jabatan: {level_target}
+- Deskripsi Situasi/Kasus: {kasus}
+- Jawaban/Perilaku Peserta: {jawaban}
+
+TUGAS ANDA:
+1. Baca konteks resmi dan data kasus bebas di atas.
+2. Identifikasi perilaku utama peserta.
+3. Petakan perilaku peserta ke LEVEL KOMPETENSI 1–5.
+4. Bandingkan level aktual dengan level target jabatan.
+5. Berikan rekomendasi pengembangan yang spesifik dan realistis.
+
+FORMAT OUTPUT (WAJIB, JANGAN TAMBAH LABEL LAIN):
+LEVEL_PREDIKSI: [1-5]
+RINGKASAN_PERILAKU: [...]
+ALASAN: [...]
+GAP: [di bawah / sesuai / di atas level_target + alasan singkat]
+REKOMENDASI: [...]
+
+HASIL PENILAIAN:
+""",
+    input_variables=[
+        "context_permenpan",
+        "context_skj",
+        "nama",
+        "jabatan",
+        "kompetensi",
+        "level_target",
+        "kasus",
+        "jawaban",
+    ],
+)
+
+
+# ================== RAG ASSESSMENT FUNCTIONS ==================
+
+def _permenpan_levels_doc(kompetensi_name: str) -> Document | None:
+    """Deskriptor level 1-5 PermenPAN untuk kompetensi ini dari katalog (None kalau belum diekstrak)."""
+    levels = get_catalog().permenpan_levels(canonical_kompetensi(kompetensi_name) or kompetensi_name)
+    if levels is None:
+        return None
+    lines = [f"Kompetensi: {levels['kompetensi']}"]
+    if levels["definisi"]:
+        lines.append(f"Definisi: {levels['definisi']}")
+    for level, desc in levels["levels"].items():
+        lines.append(f"Level {level}: {desc['deskripsi']}")
+        if desc["indikator"]:
+            lines.append(f"Indikator: {desc['indikator']}")
+    return Document(
+        id=f"permenpan_level:{levels['kompetensi']}",
+        page_content="\n".join(lines),
+        metadata={"source": levels["source"], "kompetensi": levels["kompetensi"]},
+    )
+
+
+def _build_contexts(
+    jabatan_name: str,
+    kompetensi_name: str,
+    query: str,
+    permenpan_retriever: Any | None,
+    skj_retriever: Any | None,
+    komp_info: dict,
+) -> tuple[str, str, dict]:
+    """
+    Ambil konteks PermenPAN & SKJ dari retriever, dengan fallback ke info kompetensi dari katalog.
+    Konteks PermenPAN diambil langsung dari tabel deskriptor level di katalog; pencarian vektor
+    PermenPAN hanya untuk kompetensi yang belum ada di tabel itu.
+    Pencarian dibatasi ke chunk jabatan & kompetensi ini (pre-filter metadata, core/scope.py).
+    Kandidat di-dedup, di-rerank dan dipadatkan sesuai budget token per slot;
+    chunk yang dipakai dikembalikan sebagai {"permenpan": [...], "skj": [...]}.
+    """
+    filter_p, filter_s = scope_filters(jabatan_name, kompetensi_name)
+    levels_doc = _permenpan_levels_doc(kompetensi_name)
+    if levels_doc is not None:
+        docs_p = [levels_doc]
+        _, docs_s = retrieve_pair(query, None, skj_retriever, filters=(None, filter_s))
+    else:
+        # Dua koleksi dicari sekaligus (bukan berurutan)
+        docs_p, docs_s = retrieve_pair(query, permenpan_retriever, skj_retriever, filters=(filter_p, filter_s))
+    context_permenpan, used_p = pack_context(query, docs_p, CONTEXT_BUDGET_PERMENPAN)
+    context_skj, used_s = pack_context(query, docs_s, CONTEXT_BUDGET_SKJ)
+
+    # Safety fallback kalau dua-duanya kosong
+    if not context_permenpan and not context_skj:
+        context_skj = json.dumps(
+            {
+                "jabatan": jabatan_name,
+                "kompetensi": kompetensi_name,
+                "deskripsi": komp_info["deskripsi"],
+                "level_target": komp_info["level_target"],
+            },
+            ensure_ascii=False,
+        )
+
+    return context_permenpan, context_skj, {"permenpan": used_p, "skj": used_s}
+
+
+# ================== VERSI KONTEKS (KUNCI RESULT STORE) ==================
+
+_CORPUS_STAMP: tuple[float, Any] = (0.0, None)
+_CORPUS_LOCK = threading.Lock()
+_CORPUS_ENGINE = None
+
+
+def _pgvector_stamp() -> Any:
+    """Model, updated_at & jumlah baris koleksi PGVector (di-cache CORPUS_STAMP_TTL_S detik)."""
+    global _CORPUS_STAMP, _CORPUS_ENGINE
+    with _CORPUS_LOCK:
+        checked_at, stamp = _CORPUS_STAMP
+        if checked_at and time.monotonic() - checked_at < CORPUS_STAMP_TTL_S:
+            return stamp
+        try:
+            if _CORPUS_ENGINE is None:
+                _CORPUS_ENGINE = create_engine(psycopg3_url(DATABASE_URL), pool_pre_ping=True)
+            stamp = collection_stamps(_CORPUS_ENGINE, (PERMENPAN_COLLECTION, SKJ_COLLECTION))
+        except Exception:
+            stamp = None
+        _CORPUS_STAMP = (time.monotonic(), stamp)
+        return stamp
+
+
+def context_version(permenpan_retriever: Any | None, skj_retriever: Any | None) -> dict:
+    """
+    Semua yang menentukan konteks RAG selain input prompt: isi korpus (koleksi PGVector atau
+    header index lokal), katalog (deskriptor level), budget packing, mode retrieval, pre-filter
+    metadata, kuantisasi & model embedding. Berubah -> kunci result store berubah.
+    """
+    retrievers = [r for r in (permenpan_retriever, skj_retriever) if r is not None]
+    headers = [getattr(getattr(r, "index", None), "header", None) for r in retrievers]
+    if retrievers and all(headers):
+        corpus = [{k: h.get(k) for k in ("collection", "model", "dtype", "count", "exported_at")} for h in headers]
+    elif retrievers and DATABASE_URL:
+        corpus = _pgvector_stamp()
+    else:
+        corpus = None
+    return {
+        "corpus": corpus,
+        "catalog": get_catalog().version(),
+        "budgets": [CONTEXT_BUDGET_PERMENPAN, CONTEXT_BUDGET_SKJ, RETRIEVAL_CANDIDATES],
+        "retrieval_mode": RETRIEVAL_MODE,
+        "metadata_filter": METADATA_FILTER,
+        "quantization": VECTOR_QUANTIZATION,
+        "embedding_model": EMBEDDING_MODEL,
+    }
+
+
+class AssessmentStream:
+    """
+    Iterator token output LLM untuk satu penilaian (dipakai `st.write_stream`).
+    - Cek result store dulu; kalau ada, hasil tersimpan di-yield sekaligus.
+    - `on_level(level)` dipanggil sekali begitu LEVEL_PREDIKSI muncul di stream.
+    - Setelah iterasi selesai: `.result` (AssessmentResult), `.ttft_s`, `.total_s`,
+      `.context_s` (retrieval + packing) dan `.prompt_tokens`.
+    - `llm` / `use_cache` bisa diganti (mis. LLM palsu & tanpa result store di core/bench.py).
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        prompt: PromptTemplate,
+        inputs: dict,
+        query: str,
+        komp: dict,
+        permenpan_retriever: Any | None,
+        skj_retriever: Any | None,
+        soal_id: str | None = None,
+        on_level=None,
+        llm: Any | None = None,
+        use_cache: bool = True,
+    ):
+        self.mode = mode
+        self.prompt = prompt
+        self.inputs = inputs
+        self.query = query
+        self.komp = komp
+        self.permenpan_retriever = permenpan_retriever
+        self.skj_retriever = skj_retriever
+        self.soal_id = soal_id
+        self.on_level = on_level
+        self.llm = llm if llm is not None else get_llm()
+        self.use_cache = use_cache
+        self.result: AssessmentResult | None = None
+        self.level: int | None = None
+        self.ttft_s: float | None = None
+        self.total_s: float | None = None
+        self.context_s: float | None = None
+        self.prompt_tokens: int | None = None
+
+    def _emit_level(self, level: int | None) -> None:
+        if level is not None and self.level is None:
+            self.level = level
+            if self.on_level is not None:
+                self.on_level(level)
+
+    def __iter__(self):
+        started = time.perf_counter()
+        store = get_result_store() if self.use_cache else None
+        version = template_version(self.prompt)
+        model = llm_identity(self.llm)
+        key = None
+        if store is not None:
+            context = context_version(self.permenpan_retriever, self.skj_retriever)
+            key = input_hash(self.mode, self.inputs, model, version, context)
+            try:
+                cached = store.get(key)
+            except Exception:
+                cached = None  # result store bermasalah -> tetap nilai seperti biasa
+            if cached is not None:
+                self.ttft_s = self.total_s = time.perf_counter() - started
+                cached.ttft_s = self.ttft_s
+                self.result = cached
+                self._emit_level(cached.level_prediksi)
+                yield cached.raw
+                return
+
+        context_permenpan, context_skj, chunks_used = _build_contexts(
+            self.inputs["jabatan"], self.inputs["kompetensi"], self.query,
+            self.permenpan_retriever, self.skj_retriever, self.komp,
+        )
+        self.context_s = time.perf_counter() - started
+
+        prompt_value = self.prompt.invoke(
+            {
+                "context_permenpan": context_permenpan,
+                "context_skj": context_skj,
+                **self.inputs,
+            }
+        )
+        self.prompt_tokens = estimate_tokens(prompt_value.to_string())
+
+        parts: list[str] = []
+        for chunk in self.llm.stream(prompt_value):
+            token = chunk.content
+            if not token:
+                continue
+            if self.ttft_s is None:
+                self.ttft_s = time.perf_counter() - started
+            parts.append(token)
+            if self.level is None:
+                self._emit_level(level_from_partial("".join(parts)))
+            yield token
+
+        result = parse_with_format_retry("".join(parts), self.llm)
+        result.context_permenpan = context_permenpan
+        result.context_skj = context_skj
+        result.chunks_used = chunks_used
+        result.ttft_s = self.ttft_s
+        self._emit_level(result.level_prediksi)
+        if store is not None:
+            try:
+                store.put(key, self.mode, {**self.inputs, "soal_id": self.soal_id}, result, model, version)
+            except Exception:
+                pass
+        self.total_s = time.perf_counter() - started
+        self.result = result
+
+    def consume(self) -> AssessmentResult:
+        """Versi blocking: habiskan stream, kembalikan hasil."""
+        for _ in self:
+            pass
+        return self.result
+
+
+def _komp_info(jabatan_name: str, kompetensi_name: str) -> dict:
+    catalog = get_catalog()
+    komp = catalog.kompetensi_info(jabatan_name, kompetensi_name)
+    if komp is None:
+        if catalog.jabatan_info(jabatan_name) is None:
+            raise ValueError(f"Jabatan '{jabatan_name}' tidak dikenal.")
+        raise ValueError(f"Kompetensi '{kompetensi_name}' tidak ada di jabatan '{jabatan_name}'.")
+    return komp
+
+
+def stream_answer_rag_structured(
+    jabatan_name: str,
+    kompetensi_name: str,
+    soal_id: str,
+    jawaban_peserta: str,
+    nama_peserta: str,
+    permenpan_retriever: Any | None,
+    skj_retriever: Any | None,
+    on_level=None,
+    llm: Any | None = None,
+    use_cache: bool = True,
+) -> AssessmentStream:
+    """Mode 1 (streaming): Soal terstruktur (ambil soal dari bank soal di katalog)."""
+
+    komp = _komp_info(jabatan_name, kompetensi_name)
+    level_target = komp["level_target"]
+
+    # Ambil soal (lookup langsung by id_soal)
+    soal_obj = get_catalog().soal(soal_id)
+    if soal_obj is None or (soal_obj["jabatan"], soal_obj["kompetensi"]) != (jabatan_name, kompetensi_name):
+        raise ValueError(f"Soal dengan id '{soal_id}' tidak ditemukan.")
+
+    soal_text = soal_obj["teks"]
+
+    # Query untuk RAG
+    query = (
+        f"Jabatan: {jabatan_name}. Kompetensi: {kompetensi_name}. "
+        f"Soal: {soal_text}. Jawaban: {jawaban_peserta}."
+    )
+
+    inputs = {
+        "nama": nama_peserta,
+        "jabatan": jabatan_name,
+        "kompetensi": kompetensi_name,
+        "level_target": str(level_target),
+        "soal": soal_text,
+        "jawaban": jawaban_peserta,
+    }
+    return AssessmentStream(
+        "structured", PROMPT_STRUCTURED, inputs, query, komp, permenpan_retriever, skj_retriever,
+        soal_id=soal_id, on_level=on_level, llm=llm, use_cache=use_cache,
+    )
+
+
+def stream_answer_rag_free(
+    jabatan_name: str,
+    kompetensi_name: str,
+    kasus_text: str,
+    jawaban_peserta: str,
+    nama_peserta: str,
+    permenpan_retriever: Any | None,
+    skj_retriever: Any | None,
+    on_level=None,
+    llm: Any | None = None,
+    use_cache: bool = True,
+) -> AssessmentStream:
+    """Mode 2 (streaming): Kasus / jawaban bebas (user isi sendiri kasus & jawaban)."""
+
+    komp = _komp_info(jabatan_name, kompetensi_name)
+    level_target = komp["level_target"]
+
+    # Query untuk RAG
+    query = (
+        f"Jabatan: {jabatan_name}. Kompetensi: {kompetensi_name}. "
+        f"Kasus: {kasus_text}. Jawaban: {jawaban_peserta}."
+    )
+
+    inputs = {
+        "nama": nama_peserta,
+        "jabatan": jabatan_name,
+        "kompetensi": kompetensi_name,
+        "level_target": str(level_target),
+        "kasus": kasus_text,
+        "jawaban": jawaban_peserta,
+    }
+    return AssessmentStream(
+        "free", PROMPT_FREE, inputs, query, komp, permenpan_retriever, skj_retriever,
+        on_level=on_level, llm=llm, use_cache=use_cache,
+    )
+
+
+def assess_answer_rag_structured(*args, **kwargs) -> AssessmentResult:
+    """Mode 1: Soal terstruktur (blocking)."""
+    return stream_answer_rag_structured(*args, **kwargs).consume()
+
+
+def assess_answer_rag_free(*args, **kwargs) -> AssessmentResult:
+    """Mode 2: Kasus / jawaban bebas (blocking)."""
+    return stream_answer_rag_free(*args, **kwargs).consume()
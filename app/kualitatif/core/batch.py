@@ -0,0 +1,317 @@
+# core/batch.py - penilaian batch satu kohort peserta (CSV/Excel)
+#
+# Setiap baris (nama, jabatan, kompetensi, soal_id atau kasus, jawaban) dinilai lewat
+# assess_answer_rag_structured / assess_answer_rag_free di worker pool terbatas dengan
+# rate limiter bersama. Status per baris disimpan di SQLite, sehingga job yang terputus
+# (crash / tab ditutup) bisa dilanjutkan: baris yang sudah selesai tidak dinilai ulang.
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import asyncio
+
+import pandas as pd
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from app.kualitatif.core.assessment import assess_answer_rag_free, assess_answer_rag_structured
+from app.kualitatif.core.embeddings import DATA_DIR
+from app.kualitatif.core.llm import get_llm
+from app.kualitatif.core.results import AssessmentParseError, AssessmentResult, parse_assessment
+
+BATCH_DB_PATH = os.getenv("RAG_BATCH_DB", os.path.join(DATA_DIR, "batch_jobs.sqlite"))
+BATCH_WORKERS = 4
+BATCH_MAX_WORKERS = 16
+BATCH_RPM = int(os.getenv("RAG_BATCH_RPM", "60"))   # batas request LLM per menit (semua worker)
+BATCH_MAX_RETRIES = 4
+BATCH_BACKOFF_S = 5.0
+
+REQUIRED_COLUMNS = ("nama", "jabatan", "kompetensi", "jawaban")
+
+
+# ================== INPUT ==================
+
+def read_table(filename: str, data: bytes) -> pd.DataFrame:
+    """Baca CSV/Excel upload; nama kolom dinormalisasi (lowercase, spasi -> _)."""
+    if filename.lower().endswith((".xlsx", ".xls")):
+        try:
+            df = pd.read_excel(io.BytesIO(data), dtype=str)
+        except ImportError as e:
+            raise ValueError("Membaca Excel butuh paket `openpyxl`. Simpan sebagai CSV atau install openpyxl.") from e
+    else:
+        df = pd.read_csv(io.BytesIO(data), dtype=str, sep=None, engine="python")
+    df.columns = [str(c).strip().lower().replace(" ", "_") for c in df.columns]
+    return df.fillna("")
+
+
+def validate_table(df: pd.DataFrame) -> list[str]:
+    """Daftar masalah input (kosong = valid)."""
+    problems = [f"Kolom '{c}' tidak ada." for c in REQUIRED_COLUMNS if c not in df.columns]
+    if "soal_id" not in df.columns and "kasus" not in df.columns:
+        problems.append("Butuh kolom 'soal_id' (mode soal terstruktur) atau 'kasus' (mode kasus bebas).")
+    if not problems:
+        empty = df.index[df["jawaban"].str.strip() == ""].tolist()
+        if empty:
+            problems.append(f"Jawaban kosong pada baris: {', '.join(str(i + 2) for i in empty[:10])}")
+    return problems
+
+
+def job_id_for(data: bytes) -> str:
+    # Upload ulang file yang sama -> job yang sama (melanjutkan, bukan mengulang)
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+# ================== STORE ==================
+
+class BatchStore:
+    """Job batch & status per baris (SQLite lokal)."""
+
+    def __init__(self, path: str = BATCH_DB_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS batch_jobs (
+                id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS batch_items (
+                job_id TEXT NOT NULL,
+                row_idx INTEGER NOT NULL,
+                input TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                hasil TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                duration_s REAL,
+                finished_at REAL,
+                PRIMARY KEY (job_id, row_idx)
+            );
+            CREATE INDEX IF NOT EXISTS ix_batch_items_status ON batch_items (job_id, status);
+            """
+        )
+        self._conn.commit()
+
+    def create_job(self, job_id: str, filename: str, df: pd.DataFrame) -> None:
+        """Idempotent: job yang sudah ada tidak diubah (progresnya dipertahankan)."""
+        rows = df.to_dict(orient="records")
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO batch_jobs (id, filename, total, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, filename, len(rows), time.time()),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO batch_items (job_id, row_idx, input) VALUES (?, ?, ?)",
+                [(job_id, i, json.dumps(r, ensure_ascii=False)) for i, r in enumerate(rows)],
+            )
+            self._conn.commit()
+
+    def jobs(self) -> list[dict]:
+        rows = self._conn.execute(
+            """
+            SELECT j.*,
+                   SUM(i.status = 'done') AS done,
+                   SUM(i.status = 'error') AS errors
+            FROM batch_jobs j JOIN batch_items i ON i.job_id = j.id
+            GROUP BY j.id
+            ORDER BY j.created_at DESC
+            """
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def pending(self, job_id: str) -> list[dict]:
+        """Baris yang belum selesai (pending atau error sebelumnya -> dicoba lagi)."""
+        rows = self._conn.execute(
+            "SELECT row_idx, input FROM batch_items WHERE job_id = ? AND status != 'done' ORDER BY row_idx",
+            (job_id,),
+        ).fetchall()
+        return [{"row_idx": r["row_idx"], **json.loads(r["input"])} for r in rows]
+
+    def counts(self, job_id: str) -> dict:
+        rows = self._conn.execute(
+            "SELECT status, COUNT(*) AS n FROM batch_items WHERE job_id = ? GROUP BY status", (job_id,)
+        ).fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+    def record(self, job_id: str, row_idx: int, status: str, hasil: str | None, error: str | None, attempts: int, duration_s: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE batch_items
+                SET status = ?, hasil = ?, error = ?, attempts = attempts + ?, duration_s = ?, finished_at = ?
+                WHERE job_id = ? AND row_idx = ?
+                """,
+                (status, hasil, error, attempts, duration_s, time.time(), job_id, row_idx),
+            )
+            self._conn.commit()
+
+    def results(self, job_id: str) -> pd.DataFrame:
+        rows = self._conn.execute(
+            "SELECT input, status, hasil, error, duration_s FROM batch_items WHERE job_id = ? ORDER BY row_idx",
+            (job_id,),
+        ).fetchall()
+        records = []
+        for r in rows:
+            level = None
+            if r["hasil"]:
+                try:
+                    level = parse_assessment(r["hasil"]).level_prediksi
+                except AssessmentParseError:
+                    pass
+            records.append(
+                {
+                    **json.loads(r["input"]),
+                    "status": r["status"],
+                    "level_prediksi": level,
+                    "hasil": r["hasil"],
+                    "error": r["error"],
+                    "durasi_s": r["duration_s"],
+                }
+            )
+        return pd.DataFrame(records)
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM batch_items WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM batch_jobs WHERE id = ?", (job_id,))
+            self._conn.commit()
+
+
+# ================== RATE LIMIT & WORKER POOL ==================
+
+class RateLimiter(BaseRateLimiter):
+    """
+    Pembatas laju bersama untuk semua worker (request per menit, jarak rata).
+    Dipasang sebagai `rate_limiter` LLM, jadi setiap panggilan LLM (penilaian maupun
+    perbaikan format di parse_with_format_retry) mengambil satu slot; hasil dari result
+    store tidak memakai slot. `penalize` dipanggil saat API membalas 429: semua worker ikut menunggu.
+    """
+
+    def __init__(self, rpm: int = BATCH_RPM):
+        self.interval = 60.0 / max(rpm, 1)
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def _reserve(self, blocking: bool) -> float | None:
+        """Detik menunggu sampai slot berikutnya; None kalau non-blocking dan slot belum tersedia."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            if not blocking and slot > now:
+                return None
+            self._next = slot + self.interval
+        return slot - now
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        wait_s = self._reserve(blocking)
+        if wait_s is None:
+            return False
+        if wait_s > 0:
+            time.sleep(wait_s)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        wait_s = self._reserve(blocking)
+        if wait_s is None:
+            return False
+        if wait_s > 0:
+            await asyncio.sleep(wait_s)
+        return True
+
+    def penalize(self, seconds: float) -> None:
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    return getattr(e, "status_code", None) == 429 or type(e).__name__ == "RateLimitError"
+
+
+def assess_row(row: dict, permenpan_retriever, skj_retriever, llm=None) -> AssessmentResult:
+    """Nilai satu baris: soal_id -> mode soal terstruktur, selain itu mode kasus bebas."""
+    common = dict(
+        jabatan_name=row["jabatan"].strip(),
+        kompetensi_name=row["kompetensi"].strip(),
+        jawaban_peserta=row["jawaban"],
+        nama_peserta=row["nama"],
+        permenpan_retriever=permenpan_retriever,
+        skj_retriever=skj_retriever,
+        llm=llm,
+    )
+    if str(row.get("soal_id", "")).strip():
+        return assess_answer_rag_structured(soal_id=row["soal_id"].strip(), **common)
+    if not str(row.get("kasus", "")).strip():
+        raise ValueError("Baris tidak punya soal_id maupun kasus.")
+    return assess_answer_rag_free(kasus_text=row["kasus"], **common)
+
+
+class BatchRunner:
+    """Menjalankan baris yang belum selesai dari satu job di worker pool terbatas."""
+
+    def __init__(self, store: BatchStore, permenpan_retriever, skj_retriever, workers: int = BATCH_WORKERS, rpm: int = BATCH_RPM):
+        self.store = store
+        self.permenpan_retriever = permenpan_retriever
+        self.skj_retriever = skj_retriever
+        self.workers = max(1, min(workers, BATCH_MAX_WORKERS))
+        self.limiter = RateLimiter(rpm)
+        # Salinan LLM default dengan rate limiter bersama (dibuat saat run pertama)
+        self._llm = None
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = get_llm().model_copy(update={"rate_limiter": self.limiter})
+        return self._llm
+
+    def _work(self, job_id: str, row: dict, llm) -> str:
+        started = time.perf_counter()
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                result = assess_row(row, self.permenpan_retriever, self.skj_retriever, llm)
+            except Exception as e:
+                if is_rate_limit_error(e) and attempts <= BATCH_MAX_RETRIES:
+                    self.limiter.penalize(BATCH_BACKOFF_S * 2 ** (attempts - 1))
+                    continue
+                self.store.record(job_id, row["row_idx"], "error", None, str(e), attempts, time.perf_counter() - started)
+                return "error"
+            self.store.record(job_id, row["row_idx"], "done", result.raw, None, attempts, time.perf_counter() - started)
+            return "done"
+
+    def run(self, job_id: str, on_progress=None) -> dict:
+        """
+        Jalankan semua baris pending. `on_progress(counts)` dipanggil di thread pemanggil
+        setiap satu baris selesai (aman untuk update elemen Streamlit).
+        """
+        rows = self.store.pending(job_id)
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rag-batch")
+        try:
+            futures = [pool.submit(self._work, job_id, row, self.llm) for row in rows]
+            for _ in as_completed(futures):
+                if on_progress is not None:
+                    on_progress(self.store.counts(job_id))
+        except BaseException:
+            # Dihentikan (mis. rerun Streamlit): baris yang belum mulai tetap 'pending' untuk dilanjutkan
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown(wait=True)
+        return self.store.counts(job_id)
+
+
+# ================== EXPORT ==================
+
+def export_bytes(df: pd.DataFrame, fmt: str) -> bytes:
+    if fmt == "xlsx":
+        buf = io.BytesIO()
+        df.to_excel(buf, index=False)   # butuh openpyxl
+        return buf.getvalue()
+    return df.to_csv(index=False).encode("utf-8-sig")
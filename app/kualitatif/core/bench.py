@@ -0,0 +1,409 @@
+# core/bench.py - benchmark kualitas & latency retrieval dan penilaian RAG (bisa offline)
+#
+# Dataset berlabel di data/bench/cases.json:
+#   retrieval  : query -> chunk relevan (dicocokkan lewat metadata dan/atau potongan teks, jadi
+#                tidak bergantung pada strategi chunking / id chunk)
+#   assessment : kasus + jawaban -> level yang diharapkan
+# Default-nya offline: embedding hashing lokal yang deterministik & LLM palsu (tanpa API, tanpa DB).
+# Korpus dibangun ulang dari data/skj/*.json (dan PDF PermenPAN kalau PyPDFLoader tersedia) untuk
+# tiap strategi chunking & chunk size, lalu dicari lewat index lokal (core/local_index.py).
+#
+# Contoh:
+#   uv run python -m app.kualitatif.core.bench retrieval --skj-strategies kompetensi level --chunk-sizes 300 1000 --k 2 4 8
+#   uv run python -m app.kualitatif.core.bench retrieval --backends float32 int8 pgvector-sql --embeddings real
+#   uv run python -m app.kualitatif.core.bench assessment --k 8 --fake-ttft-ms 300 --fake-token-ms 20
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from itertools import product
+from typing import Any, Iterator
+
+import numpy as np
+import pandas as pd
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from app.kualitatif.core.embeddings import DATA_DIR
+from app.kualitatif.core.ingest import (
+    PERMENPAN_COLLECTION,
+    PERMENPAN_STRATEGIES,
+    SKJ_COLLECTION,
+    SKJ_STRATEGIES,
+    iter_permenpan,
+    iter_skj,
+)
+from app.kualitatif.core.local_index import LocalIndexRetriever, LocalVectorIndex, write_index
+from app.kualitatif.core.packing import tokenize
+
+BENCH_CASES_PATH = os.path.join(DATA_DIR, "bench", "cases.json")
+HASH_EMBEDDING_DIM = 1024
+BACKENDS = ("float32", "int8", "pgvector", "pgvector-sequential", "pgvector-async", "pgvector-sql", "pgvector-hybrid")
+
+
+# ================== OFFLINE STAND-INS ==================
+
+class HashingEmbeddings(Embeddings):
+    """
+    Embedding lokal deterministik (feature hashing kata + trigram karakter, dinormalisasi L2).
+    Bukan pengganti kualitas model sungguhan, tapi stabil antar run sehingga perbandingan
+    strategi chunking / k / backend bisa diulang tanpa API.
+    """
+
+    model_name = "local-hashing-v1"
+
+    def __init__(self, dim: int = HASH_EMBEDDING_DIM):
+        self.dim = dim
+
+    def _features(self, text_: str) -> Iterator[tuple[str, float]]:
+        for token in tokenize(text_):
+            yield "w:" + token, 1.0
+            padded = f"#{token}#"
+            for i in range(len(padded) - 2):
+                yield "c:" + padded[i:i + 3], 0.3
+
+    def _embed(self, text_: str) -> list[float]:
+        v = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text_):
+            h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            v[h % self.dim] += weight if h >> 63 else -weight
+        norm = np.linalg.norm(v)
+        return (v / norm if norm else v).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text_: str) -> list[float]:
+        return self._embed(text_)
+
+
+LEVEL_LINE_RE = re.compile(r"(?:Level\s+|\")([1-5])\"?\s*:\s*\"?([^\n\"]+)")
+ANSWER_RE = re.compile(r"- Jawaban(?:/Perilaku)? Peserta:\s*(.+)")
+TARGET_RE = re.compile(r"- Level Target Jabatan:\s*([1-5])")
+
+
+class FakeAssessmentLLM(BaseChatModel):
+    """
+    LLM palsu untuk benchmark: output FORMAT OUTPUT yang valid, level = deskriptor level di prompt
+    (konteks SKJ/aturan) yang paling banyak berbagi kata dengan jawaban peserta. Latency bisa
+    disimulasikan (token pertama & per token) supaya angka end-to-end mendekati LLM sungguhan.
+    """
+
+    first_token_s: float = 0.0
+    token_s: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-assessment"
+
+    def _respond(self, prompt: str) -> str:
+        answer = ANSWER_RE.search(prompt)
+        answer_terms = set(tokenize(answer.group(1))) if answer else set()
+        target = TARGET_RE.search(prompt)
+        level = int(target.group(1)) if target else 3
+        best = 0
+        for m in LEVEL_LINE_RE.finditer(prompt):
+            overlap = len(answer_terms & set(tokenize(m.group(2))))
+            if overlap > best:
+                best, level = overlap, int(m.group(1))
+        return (
+            f"LEVEL_PREDIKSI: {level}\n"
+            "RINGKASAN_PERILAKU: Ringkasan perilaku (LLM palsu benchmark).\n"
+            f"ALASAN: Deskriptor level {level} paling cocok dengan jawaban ({best} kata sama).\n"
+            f"GAP: {'sesuai' if target and level == int(target.group(1)) else 'berbeda dari'} level target.\n"
+            "REKOMENDASI: Rekomendasi pengembangan (LLM palsu benchmark)."
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text_ = self._respond(messages[-1].content)
+        time.sleep(self.first_token_s + self.token_s * len(text_.split()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text_))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_s)
+        for token in re.split(r"(?<=\s)", self._respond(messages[-1].content)):
+            if token:
+                time.sleep(self.token_s)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+# ================== DATASET & KORPUS ==================
+
+def load_cases(path: str = BENCH_CASES_PATH) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def is_relevant(doc: Document, spec: dict) -> bool:
+    """Relevan kalau semua metadata cocok dan (kalau ada) salah satu potongan teks muncul."""
+    meta = spec.get("metadata", {})
+    if any(str(doc.metadata.get(k, "")).lower() != str(v).lower() for k, v in meta.items()):
+        return False
+    contains = spec.get("contains")
+    if contains:
+        content = doc.page_content.lower()
+        return any(c.lower() in content for c in contains)
+    return True
+
+
+def build_corpus(skj_strategy: str, permenpan_strategy: str, chunk_size: int, chunk_overlap: int) -> dict[str, list[Document]]:
+    """Chunk SKJ (dan PermenPAN kalau PDF loader tersedia) persis seperti pipeline ingestion."""
+    corpus = {
+        SKJ_COLLECTION: list(
+            iter_skj(sorted(glob.glob(os.path.join(DATA_DIR, "skj", "*.json"))), skj_strategy, chunk_size, chunk_overlap)
+        )
+    }
+    pdfs = sorted(glob.glob(os.path.join(DATA_DIR, "permenpan", "*.pdf")))
+    try:
+        corpus[PERMENPAN_COLLECTION] = list(iter_permenpan(pdfs, permenpan_strategy, chunk_size, chunk_overlap))
+    except ImportError:
+        print("PyPDFLoader tidak tersedia: koleksi PermenPAN dilewati.", file=sys.stderr)
+    for i, docs in enumerate(corpus.values()):
+        for j, d in enumerate(docs):
+            d.id = d.id or f"{i}-{j}"
+    return corpus
+
+
+def local_retrievers(corpus: dict[str, list[Document]], embeddings, model: str, directory: str, dtype: str, k: int) -> dict[str, Any]:
+    """Index lokal (float32 / int8) per koleksi dari korpus yang baru di-chunk."""
+    out = {}
+    for name, docs in corpus.items():
+        if not docs:
+            continue
+        vectors = np.asarray(embeddings.embed_documents([d.page_content for d in docs]), dtype=np.float32)
+        write_index(
+            directory, name, [d.id for d in docs], [d.page_content for d in docs], [d.metadata for d in docs],
+            vectors, dtype=dtype, model=model,
+        )
+        out[name] = LocalIndexRetriever(index=LocalVectorIndex(directory, name, expected_model=model), embeddings=embeddings, k=k)
+    return out
+
+
+def pgvector_retrievers(embeddings, mode: str | None, k: int) -> dict[str, Any]:
+    from app.kualitatif.core.retrieval import DATABASE_URL, RETRIEVAL_MODE, DualCollectionRetriever
+
+    if not DATABASE_URL:
+        raise ValueError("Backend pgvector butuh VECTOR_DB_URL.")
+    dual = DualCollectionRetriever(DATABASE_URL, embeddings, k=k, mode=mode or RETRIEVAL_MODE)
+    # Mode dual dipakai lewat search(); retriever per koleksi hanya penanda nama koleksi
+    return {name: dual.retriever(name) for name in (PERMENPAN_COLLECTION, SKJ_COLLECTION)}
+
+
+# ================== METRIK ==================
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def _search(retriever, query: str) -> list[Document]:
+    dual = getattr(retriever, "dual", None)
+    if dual is not None:
+        return dual.search(query, [retriever.collection])[retriever.collection]
+    return retriever.invoke(query)
+
+
+def evaluate_retrieval(retrievers: dict[str, Any], cases: list[dict], ks: list[int], corpus: dict | None = None) -> list[dict]:
+    """
+    recall@k, MRR@k & latency (ms) per k; kasus untuk koleksi yang tidak ada dilewati.
+    recall@k = relevan di top-k / min(k, jumlah relevan di korpus). Tanpa korpus (pgvector),
+    jumlah relevan diperkirakan dari kandidat yang terambil.
+    """
+    ranked, totals, timings = [], [], []
+    for case in cases:
+        retriever = retrievers.get(case["collection"])
+        if retriever is None:
+            continue
+        started = time.perf_counter()
+        docs = _search(retriever, case["query"])
+        timings.append((time.perf_counter() - started) * 1000)
+        flags = [is_relevant(d, case["relevant"]) for d in docs]
+        ranked.append(flags)
+        if corpus is not None:
+            totals.append(sum(is_relevant(d, case["relevant"]) for d in corpus[case["collection"]]))
+        else:
+            totals.append(sum(flags))
+
+    rows = []
+    for k in ks:
+        recalls, rrs = [], []
+        for flags, n_relevant in zip(ranked, totals):
+            recalls.append(sum(flags[:k]) / min(k, n_relevant) if n_relevant else 0.0)
+            first = next((i for i, f in enumerate(flags[:k]) if f), None)
+            rrs.append(1 / (first + 1) if first is not None else 0.0)
+        rows.append(
+            {
+                "k": k,
+                "cases": len(ranked),
+                "recall_at_k": round(statistics.fmean(recalls), 4) if recalls else None,
+                "mrr": round(statistics.fmean(rrs), 4) if rrs else None,
+                "p50_ms": round(percentile(timings, 0.5), 3) if timings else None,
+                "p95_ms": round(percentile(timings, 0.95), 3) if timings else None,
+            }
+        )
+    return rows
+
+
+def run_retrieval_grid(
+    cases: list[dict],
+    embeddings,
+    model: str,
+    skj_strategies=("kompetensi",),
+    permenpan_strategies=("recursive",),
+    chunk_sizes=(500,),
+    ks=(4,),
+    backends=("float32",),
+) -> pd.DataFrame:
+    """Satu baris per (strategi, chunk size, backend, k). Index dibangun sekali per kombinasi, dicari dengan max(k)."""
+    rows = []
+    max_k = max(ks)
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as tmp:
+        done_pgvector = set()
+        for skj_s, perm_s, size in product(skj_strategies, permenpan_strategies, chunk_sizes):
+            corpus = None
+            for backend in backends:
+                if backend in done_pgvector:
+                    continue
+                config = {"skj_strategy": skj_s, "permenpan_strategy": perm_s, "chunk_size": size, "backend": backend}
+                if backend.startswith("pgvector"):
+                    # Korpus = yang sudah ter-ingest; strategi/chunk size lokal tidak berlaku
+                    config.update(skj_strategy="(ingested)", permenpan_strategy="(ingested)", chunk_size=None)
+                    mode = backend.partition("-")[2] or None
+                    retrievers, n_chunks, eval_corpus = pgvector_retrievers(embeddings, mode, max_k), None, None
+                    done_pgvector.add(backend)
+                else:
+                    corpus = corpus or build_corpus(skj_s, perm_s, size, size // 5)
+                    retrievers = local_retrievers(corpus, embeddings, model, tmp, backend, max_k)
+                    n_chunks, eval_corpus = sum(len(d) for d in corpus.values()), corpus
+                for row in evaluate_retrieval(retrievers, cases, list(ks), eval_corpus):
+                    rows.append({**config, "chunks": n_chunks, **row})
+    return pd.DataFrame(rows)
+
+
+def evaluate_assessment(cases: list[dict], permenpan_retriever, skj_retriever, llm) -> dict:
+    """Akurasi level & latency end-to-end (retrieval+packing vs generasi), ukuran prompt & konteks."""
+    from app.kualitatif.core.assessment import stream_answer_rag_free
+
+    records = []
+    for case in cases:
+        stream = stream_answer_rag_free(
+            jabatan_name=case["jabatan"],
+            kompetensi_name=case["kompetensi"],
+            kasus_text=case["kasus"],
+            jawaban_peserta=case["jawaban"],
+            nama_peserta="Peserta Benchmark",
+            permenpan_retriever=permenpan_retriever,
+            skj_retriever=skj_retriever,
+            llm=llm,
+            use_cache=False,
+        )
+        result = stream.consume()
+        records.append(
+            {
+                "expected": case["expected_level"],
+                "predicted": result.level_prediksi,
+                "parsed": result.parsed,
+                "context_ms": stream.context_s * 1000,
+                "generation_ms": (stream.total_s - stream.context_s) * 1000,
+                "ttft_ms": (stream.ttft_s or 0) * 1000,
+                "prompt_tokens": stream.prompt_tokens,
+                "context_tokens": sum(c["tokens"] for chunks in result.chunks_used.values() for c in chunks),
+            }
+        )
+    if not records:
+        return {"cases": 0}
+
+    def _p(key, q):
+        return round(percentile([r[key] for r in records], q), 2)
+
+    errors = [abs(r["predicted"] - r["expected"]) for r in records if r["predicted"] is not None]
+    return {
+        "cases": len(records),
+        "level_accuracy": round(sum(r["predicted"] == r["expected"] for r in records) / len(records), 4),
+        "level_mae": round(statistics.fmean(errors), 4) if errors else None,
+        "parse_rate": round(sum(r["parsed"] for r in records) / len(records), 4),
+        "context_p50_ms": _p("context_ms", 0.5),
+        "context_p95_ms": _p("context_ms", 0.95),
+        "generation_p50_ms": _p("generation_ms", 0.5),
+        "generation_p95_ms": _p("generation_ms", 0.95),
+        "ttft_p50_ms": _p("ttft_ms", 0.5),
+        "prompt_tokens_mean": round(statistics.fmean(r["prompt_tokens"] for r in records), 1),
+        "prompt_tokens_max": max(r["prompt_tokens"] for r in records),
+        "context_tokens_mean": round(statistics.fmean(r["context_tokens"] for r in records), 1),
+    }
+
+
+# ================== CLI ==================
+
+def _embeddings(kind: str):
+    if kind == "real":
+        from app.kualitatif.core.embeddings import EMBEDDING_MODEL, get_embeddings
+
+        return get_embeddings(), EMBEDDING_MODEL
+    embeddings = HashingEmbeddings()
+    return embeddings, embeddings.model_name
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark retrieval & penilaian RAG kualitatif.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--cases", default=BENCH_CASES_PATH)
+    common.add_argument("--embeddings", choices=("hashing", "real"), default="hashing")
+    common.add_argument("--skj-strategies", nargs="+", choices=SKJ_STRATEGIES, default=["kompetensi"])
+    common.add_argument("--permenpan-strategies", nargs="+", choices=PERMENPAN_STRATEGIES, default=["recursive"])
+    common.add_argument("--chunk-sizes", type=int, nargs="+", default=[500])
+    common.add_argument("--json", action="store_true", help="Output JSON (default tabel)")
+    p_ret = sub.add_parser("retrieval", parents=[common], help="recall@k, MRR & latency per konfigurasi")
+    p_ret.add_argument("--k", type=int, nargs="+", default=[2, 4, 8])
+    p_ret.add_argument("--backends", nargs="+", choices=BACKENDS, default=["float32", "int8"])
+    p_ass = sub.add_parser("assessment", parents=[common], help="Akurasi level & latency end-to-end")
+    p_ass.add_argument("--k", type=int, default=8)
+    p_ass.add_argument("--backend", choices=("float32", "int8"), default="float32")
+    p_ass.add_argument("--llm", choices=("fake", "real"), default="fake")
+    p_ass.add_argument("--fake-ttft-ms", type=float, default=0.0)
+    p_ass.add_argument("--fake-token-ms", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    cases = load_cases(args.cases)
+    embeddings, model = _embeddings(args.embeddings)
+
+    if args.command == "retrieval":
+        df = run_retrieval_grid(
+            cases["retrieval"], embeddings, model, args.skj_strategies, args.permenpan_strategies,
+            args.chunk_sizes, args.k, args.backends,
+        )
+        print(df.to_json(orient="records", force_ascii=False, indent=2) if args.json else df.to_string(index=False))
+        return 0
+
+    if args.llm == "real":
+        from app.kualitatif.core.llm import get_llm
+
+        llm = get_llm()
+    else:
+        llm = FakeAssessmentLLM(first_token_s=args.fake_ttft_ms / 1000, token_s=args.fake_token_ms / 1000)
+    corpus = build_corpus(args.skj_strategies[0], args.permenpan_strategies[0], args.chunk_sizes[0], args.chunk_sizes[0] // 5)
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as tmp:
+        retrievers = local_retrievers(corpus, embeddings, model, tmp, args.backend, args.k)
+        report = evaluate_assessment(
+            cases["assessment"], retrievers.get(PERMENPAN_COLLECTION), retrievers.get(SKJ_COLLECTION), llm
+        )
+    report = {"embeddings": model, "llm": args.llm, "k": args.k, "backend": args.backend, **report}
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+# core/catalog.py - katalog jabatan, kompetensi (SKJ) & bank soal di SQLite
+#
+# Menggantikan dict SKJ_DATA / QUESTIONS_DATA di core/data.py supaya katalog ribuan jabatan dan
+# puluhan ribu soal tetap cepat: lookup per jabatan / kompetensi / id_soal lewat index (bukan scan
+# list), daftar di-page (LIMIT/OFFSET) dan dicari per prefix untuk selector search-as-you-type.
+# Entry yang sering dipakai di-cache di memori (LRU). Katalog kosong otomatis diisi dari core/data.py.
+# Tabel permenpan_level menyimpan deskriptor level 1-5 per kompetensi PermenPAN RB 38/2017
+# (diekstrak saat ingestion PermenPAN) untuk konteks penilaian tanpa pencarian vektor.
+#
+# Muat katalog dari file JSON berformat sama dengan dict lama ({"skj": SKJ_DATA, "questions": QUESTIONS_DATA}):
+#   uv run python -m app.kualitatif.core.catalog load katalog.json
+#   uv run python -m app.kualitatif.core.catalog levels "app/kualitatif/data/permenpan/PERMENPAN NOMOR 38 TAHUN 2017.pdf"
+#   uv run python -m app.kualitatif.core.catalog stats
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import sys
+import threading
+from functools import lru_cache
+
+from app.kualitatif.core.embeddings import DATA_DIR
+
+CATALOG_DB_PATH = os.getenv("RAG_CATALOG_DB", os.path.join(DATA_DIR, "catalog.sqlite"))
+CATALOG_CACHE_SIZE = 4096
+PAGE_SIZE = 50
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS jabatan (
+    nama TEXT PRIMARY KEY,
+    nama_lower TEXT NOT NULL,
+    level_jabatan TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_jabatan_nama_lower ON jabatan (nama_lower);
+CREATE TABLE IF NOT EXISTS kompetensi (
+    jabatan TEXT NOT NULL,
+    nama TEXT NOT NULL,
+    deskripsi TEXT NOT NULL DEFAULT '',
+    level_target INTEGER NOT NULL,
+    urutan INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (jabatan, nama)
+);
+CREATE INDEX IF NOT EXISTS ix_kompetensi_nama ON kompetensi (nama);
+CREATE TABLE IF NOT EXISTS soal (
+    id_soal TEXT PRIMARY KEY,
+    jabatan TEXT NOT NULL,
+    kompetensi TEXT NOT NULL,
+    urutan INTEGER NOT NULL,
+    teks TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_soal_jabatan_kompetensi ON soal (jabatan, kompetensi, urutan);
+CREATE TABLE IF NOT EXISTS permenpan_level (
+    kompetensi TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    definisi TEXT NOT NULL DEFAULT '',
+    deskripsi TEXT NOT NULL,
+    indikator TEXT NOT NULL DEFAULT '',
+    source TEXT,
+    PRIMARY KEY (kompetensi, level)
+);
+CREATE TABLE IF NOT EXISTS catalog_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+# Naik setiap kali katalog dimuat ulang; ikut kunci result store (konteks penilaian bergantung katalog)
+SQL_BUMP_VERSION = (
+    "INSERT INTO catalog_meta (key, value) VALUES ('version', 1) "
+    "ON CONFLICT (key) DO UPDATE SET value = value + 1"
+)
+CATALOG_TABLES = ("jabatan", "kompetensi", "soal", "permenpan_level")
+
+
+def _prefix_range(prefix: str) -> tuple[str, str]:
+    # nama_lower >= p AND nama_lower < p + U+FFFF -> range scan di index (LIKE 'p%' tidak selalu memakai index)
+    p = prefix.strip().lower()
+    return p, p + "\uffff"
+
+
+class CompetencyCatalog:
+    """Katalog SKJ & bank soal (SQLite lokal) dengan lookup ter-index dan cache LRU."""
+
+    def __init__(self, path: str = CATALOG_DB_PATH, cache_size: int = CATALOG_CACHE_SIZE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA_SQL)
+        self._conn.commit()
+        # Cache per instance (bukan per kelas) supaya bisa dikosongkan setelah load
+        self.jabatan_info = lru_cache(maxsize=cache_size)(self._jabatan_info)
+        self.kompetensi = lru_cache(maxsize=cache_size)(self._kompetensi)
+        self.kompetensi_info = lru_cache(maxsize=cache_size)(self._kompetensi_info)
+        self.soal = lru_cache(maxsize=cache_size)(self._soal)
+        self.permenpan_levels = lru_cache(maxsize=cache_size)(self._permenpan_levels)
+
+    def _query(self, sql: str, params=()) -> list[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def clear_cache(self) -> None:
+        for cached in (self.jabatan_info, self.kompetensi, self.kompetensi_info, self.soal, self.permenpan_levels):
+            cached.cache_clear()
+
+    # ---------- loader ----------
+    def load_dicts(self, skj_data: dict, questions_data: dict) -> dict:
+        """Upsert dari format dict lama (SKJ_DATA & QUESTIONS_DATA). Return jumlah baris per tabel."""
+        jabatan_rows, kompetensi_rows, soal_rows = [], [], []
+        for jab, info in skj_data.items():
+            jabatan_rows.append((jab, jab.lower(), info.get("level_jabatan")))
+            for i, (komp, k) in enumerate(info.get("kompetensi", {}).items()):
+                kompetensi_rows.append((jab, komp, k.get("deskripsi", ""), int(k["level_target"]), i))
+        for jab, per_komp in questions_data.items():
+            for komp, soal_list in per_komp.items():
+                for i, s in enumerate(soal_list):
+                    soal_rows.append((s["id_soal"], jab, komp, i, s["teks"]))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO jabatan (nama, nama_lower, level_jabatan) VALUES (?, ?, ?)", jabatan_rows
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO kompetensi (jabatan, nama, deskripsi, level_target, urutan) VALUES (?, ?, ?, ?, ?)",
+                kompetensi_rows,
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO soal (id_soal, jabatan, kompetensi, urutan, teks) VALUES (?, ?, ?, ?, ?)",
+                soal_rows,
+            )
+            self._conn.execute(SQL_BUMP_VERSION)
+            self._conn.commit()
+        self.clear_cache()
+        return {"jabatan": len(jabatan_rows), "kompetensi": len(kompetensi_rows), "soal": len(soal_rows)}
+
+    def is_empty(self) -> bool:
+        return not self._query("SELECT 1 FROM jabatan LIMIT 1")
+
+    def version(self) -> int:
+        """Versi isi katalog (tidak di-cache: loader bisa jalan di proses lain, mis. CLI)."""
+        rows = self._query("SELECT value FROM catalog_meta WHERE key = 'version'")
+        return rows[0]["value"] if rows else 0
+
+    def stats(self) -> dict:
+        return {t: self._query(f"SELECT COUNT(*) AS n FROM {t}")[0]["n"] for t in CATALOG_TABLES}
+
+    # ---------- jabatan ----------
+    def count_jabatan(self) -> int:
+        return self._query("SELECT COUNT(*) AS n FROM jabatan")[0]["n"]
+
+    def jabatan_page(self, offset: int = 0, limit: int = PAGE_SIZE) -> list[str]:
+        rows = self._query("SELECT nama FROM jabatan ORDER BY nama_lower LIMIT ? OFFSET ?", (limit, offset))
+        return [r["nama"] for r in rows]
+
+    def search_jabatan(self, text_: str, limit: int = PAGE_SIZE) -> list[str]:
+        """Prefix dulu (range scan di index), lalu substring kalau hasil prefix belum cukup."""
+        if not text_.strip():
+            return self.jabatan_page(0, limit)
+        lo, hi = _prefix_range(text_)
+        names = [
+            r["nama"]
+            for r in self._query(
+                "SELECT nama FROM jabatan WHERE nama_lower >= ? AND nama_lower < ? ORDER BY nama_lower LIMIT ?",
+                (lo, hi, limit),
+            )
+        ]
+        if len(names) < limit:
+            pattern = "%" + lo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            names += [
+                r["nama"]
+                for r in self._query(
+                    "SELECT nama FROM jabatan WHERE nama_lower LIKE ? ESCAPE '\\' AND NOT (nama_lower >= ? AND nama_lower < ?) "
+                    "ORDER BY nama_lower LIMIT ?",
+                    (pattern, lo, hi, limit - len(names)),
+                )
+            ]
+        return names
+
+    def _jabatan_info(self, jabatan: str) -> dict | None:
+        rows = self._query("SELECT nama, level_jabatan FROM jabatan WHERE nama = ?", (jabatan,))
+        return dict(rows[0]) if rows else None
+
+    # ---------- kompetensi ----------
+    def _kompetensi(self, jabatan: str) -> dict[str, dict]:
+        """{nama_kompetensi: {"deskripsi", "level_target"}} untuk satu jabatan (format dict lama)."""
+        rows = self._query(
+            "SELECT nama, deskripsi, level_target FROM kompetensi WHERE jabatan = ? ORDER BY urutan, nama", (jabatan,)
+        )
+        return {r["nama"]: {"deskripsi": r["deskripsi"], "level_target": r["level_target"]} for r in rows}
+
+    def _kompetensi_info(self, jabatan: str, kompetensi: str) -> dict | None:
+        rows = self._query(
+            "SELECT deskripsi, level_target FROM kompetensi WHERE jabatan = ? AND nama = ?", (jabatan, kompetensi)
+        )
+        return dict(rows[0]) if rows else None
+
+    # ---------- soal ----------
+    def count_soal(self, jabatan: str, kompetensi: str) -> int:
+        return self._query(
+            "SELECT COUNT(*) AS n FROM soal WHERE jabatan = ? AND kompetensi = ?", (jabatan, kompetensi)
+        )[0]["n"]
+
+    def soal_page(self, jabatan: str, kompetensi: str, offset: int = 0, limit: int = PAGE_SIZE) -> list[dict]:
+        rows = self._query(
+            "SELECT id_soal, teks FROM soal WHERE jabatan = ? AND kompetensi = ? ORDER BY urutan LIMIT ? OFFSET ?",
+            (jabatan, kompetensi, limit, offset),
+        )
+        return [dict(r) for r in rows]
+
+    def _soal(self, id_soal: str) -> dict | None:
+        rows = self._query("SELECT id_soal, jabatan, kompetensi, teks FROM soal WHERE id_soal = ?", (id_soal,))
+        return dict(rows[0]) if rows else None
+
+    # ---------- deskriptor level PermenPAN ----------
+    def load_permenpan_levels(self, rows: list[dict]) -> int:
+        """Upsert [{"kompetensi", "level", "definisi", "deskripsi", "indikator", "source"}]."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO permenpan_level (kompetensi, level, definisi, deskripsi, indikator, source) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (r["kompetensi"], int(r["level"]), r.get("definisi", ""), r["deskripsi"], r.get("indikator", ""), r.get("source"))
+                    for r in rows
+                ],
+            )
+            self._conn.execute(SQL_BUMP_VERSION)
+            self._conn.commit()
+        self.clear_cache()
+        return len(rows)
+
+    def _permenpan_levels(self, kompetensi: str) -> dict | None:
+        """{"kompetensi", "definisi", "source", "levels": {level: {"deskripsi", "indikator"}}} atau None."""
+        rows = self._query(
+            "SELECT level, definisi, deskripsi, indikator, source FROM permenpan_level WHERE kompetensi = ? ORDER BY level",
+            (kompetensi,),
+        )
+        if not rows:
+            return None
+        return {
+            "kompetensi": kompetensi,
+            "definisi": next((r["definisi"] for r in rows if r["definisi"]), ""),
+            "source": rows[0]["source"],
+            "levels": {r["level"]: {"deskripsi": r["deskripsi"], "indikator": r["indikator"]} for r in rows},
+        }
+
+
+_CATALOG = None
+_CATALOG_LOCK = threading.Lock()
+
+
+def get_catalog() -> CompetencyCatalog:
+    """Katalog process-wide; kalau masih kosong diisi dari dict contoh di core/data.py."""
+    global _CATALOG
+    with _CATALOG_LOCK:
+        if _CATALOG is None:
+            catalog = CompetencyCatalog()
+            if catalog.is_empty():
+                from app.kualitatif.core.data import QUESTIONS_DATA, SKJ_DATA
+
+                catalog.load_dicts(SKJ_DATA, QUESTIONS_DATA)
+            _CATALOG = catalog
+        return _CATALOG
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Kelola katalog jabatan, kompetensi & bank soal.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_load = sub.add_parser(
+        "load", help='Muat file JSON {"skj": {...}, "questions": {...}, "permenpan_levels": [...]} (format SKJ_DATA / QUESTIONS_DATA)'
+    )
+    p_load.add_argument("path")
+    sub.add_parser("seed", help="Muat dict contoh dari core/data.py")
+    p_levels = sub.add_parser("levels", help="Ekstrak deskriptor level dari PDF PermenPAN (default: data/permenpan/*.pdf)")
+    p_levels.add_argument("paths", nargs="*")
+    sub.add_parser("stats", help="Jumlah jabatan, kompetensi & soal")
+    args = parser.parse_args(argv)
+
+    catalog = CompetencyCatalog()
+    if args.command == "load":
+        with open(args.path, encoding="utf-8") as f:
+            data = json.load(f)
+        stats = catalog.load_dicts(data.get("skj", {}), data.get("questions", {}))
+        stats["permenpan_level"] = catalog.load_permenpan_levels(data.get("permenpan_levels", []))
+        print(json.dumps(stats))
+    elif args.command == "seed":
+        from app.kualitatif.core.data import QUESTIONS_DATA, SKJ_DATA
+
+        print(json.dumps(catalog.load_dicts(SKJ_DATA, QUESTIONS_DATA)))
+    elif args.command == "levels":
+        from app.kualitatif.core.ingest import iter_permenpan_levels
+
+        paths = args.paths or sorted(glob.glob(os.path.join(DATA_DIR, "permenpan", "*.pdf")))
+        print(json.dumps({"permenpan_level": catalog.load_permenpan_levels(list(iter_permenpan_levels(paths)))}))
+    else:
+        print(json.dumps(catalog.stats()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
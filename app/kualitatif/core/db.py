@@ -0,0 +1,15 @@
+# core/db.py - helper koneksi Postgres bersama (RAG & NL2SQL)
+# Modul dasar tanpa dependensi ke core lain, sehingga bisa di-import di level modul
+# oleh ingest/reembed/results/local_index tanpa import melingkar.
+from sqlalchemy.engine import make_url
+
+
+def psycopg3_url(url: str) -> str:
+    """
+    URL Postgres apa pun (psycopg2, tanpa driver, asyncpg, postgres://) -> driver psycopg 3.
+    langchain_postgres (sync & async) dan prepared statement butuh psycopg 3; URL non-Postgres dibiarkan.
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() not in ("postgresql", "postgres"):
+        return url
+    return parsed.set(drivername="postgresql+psycopg").render_as_string(hide_password=False)
@@ -0,0 +1,218 @@
+# core/embeddings.py
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from pydantic import SecretStr
+
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+load_dotenv()
+
+API_KEY = os.getenv("API_KEY")
+# "openrouter" (default, OpenAIEmbeddings remote) atau "local" (model HuggingFace kecil di CPU, offline)
+EMBEDDING_BACKEND = os.getenv("RAG_EMBEDDING_BACKEND", "openrouter")
+LOCAL_EMBEDDING_MODEL = os.getenv("RAG_LOCAL_EMBEDDING_MODEL", "intfloat/multilingual-e5-small")
+LOCAL_EMBEDDING_THREADS = int(os.getenv("RAG_EMBEDDING_THREADS", "0")) or None
+LOCAL_EMBEDDING_INT8 = os.getenv("RAG_EMBEDDING_INT8", "0") == "1"
+LOCAL_EMBEDDING_BATCH = 32
+# Nama model aktif: dipakai juga sebagai key cache & pengecekan index lokal / koleksi
+EMBEDDING_MODEL = (
+    LOCAL_EMBEDDING_MODEL if EMBEDDING_BACKEND == "local" else os.getenv("EMBEDDING_MODEL", "qwen/qwen3-embedding-8b")
+)
+EMBEDDING_BASE_URL = os.getenv("EMBEDDING_BASE_URL", "https://openrouter.ai/api/v1")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "1") == "1"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(DATA_DIR, "embedding_cache.sqlite"))
+EMBEDDING_CACHE_LRU_SIZE = 2048
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings dengan cache 2 lapis: LRU di memori + SQLite di disk, key = hash(model, jenis, teks).
+    Teks yang sama hanya di-embed sekali, juga kalau diminta bersamaan dari beberapa thread
+    (mis. retriever PermenPAN & SKJ yang mencari dengan query identik).
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_name: str,
+        path: str = EMBEDDING_CACHE_PATH,
+        lru_size: int = EMBEDDING_CACHE_LRU_SIZE,
+        batch_queries: bool = False,
+    ):
+        self.underlying = underlying
+        self.model_name = model_name
+        # True kalau embed_query model == embed_documents([teks])[0] (tanpa prefix query),
+        # sehingga banyak query bisa di-embed dalam satu request batch
+        self.batch_queries = batch_queries
+        self.lru_size = lru_size
+        self._lru: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: dict[str, threading.Event] = {}
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS embedding_cache (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._db.commit()
+
+    def _key(self, text: str, kind: str) -> str:
+        # kind: "q" (query) / "d" (dokumen), karena beberapa model memberi prefix berbeda
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def _get(self, key: str) -> list[float] | None:
+        with self._lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+                return vec
+            row = self._db.execute("SELECT vector FROM embedding_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        vec = array("f", row[0]).tolist()
+        self._remember(key, vec)
+        return vec
+
+    def _remember(self, key: str, vec: list[float]) -> None:
+        with self._lock:
+            self._lru[key] = vec
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def _put_many(self, items: list[tuple[str, list[float]]]) -> None:
+        for key, vec in items:
+            self._remember(key, vec)
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, vector) VALUES (?, ?)",
+                [(key, array("f", vec).tobytes()) for key, vec in items],
+            )
+            self._db.commit()
+
+    def _count(self, hits: int, misses: int) -> None:
+        # Dipanggil dari banyak thread (pool retrieval, fan-out profil, worker batch)
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text, "q")
+        while True:
+            vec = self._get(key)
+            if vec is not None:
+                self._count(1, 0)
+                return vec
+            with self._lock:
+                event = self._inflight.get(key)
+                leader = event is None
+                if leader:
+                    event = self._inflight[key] = threading.Event()
+            if not leader:
+                # Thread lain sedang meng-embed teks yang sama; tunggu lalu baca dari cache
+                event.wait()
+                continue
+            try:
+                self._count(0, 1)
+                vec = self.underlying.embed_query(text)
+                self._put_many([(key, vec)])
+                return vec
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                event.set()
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Banyak query sekaligus (mis. profil lengkap): yang belum ter-cache di-embed dalam satu batch."""
+        keys = [self._key(t, "q") for t in texts]
+        out: list[list[float] | None] = [self._get(k) for k in keys]
+        missing = list({keys[i]: i for i, v in enumerate(out) if v is None}.values())
+        self._count(len(texts) - len(missing), len(missing))
+        if missing:
+            batch = [texts[i] for i in missing]
+            if self.batch_queries:
+                vectors = self.underlying.embed_documents(batch)
+            else:
+                vectors = [self.underlying.embed_query(t) for t in batch]
+            self._put_many([(keys[i], v) for i, v in zip(missing, vectors)])
+        return [v if v is not None else self._get(k) for k, v in zip(keys, out)]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(t, "d") for t in texts]
+        out: list[list[float] | None] = [self._get(k) for k in keys]
+        missing = [i for i, v in enumerate(out) if v is None]
+        self._count(len(texts) - len(missing), len(missing))
+        if missing:
+            vectors = self.underlying.embed_documents([texts[i] for i in missing])
+            self._put_many([(keys[i], v) for i, v in zip(missing, vectors)])
+            for i, v in zip(missing, vectors):
+                out[i] = v
+        return out
+
+
+def local_embeddings(
+    model: str = LOCAL_EMBEDDING_MODEL,
+    threads: int | None = LOCAL_EMBEDDING_THREADS,
+    int8: bool = LOCAL_EMBEDDING_INT8,
+    batch_size: int = LOCAL_EMBEDDING_BATCH,
+) -> Embeddings:
+    """
+    Model sentence-transformers di CPU lewat langchain-huggingface: batch inference,
+    jumlah thread torch bisa diatur, dan opsional kuantisasi dinamis int8 pada layer Linear.
+    Model keluarga E5 butuh prefix "query: " / "passage: ".
+    """
+    try:
+        import sentence_transformers  # noqa: F401  (dipakai HuggingFaceEmbeddings)
+        import torch
+        from langchain_huggingface import HuggingFaceEmbeddings
+    except ImportError as e:
+        raise ImportError(
+            "RAG_EMBEDDING_BACKEND=local butuh extra `local-embeddings` (torch, sentence-transformers): "
+            "uv sync --extra local-embeddings"
+        ) from e
+
+    if threads:
+        torch.set_num_threads(threads)
+    query_kwargs = {"normalize_embeddings": True}
+    doc_kwargs = {"normalize_embeddings": True, "batch_size": batch_size}
+    if "e5" in model.lower():
+        query_kwargs["prompt"] = "query: "
+        doc_kwargs["prompt"] = "passage: "
+    embeddings = HuggingFaceEmbeddings(
+        model_name=model,
+        model_kwargs={"device": "cpu"},
+        encode_kwargs=doc_kwargs,
+        query_encode_kwargs=query_kwargs,
+    )
+    if int8:
+        client = getattr(embeddings, "_client", None) or getattr(embeddings, "client")
+        torch.quantization.quantize_dynamic(client, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return embeddings
+
+
+def get_embeddings():
+    """Model embedding yang dipakai bersama oleh app (retrieval) dan pipeline ingestion."""
+    if EMBEDDING_BACKEND == "local":
+        embeddings = local_embeddings()
+        if EMBEDDING_CACHE:
+            # Prefix query & dokumen berbeda -> query tidak boleh di-batch sebagai dokumen
+            return CachedEmbeddings(embeddings, EMBEDDING_MODEL)
+        return embeddings
+
+    embeddings = OpenAIEmbeddings(
+        api_key=SecretStr(API_KEY),
+        base_url=EMBEDDING_BASE_URL,
+        model=EMBEDDING_MODEL,
+    )
+    if EMBEDDING_CACHE:
+        # OpenAIEmbeddings.embed_query = embed_documents([teks])[0] -> query boleh di-batch
+        return CachedEmbeddings(embeddings, EMBEDDING_MODEL, batch_queries=True)
+    return embeddings
@@ -0,0 +1,208 @@
+# core/hybrid.py - pencarian hybrid: full-text search Postgres (tsvector) + vektor, digabung dengan RRF
+#
+# Istilah regulasi (nama kompetensi, label level) sering lebih tepat dicocokkan secara leksikal.
+# Per koleksi, satu query SQL mengambil kandidat leksikal (ts_rank_cd) dan kandidat vektor, lalu
+# menggabungkan peringkatnya dengan reciprocal-rank fusion: skor = sum(1 / (RRF_K + rank)).
+#
+# Fast path leksikal: query dari assess_answer_rag_* selalu memuat "Kompetensi: <nama>.". Kalau frasa
+# nama kompetensi itu cocok di >= k chunk pada setiap koleksi, hasil leksikal langsung dipakai dan
+# query tidak perlu di-embed sama sekali (tidak ada panggilan API embedding).
+#
+# Text search config default "indonesian" (snowball, Postgres >= 12); kalau tidak ada, pakai "simple".
+# Index GIN dibuat sebagai partial expression index per koleksi (sama seperti index ANN di core/ann.py):
+#   uv run python -m app.kualitatif.core.hybrid create
+#   uv run python -m app.kualitatif.core.hybrid search "Jabatan: Analis. Kompetensi: Integritas. ..."
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+from app.kualitatif.core.ann import index_name, uuid_literal
+from app.kualitatif.core.db import psycopg3_url
+from app.kualitatif.core.ingest import PERMENPAN_COLLECTION, SKJ_COLLECTION
+from app.kualitatif.core.packing import tokenize
+from app.kualitatif.core.scope import filter_clause
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("VECTOR_DB_URL")
+
+FTS_CONFIG = os.getenv("RAG_FTS_CONFIG", "indonesian")
+FTS_FALLBACK_CONFIG = "simple"
+LEXICAL_FASTPATH = os.getenv("RAG_LEXICAL_FASTPATH", "1") == "1"
+RRF_K = 60                 # konstanta RRF standar
+CANDIDATE_POOL = 4         # kandidat per sisi (leksikal / vektor) = k * ini
+MAX_QUERY_TERMS = 32       # jawaban panjang: cukup term awal untuk query OR
+
+ANCHOR_RE = re.compile(r"Kompetensi:\s*([^.\n]+)\.")
+CONFIG_RE = re.compile(r"[a-z_]+")
+
+SQL_TEXT_CONFIG = "SELECT 1 FROM pg_ts_config WHERE cfgname = :c"
+
+
+def resolve_text_config(conn, name: str = FTS_CONFIG) -> str:
+    """Nama text search config yang tersedia di server (fallback ke 'simple')."""
+    if not CONFIG_RE.fullmatch(name):
+        raise ValueError(f"Nama text search config tidak valid: {name}")
+    if conn.execute(text(SQL_TEXT_CONFIG), {"c": name}).first():
+        return name
+    return FTS_FALLBACK_CONFIG
+
+
+def tsvector_expr(config: str) -> str:
+    """Ekspresi tsvector; harus identik dengan ekspresi index GIN supaya index terpakai."""
+    if not CONFIG_RE.fullmatch(config):
+        raise ValueError(f"Nama text search config tidak valid: {config}")
+    return f"to_tsvector('{config}'::regconfig, document)"
+
+
+def or_query_text(query: str) -> str:
+    """Query OR untuk websearch_to_tsquery (term unik, tanpa stopword; tidak pernah error sintaks)."""
+    terms = list(dict.fromkeys(t for t in tokenize(query) if t != "or"))
+    return " or ".join(terms[:MAX_QUERY_TERMS])
+
+
+def anchor_phrase(query: str) -> str | None:
+    """Nama kompetensi dari query "Jabatan: ... Kompetensi: <nama>. ..." (None kalau tidak ada)."""
+    m = ANCHOR_RE.search(query)
+    return m.group(1).strip() if m else None
+
+
+# ================== SQL ==================
+
+def _scope(filter_param: str | None) -> str:
+    return f" AND {filter_clause(filter_param)}" if filter_param else ""
+
+
+def lexical_sql(uuid: str, config: str, name_param: str, filter_param: str | None = None) -> str:
+    """
+    Top-k leksikal satu koleksi yang memuat frasa anchor, diurutkan dengan rank query OR.
+    Kolom `slice_size`: jumlah chunk di irisan filter (NULL tanpa filter), supaya fast path bisa
+    menerima irisan yang lebih kecil dari k.
+    """
+    tsv = tsvector_expr(config)
+    coll = uuid_literal(uuid)
+    slice_size = (
+        f"(SELECT count(*) FROM langchain_pg_embedding WHERE collection_id = {coll}{_scope(filter_param)})"
+        if filter_param
+        else "CAST(NULL AS bigint)"
+    )
+    return (
+        f"SELECT CAST(:{name_param} AS text) AS collection, id, document, cmetadata, "
+        f"ts_rank_cd({tsv}, websearch_to_tsquery('{config}', :terms), 32) AS score, {slice_size} AS slice_size "
+        f"FROM langchain_pg_embedding "
+        f"WHERE collection_id = {coll} AND {tsv} @@ phraseto_tsquery('{config}', :anchor)"
+        f"{_scope(filter_param)} ORDER BY score DESC LIMIT :k"
+    )
+
+
+def hybrid_sql(uuid: str, config: str, vector_sql: str, name_param: str, filter_param: str | None = None) -> str:
+    """
+    Kandidat leksikal + vektor satu koleksi, digabung dengan RRF dalam satu statement.
+    `vector_sql`: subquery top-:pool kandidat vektor (kolom id & distance) koleksi yang sama,
+    sudah dengan filter metadata yang sama kalau `filter_param` dipakai.
+    """
+    tsv = tsvector_expr(config)
+    coll = uuid_literal(uuid)
+    return f"""
+    WITH lex AS (
+        SELECT id, row_number() OVER (
+                   ORDER BY ts_rank_cd({tsv}, websearch_to_tsquery('{config}', :terms), 32) DESC
+               ) AS rnk
+        FROM langchain_pg_embedding
+        WHERE collection_id = {coll} AND {tsv} @@ websearch_to_tsquery('{config}', :terms){_scope(filter_param)}
+        ORDER BY rnk LIMIT :pool
+    ), vec AS (
+        SELECT id, row_number() OVER (ORDER BY distance) AS rnk
+        FROM ({vector_sql}) v
+    ), fused AS (
+        SELECT COALESCE(lex.id, vec.id) AS id,
+               COALESCE(1.0 / (:rrf_k + lex.rnk), 0) + COALESCE(1.0 / (:rrf_k + vec.rnk), 0) AS score
+        FROM lex FULL OUTER JOIN vec ON lex.id = vec.id
+    )
+    SELECT CAST(:{name_param} AS text) AS collection, e.id, e.document, e.cmetadata, f.score
+    FROM fused f JOIN langchain_pg_embedding e ON e.id = f.id
+    ORDER BY f.score DESC LIMIT :k
+    """
+
+
+def union_sql(parts: list[str]) -> str:
+    return " UNION ALL ".join(f"({p})" for p in parts)
+
+
+# ================== INDEX GIN ==================
+
+def create_fts_index_sql(collection: str, uuid: str, config: str) -> str:
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name(collection, 'fts')} "
+        f"ON langchain_pg_embedding USING gin ({tsvector_expr(config)}) "
+        f"WHERE collection_id = {uuid_literal(uuid)}"
+    )
+
+
+def ensure_fts_index(engine, collection: str, config: str | None = None, rebuild: bool = False) -> dict:
+    from app.kualitatif.core.ann import collection_info
+
+    with engine.connect() as conn:
+        info = collection_info(conn, collection)
+        config = resolve_text_config(conn, config or FTS_CONFIG)
+    if not info or not info["n_rows"]:
+        return {"collection": collection, "status": "skip (koleksi kosong / tidak ada)"}
+
+    started = time.perf_counter()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if rebuild:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name(collection, 'fts')}"))
+        conn.execute(text(create_fts_index_sql(collection, info["uuid"], config)))
+        conn.execute(text("ANALYZE langchain_pg_embedding"))
+    return {
+        "collection": collection,
+        "index": index_name(collection, "fts"),
+        "config": config,
+        "rows": info["n_rows"],
+        "build_s": round(time.perf_counter() - started, 2),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Index full-text & pencarian hybrid koleksi PermenPAN & SKJ.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_create = sub.add_parser("create", help="Buat / pastikan partial index GIN (tsvector) per koleksi")
+    p_create.add_argument("--collection", nargs="+", default=[PERMENPAN_COLLECTION, SKJ_COLLECTION])
+    p_create.add_argument("--config", default=FTS_CONFIG)
+    p_create.add_argument("--rebuild", action="store_true")
+    p_search = sub.add_parser("search", help="Jalankan retrieval hybrid untuk satu query")
+    p_search.add_argument("query")
+    p_search.add_argument("--k", type=int, default=4)
+    args = parser.parse_args(argv)
+    if not DATABASE_URL:
+        print("VECTOR_DB_URL tidak ditemukan di .env", file=sys.stderr)
+        return 1
+
+    from app.kualitatif.core.retrieval import DualCollectionRetriever
+
+    if args.command == "create":
+        engine = create_engine(psycopg3_url(DATABASE_URL))
+        for name in args.collection:
+            print(json.dumps(ensure_fts_index(engine, name, args.config, args.rebuild), ensure_ascii=False, indent=2))
+        return 0
+
+    from app.kualitatif.core.embeddings import get_embeddings
+
+    dual = DualCollectionRetriever(DATABASE_URL, get_embeddings(), k=args.k, mode="hybrid")
+    started = time.perf_counter()
+    results = dual.search(args.query)
+    print(json.dumps({"elapsed_ms": round((time.perf_counter() - started) * 1000, 2)}))
+    for name, docs in results.items():
+        for d in docs:
+            print(json.dumps({"collection": name, "id": d.id, "text": d.page_content[:120]}, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,515 @@
+# core/ingest.py - pipeline ingestion offline untuk koleksi PGVector 'permenpan_index' & 'skj_index'
+#
+# Contoh:
+#   uv run python -m app.kualitatif.core.ingest permenpan
+#   uv run python -m app.kualitatif.core.ingest skj --strategy kompetensi --workers 4
+#   uv run python -m app.kualitatif.core.ingest all --dry-run
+#
+# Setiap chunk diberi id = hash konten (koleksi + teks + metadata), sehingga re-run hanya
+# meng-embed chunk baru/berubah, dan chunk lama yang sudah tidak ada ikut dihapus.
+#
+# Metadata chunk dipakai sebagai pre-filter retrieval (core/scope.py): SKJ membawa jabatan,
+# kompetensi (& level untuk strategi "level"); chunk PermenPAN diberi kompetensi & level kalau
+# teksnya jelas membahas satu kompetensi / satu level.
+# Tabel deskriptor level PermenPAN (kompetensi x level 1-5) juga diekstrak ke katalog
+# (core/catalog.py), sehingga konteks PermenPAN penilaian cukup lookup, bukan pencarian vektor.
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterable, Iterator
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.kualitatif.core.db import psycopg3_url
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("VECTOR_DB_URL")
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+PERMENPAN_COLLECTION = "permenpan_index"
+SKJ_COLLECTION = "skj_index"
+
+PERMENPAN_STRATEGIES = ("recursive", "page")
+SKJ_STRATEGIES = ("kompetensi", "level")
+
+# Batch embedding adaptif: membesar saat sukses, mengecil saat gagal (rate limit / payload terlalu besar)
+BATCH_START = 64
+BATCH_MIN = 4
+BATCH_MAX = 256
+MAX_RETRIES = 5
+BACKOFF_S = 2.0
+
+# Kompetensi PermenPAN RB 38/2017 (manajerial & sosial kultural) -> pola nama di teks
+KOMPETENSI_PERMENPAN = {
+    "Integritas": r"integritas",
+    "Kerjasama": r"kerja\s*sama",
+    "Komunikasi": r"komunikasi",
+    "Orientasi pada Hasil": r"orientasi\s+(?:pada\s+)?hasil",
+    "Pelayanan Publik": r"pelayanan\s+publik",
+    "Pengembangan Diri dan Orang Lain": r"pengembangan\s+diri\s+dan\s+orang\s+lain",
+    "Mengelola Perubahan": r"mengelola\s+perubahan",
+    "Pengambilan Keputusan": r"pengambilan\s+keputusan",
+    "Perekat Bangsa": r"perekat\s+bangsa",
+}
+_KOMPETENSI_RES = {name: re.compile(rf"\b{pattern}\b", re.IGNORECASE) for name, pattern in KOMPETENSI_PERMENPAN.items()}
+_LEVEL_RE = re.compile(r"\blevel\s*([1-5])\b", re.IGNORECASE)
+
+# Tabel deskriptor level di lampiran PermenPAN: "Nama Kompetensi : X", "Definisi : ...", lalu
+# "Level N <deskripsi> N.1 <indikator> N.2 ..." untuk level 1-5
+_NAMA_KOMPETENSI_RE = re.compile(r"(?:\b\d+\.\s*)?Nama\s+Kompetensi\s*:?\s*([^\n]+)", re.IGNORECASE)
+_DEFINISI_RE = re.compile(r"Definisi\s*:?\s*(.+?)(?=\bDeskripsi\b|\bLevel\s*1\b|$)", re.IGNORECASE | re.DOTALL)
+_LEVEL_BLOCK_RE = re.compile(r"\bLevel\s*([1-5])\b[\s:.\-]*(.+?)(?=\bLevel\s*[1-5]\b|$)", re.IGNORECASE | re.DOTALL)
+
+
+# ================== SOURCES & CHUNKING ==================
+
+def canonical_kompetensi(text_: str) -> str | None:
+    """Nama kompetensi PermenPAN kalau teks menyebut tepat satu kompetensi (mis. "Orientasi Hasil")."""
+    found = [name for name, rx in _KOMPETENSI_RES.items() if rx.search(text_)]
+    return found[0] if len(found) == 1 else None
+
+
+def tag_permenpan(doc: Document) -> Document:
+    """Tambah metadata kompetensi / level ke chunk PermenPAN (chunk daftar isi / lintas kompetensi dibiarkan)."""
+    kompetensi = canonical_kompetensi(doc.page_content)
+    if kompetensi:
+        doc.metadata["kompetensi"] = kompetensi
+        levels = set(_LEVEL_RE.findall(doc.page_content))
+        if len(levels) == 1:
+            doc.metadata["level"] = levels.pop()
+    return doc
+
+
+def _clean(text_: str) -> str:
+    return re.sub(r"\s+", " ", text_).strip()
+
+
+def extract_level_descriptors(text_: str, source: str | None = None) -> list[dict]:
+    """
+    Deskriptor level 1-5 per kompetensi dari teks lampiran PermenPAN:
+    [{"kompetensi", "level", "definisi", "deskripsi", "indikator", "source"}]. Bagian dengan nama
+    kompetensi yang tidak dikenali dilewati; kemunculan pertama per (kompetensi, level) yang dipakai.
+    """
+    headings = list(_NAMA_KOMPETENSI_RE.finditer(text_))
+    rows: dict[tuple[str, int], dict] = {}
+    for i, heading in enumerate(headings):
+        kompetensi = canonical_kompetensi(heading.group(1))
+        if not kompetensi:
+            continue
+        section = text_[heading.end():headings[i + 1].start() if i + 1 < len(headings) else len(text_)]
+        definisi = _DEFINISI_RE.search(section)
+        for block in _LEVEL_BLOCK_RE.finditer(section):
+            level = int(block.group(1))
+            # Indikator dinomori "<level>.1", "<level>.2", ...; teks sebelumnya = deskripsi level
+            deskripsi, _, indikator = block.group(2).partition(f"{level}.1")
+            if not _clean(deskripsi):
+                continue
+            rows.setdefault(
+                (kompetensi, level),
+                {
+                    "kompetensi": kompetensi,
+                    "level": level,
+                    "definisi": _clean(definisi.group(1)) if definisi else "",
+                    "deskripsi": _clean(deskripsi),
+                    "indikator": _clean(f"{level}.1 {indikator}") if indikator else "",
+                    "source": source,
+                },
+            )
+    return list(rows.values())
+
+
+def iter_permenpan_levels(paths: Iterable[str]) -> Iterator[dict]:
+    """Deskriptor level dari PDF PermenPAN (teks semua halaman digabung, tabel bisa melintasi halaman)."""
+    from langchain_community.document_loaders import PyPDFLoader
+
+    for path in paths:
+        text_ = "\n".join(page.page_content for page in PyPDFLoader(path).lazy_load())
+        yield from extract_level_descriptors(text_, os.path.basename(path))
+
+
+def iter_permenpan(paths: Iterable[str], strategy: str, chunk_size: int, chunk_overlap: int) -> Iterator[Document]:
+    """Stream PDF PermenPAN per halaman (lazy_load), lalu chunk sesuai strategi."""
+    from langchain_community.document_loaders import PyPDFLoader
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    for path in paths:
+        for page in PyPDFLoader(path).lazy_load():
+            page.metadata["source"] = os.path.basename(path)
+            if strategy == "page":
+                if page.page_content.strip():
+                    yield tag_permenpan(page)
+            else:
+                for chunk in splitter.split_documents([page]):
+                    yield tag_permenpan(chunk)
+
+
+def _skj_documents(path: str, strategy: str) -> Iterator[Document]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    jabatan = data.get("jabatan", "Unknown Position")
+    source = data.get("source_file", os.path.basename(path))
+    for komp in data.get("kompetensi", []):
+        nama_komp = komp.get("nama_kompetensi", "")
+        definisi = komp.get("definisi", "")
+        indikator = ", ".join(komp.get("indikator_perilaku", []))
+        level_desc = komp.get("level_mapping", {})
+        metadata = {"source": source, "jabatan": jabatan, "kompetensi": nama_komp}
+        if strategy == "level":
+            # Satu chunk per level, supaya deskriptor level bisa diambil tepat
+            for level, desc in level_desc.items():
+                yield Document(
+                    page_content=(
+                        f"Jabatan: {jabatan}\n"
+                        f"Kompetensi: {nama_komp}\n"
+                        f"Definisi: {definisi}\n"
+                        f"Level {level}: {desc}"
+                    ),
+                    metadata={**metadata, "level": str(level)},
+                )
+        else:
+            yield Document(
+                page_content=(
+                    f"Jabatan: {jabatan}\n"
+                    f"Kompetensi: {nama_komp}\n"
+                    f"Definisi: {definisi}\n"
+                    f"Indikator Perilaku: {indikator}\n"
+                    f"Level Proficiency: {json.dumps(level_desc, indent=0, ensure_ascii=False)}"
+                ),
+                metadata=metadata,
+            )
+
+
+def iter_skj(paths: Iterable[str], strategy: str, chunk_size: int, chunk_overlap: int) -> Iterator[Document]:
+    """Stream file SKJ JSON satu per satu, satu dokumen per kompetensi (atau per level)."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    for path in paths:
+        for doc in _skj_documents(path, strategy):
+            yield from splitter.split_documents([doc])
+
+
+def content_id(collection: str, doc: Document) -> str:
+    """Id deterministik dari konten: chunk identik -> id identik (dedup), konten berubah -> id baru."""
+    payload = json.dumps(
+        {"c": collection, "t": doc.page_content, "m": doc.metadata},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ================== EMBEDDING (ADAPTIVE BATCH + CONCURRENCY + RETRY) ==================
+
+class AdaptiveBatcher:
+    """Ukuran batch yang menyesuaikan diri: x1.5 setelah sukses, /2 setelah gagal."""
+
+    def __init__(self, start: int = BATCH_START, min_size: int = BATCH_MIN, max_size: int = BATCH_MAX):
+        self.size = start
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def success(self) -> None:
+        self.size = min(self.max_size, int(self.size * 1.5) + 1)
+
+    def failure(self) -> None:
+        self.size = max(self.min_size, self.size // 2)
+
+
+def embed_documents(embeddings, docs: list[tuple[str, Document]], workers: int, batcher: AdaptiveBatcher, on_batch) -> int:
+    """
+    Embed (id, doc) secara paralel dalam batch adaptif. Batch yang gagal dipecah dua dan
+    dicoba ulang dengan backoff. `on_batch(items, vectors)` dipanggil di thread utama
+    (insert ke DB) untuk setiap batch yang sukses. Return: jumlah chunk yang di-embed.
+    """
+    pending = list(docs)
+    retries: list[tuple[list, int]] = []   # (items, attempt)
+    done = 0
+
+    def _embed(items, delay):
+        if delay:
+            time.sleep(delay)
+        return embeddings.embed_documents([d.page_content for _, d in items])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+
+        def _submit_next():
+            if retries:
+                items, attempt = retries.pop(0)
+            elif pending:
+                items, attempt = pending[:batcher.size], 0
+                del pending[:batcher.size]
+            else:
+                return False
+            # Backoff dijalankan di worker supaya thread utama tetap bisa memproses batch lain
+            delay = BACKOFF_S * (2 ** (attempt - 1)) if attempt else 0
+            futures[pool.submit(_embed, items, delay)] = (items, attempt)
+            return True
+
+        while len(futures) < workers and _submit_next():
+            pass
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                items, attempt = futures.pop(fut)
+                try:
+                    vectors = fut.result()
+                except Exception as e:
+                    batcher.failure()
+                    if attempt + 1 > MAX_RETRIES:
+                        raise RuntimeError(f"Embedding gagal setelah {MAX_RETRIES} percobaan: {e}") from e
+                    # Pecah batch yang gagal supaya payload/rate limit mengecil
+                    half = max(1, len(items) // 2)
+                    retries.append((items[:half], attempt + 1))
+                    if items[half:]:
+                        retries.append((items[half:], attempt + 1))
+                    print(f"  ! batch {len(items)} gagal ({e}); retry #{attempt + 1}, batch size -> {batcher.size}")
+                    continue
+                batcher.success()
+                on_batch(items, vectors)
+                done += len(items)
+                print(f"  + {done}/{len(docs)} chunk ter-embed (batch size {batcher.size})")
+            while len(futures) < workers and _submit_next():
+                pass
+    return done
+
+
+# ================== PGVECTOR ==================
+
+SQL_RECORD_MODEL = """
+UPDATE langchain_pg_collection
+SET cmetadata = COALESCE(cmetadata::jsonb, '{}'::jsonb) || CAST(:meta AS jsonb)
+WHERE name = :name
+"""
+SQL_RECORDED_MODEL = "SELECT cmetadata->>'embedding_model' FROM langchain_pg_collection WHERE name = :name"
+SQL_COLLECTION_STAMPS = """
+SELECT c.name, c.cmetadata->>'embedding_model' AS model, c.cmetadata->>'updated_at' AS updated_at,
+       (SELECT count(*) FROM langchain_pg_embedding e WHERE e.collection_id = c.uuid) AS n_rows
+FROM langchain_pg_collection c
+WHERE c.name = ANY(:names)
+ORDER BY c.name
+"""
+
+
+def record_embedding_model(conn, collection: str, model: str, dim: int) -> None:
+    """Catat model & dimensi embedding di cmetadata koleksi (dibaca reembed.model_mismatches)."""
+    conn.execute(
+        text(SQL_RECORD_MODEL),
+        {"name": collection, "meta": json.dumps({"embedding_model": model, "embedding_dim": dim, "updated_at": time.time()})},
+    )
+
+
+def touch_collection(conn, collection: str) -> None:
+    """Tandai isi koleksi berubah (cmetadata.updated_at) tanpa mengubah model tercatat."""
+    conn.execute(text(SQL_RECORD_MODEL), {"name": collection, "meta": json.dumps({"updated_at": time.time()})})
+
+
+def collection_stamps(engine, names) -> list[dict]:
+    """(model, updated_at, jumlah baris) per koleksi: versi korpus untuk kunci result store."""
+    with engine.connect() as conn:
+        return [dict(r) for r in conn.execute(text(SQL_COLLECTION_STAMPS), {"names": list(names)}).mappings()]
+
+
+def recorded_model(engine, collection: str) -> str | None:
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text(SQL_RECORDED_MODEL), {"name": collection}).scalar()
+    except Exception:
+        return None
+
+
+def existing_ids(engine, collection: str) -> dict[str, str | None]:
+    """id chunk -> metadata 'source' (file asal) untuk semua chunk di koleksi."""
+    q = text(
+        """
+        SELECT e.id, e.cmetadata->>'source' AS source FROM langchain_pg_embedding e
+        JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+        WHERE c.name = :name
+        """
+    )
+    try:
+        with engine.connect() as conn:
+            return {row.id: row.source for row in conn.execute(q, {"name": collection})}
+    except Exception:
+        # Tabel belum ada (koleksi belum pernah dibuat)
+        return {}
+
+
+def ingest_collection(
+    collection: str,
+    docs: Iterable[Document],
+    embeddings,
+    workers: int = 4,
+    batch_size: int = BATCH_START,
+    prune: bool = True,
+    dry_run: bool = False,
+    model: str | None = None,
+    partial: bool = False,
+    engine=None,
+) -> dict:
+    """
+    Sinkronkan koleksi PGVector dengan dokumen sumber: tambah yang baru, hapus yang basi.
+    `model` (nama model embedding) dicatat di cmetadata koleksi bersama dimensinya.
+    `partial=True` (ingest sebagian file, mis. `--path`): yang dihapus hanya chunk basi dari
+    file sumber yang ikut di-ingest; chunk file lain dibiarkan.
+    `engine`: engine psycopg 3 milik pemanggil (dipakai ulang antar koleksi); default dibuat dari VECTOR_DB_URL.
+    """
+    from langchain_postgres import PGVector
+
+    if engine is None:
+        engine = create_engine(psycopg3_url(DATABASE_URL), pool_pre_ping=True)
+        try:
+            return ingest_collection(collection, docs, embeddings, workers, batch_size, prune, dry_run, model, partial, engine)
+        finally:
+            engine.dispose()
+
+    current: dict[str, Document] = {}
+    for doc in docs:
+        current.setdefault(content_id(collection, doc), doc)
+
+    have = existing_ids(engine, collection)
+    new_items = [(cid, d) for cid, d in current.items() if cid not in have]
+    sources = {d.metadata.get("source") for d in current.values()}
+    stale = (
+        sorted(cid for cid, source in have.items() if cid not in current and (not partial or source in sources))
+        if prune
+        else []
+    )
+    stats = {"collection": collection, "chunks": len(current), "new": len(new_items), "stale": len(stale), "embedded": 0}
+    print(f"[{collection}] {len(current)} chunk sumber, {len(new_items)} baru, {len(stale)} basi")
+    previous = recorded_model(engine, collection) if model and have else None
+    if previous and previous != model and new_items and len(have) > len(stale):
+        print(
+            f"[{collection}] PERINGATAN: koleksi di-embed dengan '{previous}', model aktif '{model}'. "
+            "Jalankan core.reembed supaya vektor tidak tercampur.",
+            file=sys.stderr,
+        )
+    if dry_run:
+        return stats
+
+    store = PGVector(
+        embeddings=embeddings,
+        collection_name=collection,
+        connection=engine,
+        use_jsonb=True,
+    )
+
+    dims = []
+
+    def _insert(items, vectors):
+        if vectors and not dims:
+            dims.append(len(vectors[0]))
+        store.add_embeddings(
+            texts=[d.page_content for _, d in items],
+            embeddings=vectors,
+            metadatas=[d.metadata for _, d in items],
+            ids=[cid for cid, _ in items],
+        )
+
+    if new_items:
+        stats["embedded"] = embed_documents(embeddings, new_items, workers, AdaptiveBatcher(start=batch_size), _insert)
+    if stale:
+        store.delete(ids=stale)
+    if model and dims:
+        with engine.begin() as conn:
+            record_embedding_model(conn, collection, model, dims[0])
+    elif stale:
+        with engine.begin() as conn:
+            touch_collection(conn, collection)
+    return stats
+
+
+# ================== CLI ==================
+
+def _paths(arg_paths: list[str] | None, default_glob: str) -> list[str]:
+    if not arg_paths:
+        return sorted(glob.glob(default_glob))
+    out = []
+    for p in arg_paths:
+        out += sorted(glob.glob(os.path.join(p, "*"))) if os.path.isdir(p) else [p]
+    return out
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Ingestion PermenPAN PDF & SKJ JSON ke PGVector.")
+    parser.add_argument("source", choices=("permenpan", "skj", "all"))
+    parser.add_argument("--path", nargs="*", help="File/folder sumber (default: app/kualitatif/data/...); prune hanya menyentuh file ini")
+    parser.add_argument("--strategy", help=f"permenpan: {PERMENPAN_STRATEGIES}, skj: {SKJ_STRATEGIES}")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--chunk-overlap", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=BATCH_START, help="Ukuran batch awal embedding")
+    parser.add_argument("--workers", type=int, default=4, help="Jumlah request embedding paralel")
+    parser.add_argument("--no-prune", action="store_true", help="Jangan hapus chunk yang sudah tidak ada di sumber")
+    parser.add_argument("--dry-run", action="store_true", help="Hanya hitung chunk baru/basi, tanpa embed/insert")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.path and args.source == "all":
+        parser.error("--path hanya untuk satu sumber (permenpan / skj), bukan 'all'")
+    if not DATABASE_URL:
+        print("VECTOR_DB_URL tidak ditemukan di .env", file=sys.stderr)
+        return 1
+
+    from app.kualitatif.core.embeddings import EMBEDDING_MODEL, get_embeddings
+
+    embeddings = get_embeddings()
+    jobs = []
+    if args.source in ("permenpan", "all"):
+        strategy = args.strategy if args.strategy in PERMENPAN_STRATEGIES else "recursive"
+        paths = _paths(args.path, os.path.join(DATA_DIR, "permenpan", "*.pdf"))
+        docs = iter_permenpan(paths, strategy, args.chunk_size or 500, args.chunk_overlap or 100)
+        jobs.append((PERMENPAN_COLLECTION, docs))
+        if not args.dry_run:
+            from app.kualitatif.core.catalog import get_catalog
+
+            n_levels = get_catalog().load_permenpan_levels(list(iter_permenpan_levels(paths)))
+            print(f"[{PERMENPAN_COLLECTION}] {n_levels} deskriptor level ke katalog")
+    if args.source in ("skj", "all"):
+        strategy = args.strategy if args.strategy in SKJ_STRATEGIES else "kompetensi"
+        paths = _paths(args.path, os.path.join(DATA_DIR, "skj", "*.json"))
+        docs = iter_skj(paths, strategy, args.chunk_size or 1000, args.chunk_overlap or 200)
+        jobs.append((SKJ_COLLECTION, docs))
+
+    from app.kualitatif.core.scope import ensure_metadata_index
+
+    engine = create_engine(psycopg3_url(DATABASE_URL), pool_pre_ping=True)
+    started = time.perf_counter()
+    try:
+        for collection, docs in jobs:
+            stats = ingest_collection(
+                collection,
+                docs,
+                embeddings,
+                workers=args.workers,
+                batch_size=args.batch_size,
+                prune=not args.no_prune,
+                dry_run=args.dry_run,
+                model=EMBEDDING_MODEL,
+                partial=bool(args.path),
+                engine=engine,
+            )
+            if not args.dry_run:
+                stats["metadata_index"] = ensure_metadata_index(engine, collection).get("index")
+            print(json.dumps(stats, ensure_ascii=False))
+    finally:
+        engine.dispose()
+    print(f"Selesai dalam {time.perf_counter() - started:.1f} detik.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
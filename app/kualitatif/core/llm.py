@@ -1,10 +1,10 @@
 # core/llm.py
 import os
 import json
+import threading
 from dotenv import load_dotenv
 
 from langchain_openai import ChatOpenAI
-from .data import SKJ_DATA
 from .prompt import MANAGERIAL_ASSESSMENT_PROMPT
 
 # load .env kalau ada
@@ -14,30 +14,47 @@ LLM_MODEL = os.getenv("LLM_MODEL", "mistralai/mistral-7b-instruct-v0.2")
 API_KEY = os.getenv("API_KEY")
 BASE_URL = os.getenv("BASE_URL", "https://openrouter.ai/api/v1")
 
-llm = ChatOpenAI(
-    base_url =BASE_URL,
-    api_key = API_KEY,
-    model=LLM_MODEL,
-    temperature=0.7,
-    max_tokens=256,
-    streaming=True,
-    verbose=True,
-)
+_LLM = None
+_LLM_LOCK = threading.Lock()
+
+
+def get_llm() -> ChatOpenAI:
+    """LLM default process-wide, dibuat saat pertama dipakai (import modul tidak butuh API_KEY)."""
+    global _LLM
+    with _LLM_LOCK:
+        if _LLM is None:
+            _LLM = ChatOpenAI(
+                base_url =BASE_URL,
+                api_key = API_KEY,
+                model=LLM_MODEL,
+                temperature=0.7,
+                max_tokens=256,
+                streaming=True,
+                verbose=True,
+            )
+        return _LLM
+
+
+def __getattr__(name: str):
+    # Kompatibilitas: `from app.kualitatif.core.llm import llm` tetap jalan, tapi lazy
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def assess_answer(jabatan_name: str, kompetensi_name: str, jawaban_peserta: str, nama_peserta: str = "Peserta Demo") -> str:
     """
     Menggunakan MANAGERIAL_ASSESSMENT_PROMPT untuk menilai jawaban peserta.
     Return: string teks berisi SKOR, JUSTIFIKASI, REKOMENDASI.
     """
-    if jabatan_name not in SKJ_DATA:
-        raise ValueError(f"Jabatan '{jabatan_name}' tidak dikenal.")
+    from .catalog import get_catalog
 
-    skj = SKJ_DATA[jabatan_name]
-    if kompetensi_name not in skj["kompetensi"]:
+    catalog = get_catalog()
+    komp = catalog.kompetensi_info(jabatan_name, kompetensi_name)
+    if komp is None:
+        if catalog.jabatan_info(jabatan_name) is None:
+            raise ValueError(f"Jabatan '{jabatan_name}' tidak dikenal.")
         raise ValueError(f"Kompetensi '{kompetensi_name}' tidak ada di jabatan '{jabatan_name}'.")
 
-    komp = skj["kompetensi"][kompetensi_name]
-
     context_obj = {
         "jabatan": jabatan_name,
         "kompetensi": kompetensi_name,
@@ -46,7 +63,7 @@ def assess_answer(jabatan_name: str, kompetensi_name: str, jawaban_peserta: str,
     }
     context_text = json.dumps(context_obj, ensure_ascii=False)
 
-    chain = MANAGERIAL_ASSESSMENT_PROMPT | llm
+    chain = MANAGERIAL_ASSESSMENT_PROMPT | get_llm()
 
     result = chain.invoke(
         {
@@ -0,0 +1,279 @@
+# core/local_index.py - index vektor lokal (memory-mapped) sebagai alternatif PGVector
+#
+# Korpus PermenPAN & SKJ kecil dan statis, jadi bisa diekspor sekali ke file lokal lalu dicari
+# in-process dengan NumPy (tanpa round trip ke Postgres). File vektor di-mmap read-only, sehingga
+# beberapa worker Streamlit berbagi page cache OS yang sama.
+#
+# Contoh:
+#   uv run python -m app.kualitatif.core.local_index export --dtype int8
+#   uv run python -m app.kualitatif.core.local_index parity "kemampuan mengambil keputusan" --k 4
+#
+# Format per koleksi (di RAG_LOCAL_INDEX_DIR):
+#   <koleksi>.vectors.npy  float32 [n, dim] atau int8 [n, dim] (vektor sudah dinormalisasi L2)
+#   <koleksi>.scales.npy   float32 [n], skala per baris (hanya untuk int8)
+#   <koleksi>.meta.json    header (model, dim, dtype, count) + id, teks & metadata per baris
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.kualitatif.core.db import psycopg3_url
+from app.kualitatif.core.embeddings import DATA_DIR, EMBEDDING_MODEL
+from app.kualitatif.core.ingest import PERMENPAN_COLLECTION, SKJ_COLLECTION
+from app.kualitatif.core.scope import matches
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("VECTOR_DB_URL")
+LOCAL_INDEX_DIR = os.getenv("RAG_LOCAL_INDEX_DIR", os.path.join(DATA_DIR, "vector_index"))
+LOCAL_INDEX_DTYPES = ("float32", "int8")
+EXPORT_FETCH_SIZE = 1000
+
+SQL_EXPORT = """
+SELECT e.id, e.document, e.cmetadata, e.embedding::text AS embedding
+FROM langchain_pg_embedding e
+JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+WHERE c.name = :name
+ORDER BY e.id
+"""
+
+
+def _paths(directory: str, collection: str) -> dict[str, str]:
+    base = os.path.join(directory, collection)
+    return {"vectors": base + ".vectors.npy", "scales": base + ".scales.npy", "meta": base + ".meta.json"}
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def quantize_int8(matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Kuantisasi simetris per baris: v ~= q * scale, q di [-127, 127]."""
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+
+def write_index(
+    directory: str,
+    collection: str,
+    ids: list[str],
+    documents: list[str],
+    metadatas: list[dict],
+    vectors: np.ndarray,
+    dtype: str = "float32",
+    model: str = EMBEDDING_MODEL,
+) -> dict:
+    """Tulis index satu koleksi (atomik: file sementara lalu os.replace)."""
+    if dtype not in LOCAL_INDEX_DTYPES:
+        raise ValueError(f"dtype harus salah satu dari {LOCAL_INDEX_DTYPES}")
+    os.makedirs(directory, exist_ok=True)
+    paths = _paths(directory, collection)
+    matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+
+    header = {
+        "collection": collection,
+        "model": model,
+        "dim": int(matrix.shape[1]) if matrix.size else 0,
+        "dtype": dtype,
+        "count": int(matrix.shape[0]),
+        "exported_at": time.time(),
+    }
+    if dtype == "int8":
+        matrix, scales = quantize_int8(matrix)
+        with open(paths["scales"] + ".tmp", "wb") as f:
+            np.save(f, scales)
+        os.replace(paths["scales"] + ".tmp", paths["scales"])
+    with open(paths["vectors"] + ".tmp", "wb") as f:
+        np.save(f, matrix)
+    with open(paths["meta"] + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "header": header,
+                "rows": [{"id": i, "document": d, "metadata": m} for i, d, m in zip(ids, documents, metadatas)],
+            },
+            f,
+            ensure_ascii=False,
+        )
+    # meta terakhir: reader yang melihat header baru pasti juga melihat vektor baru
+    os.replace(paths["vectors"] + ".tmp", paths["vectors"])
+    os.replace(paths["meta"] + ".tmp", paths["meta"])
+    return header
+
+
+def export_collection(engine, collection: str, directory: str = LOCAL_INDEX_DIR, dtype: str = "float32") -> dict:
+    """Ekspor koleksi PGVector ke index lokal."""
+    ids, documents, metadatas, rows = [], [], [], []
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(text(SQL_EXPORT), {"name": collection})
+        while batch := result.fetchmany(EXPORT_FETCH_SIZE):
+            for r in batch:
+                ids.append(str(r.id))
+                documents.append(r.document)
+                metadatas.append(r.cmetadata or {})
+                rows.append(np.array(json.loads(r.embedding), dtype=np.float32))
+    if not rows:
+        raise ValueError(f"Koleksi '{collection}' kosong atau tidak ada.")
+    return write_index(directory, collection, ids, documents, metadatas, np.vstack(rows), dtype=dtype)
+
+
+class LocalVectorIndex:
+    """Index satu koleksi: vektor di-mmap read-only, pencarian cosine top-k dengan NumPy."""
+
+    def __init__(self, directory: str, collection: str, expected_model: str | None = EMBEDDING_MODEL):
+        paths = _paths(directory, collection)
+        with open(paths["meta"], "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.header = meta["header"]
+        if expected_model and self.header["model"] != expected_model:
+            raise ValueError(
+                f"Index lokal '{collection}' dibuat dengan model '{self.header['model']}', "
+                f"sedangkan model aktif '{expected_model}'. Ekspor ulang index."
+            )
+        self.collection = collection
+        self.ids = [r["id"] for r in meta["rows"]]
+        self.documents = [r["document"] for r in meta["rows"]]
+        self.metadatas = [r["metadata"] for r in meta["rows"]]
+        self.vectors = np.load(paths["vectors"], mmap_mode="r")
+        self.scales = np.load(paths["scales"], mmap_mode="r") if self.header["dtype"] == "int8" else None
+        self._slices: dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def positions(self, flt: dict) -> np.ndarray:
+        """Posisi baris yang metadata-nya cocok dengan filter (di-cache per filter)."""
+        key = json.dumps(flt, sort_keys=True)
+        if key not in self._slices:
+            self._slices[key] = np.array([i for i, m in enumerate(self.metadatas) if matches(m, flt)], dtype=np.int64)
+        return self._slices[key]
+
+    def scores(self, vector, rows: np.ndarray | None = None) -> np.ndarray:
+        q = np.asarray(vector, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        sims = vectors @ q
+        if self.scales is not None:
+            sims = sims * (self.scales if rows is None else self.scales[rows])
+        return sims
+
+    def search_by_vector(self, vector, k: int = 4, flt: dict | None = None) -> list[tuple[int, float]]:
+        """[(posisi baris, cosine similarity)] urut menurun; `flt` membatasi ke irisan metadata."""
+        rows = self.positions(flt) if flt else None
+        sims = self.scores(vector, rows)
+        k = min(k, len(sims))
+        if k <= 0:
+            return []
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(int(i if rows is None else rows[i]), float(sims[i])) for i in top]
+
+    def document(self, pos: int) -> Document:
+        return Document(id=self.ids[pos], page_content=self.documents[pos], metadata=self.metadatas[pos])
+
+
+class LocalIndexRetriever(BaseRetriever):
+    """Retriever LangChain di atas LocalVectorIndex (antarmuka sama dengan retriever PGVector)."""
+
+    index: Any
+    embeddings: Any
+    k: int = 4
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, filter: dict | None = None
+    ) -> list[Document]:
+        vector = self.embeddings.embed_query(query)
+        return [self.index.document(pos) for pos, _ in self.index.search_by_vector(vector, self.k, filter)]
+
+
+def load_local_retrievers(embeddings, directory: str = LOCAL_INDEX_DIR, k: int = 4) -> tuple[LocalIndexRetriever, LocalIndexRetriever]:
+    """Retriever PermenPAN & SKJ dari index lokal."""
+    return tuple(
+        LocalIndexRetriever(index=LocalVectorIndex(directory, name), embeddings=embeddings, k=k)
+        for name in (PERMENPAN_COLLECTION, SKJ_COLLECTION)
+    )
+
+
+# ================== PARITY CHECK ==================
+
+def _doc_key(doc: Document) -> str:
+    return doc.id or doc.page_content
+
+
+def parity_report(reference, candidate, queries: list[str], k: int = 4) -> dict:
+    """
+    Bandingkan hasil retriever acuan (PGVector) dengan retriever lokal untuk query yang sama.
+    overlap@k = |top-k acuan ∩ top-k lokal| / k; top1 = dokumen peringkat pertama sama.
+    """
+    rows = []
+    for q in queries:
+        ref = [_doc_key(d) for d in reference.invoke(q)[:k]]
+        started = time.perf_counter()
+        got = [_doc_key(d) for d in candidate.invoke(q)[:k]]
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        rows.append(
+            {
+                "query": q,
+                "overlap_at_k": len(set(ref) & set(got)) / max(len(ref), 1),
+                "top1_match": bool(ref) and bool(got) and ref[0] == got[0],
+                "local_ms": round(elapsed_ms, 3),
+            }
+        )
+    return {
+        "k": k,
+        "mean_overlap_at_k": round(sum(r["overlap_at_k"] for r in rows) / max(len(rows), 1), 4),
+        "top1_match_rate": round(sum(r["top1_match"] for r in rows) / max(len(rows), 1), 4),
+        "queries": rows,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Ekspor / uji index vektor lokal PermenPAN & SKJ.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="Ekspor koleksi PGVector ke file lokal")
+    p_export.add_argument("--dtype", choices=LOCAL_INDEX_DTYPES, default="float32")
+    p_export.add_argument("--dir", default=LOCAL_INDEX_DIR)
+    p_parity = sub.add_parser("parity", help="Bandingkan hasil index lokal dengan PGVector")
+    p_parity.add_argument("queries", nargs="+")
+    p_parity.add_argument("--k", type=int, default=4)
+    p_parity.add_argument("--dir", default=LOCAL_INDEX_DIR)
+    args = parser.parse_args(argv)
+    if not DATABASE_URL:
+        print("VECTOR_DB_URL tidak ditemukan di .env", file=sys.stderr)
+        return 1
+
+    if args.command == "export":
+        engine = create_engine(psycopg3_url(DATABASE_URL))
+        for name in (PERMENPAN_COLLECTION, SKJ_COLLECTION):
+            print(json.dumps(export_collection(engine, name, args.dir, args.dtype), ensure_ascii=False))
+        return 0
+
+    from app.kualitatif.core.embeddings import get_embeddings
+    from app.kualitatif.core.retrieval import DualCollectionRetriever
+
+    embeddings = get_embeddings()
+    dual = DualCollectionRetriever(DATABASE_URL, embeddings, k=args.k)
+    local = load_local_retrievers(embeddings, args.dir, k=args.k)
+    ok = True
+    for name, candidate in zip((PERMENPAN_COLLECTION, SKJ_COLLECTION), local):
+        report = parity_report(dual.retriever(name), candidate, args.queries, args.k)
+        print(json.dumps({"collection": name, **report}, ensure_ascii=False, indent=2))
+        ok = ok and report["top1_match_rate"] == 1.0
+    return 0 if ok else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
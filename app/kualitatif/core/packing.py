@@ -0,0 +1,142 @@
+# core/packing.py - dedup, rerank & pengepakan konteks RAG dengan budget token
+#
+# Retriever mengambil kandidat lebih banyak (RAG_RETRIEVAL_CANDIDATES), lalu di sini:
+#   1. chunk duplikat / hampir sama dibuang, overlap antar chunk berurutan (chunk_overlap) dipotong
+#   2. kandidat di-rerank dengan skor lokal ringan: BM25 terhadap query + peringkat vektor asal
+#   3. chunk diisi berurutan sampai budget token slot konteks habis (chunk terakhir boleh dipotong
+#      di batas kalimat), dan chunk yang dipakai dicatat
+import math
+import os
+import re
+from collections import Counter
+
+from langchain_core.documents import Document
+
+CONTEXT_BUDGET_PERMENPAN = int(os.getenv("RAG_CONTEXT_BUDGET_PERMENPAN", "700"))
+CONTEXT_BUDGET_SKJ = int(os.getenv("RAG_CONTEXT_BUDGET_SKJ", "500"))
+RETRIEVAL_CANDIDATES = int(os.getenv("RAG_RETRIEVAL_CANDIDATES", "8"))
+
+LEXICAL_WEIGHT = 0.6           # sisanya bobot peringkat vektor
+NEAR_DUPLICATE = 0.8           # containment shingle >= ini -> dianggap duplikat
+MIN_OVERLAP_CHARS = 40         # overlap prefix/suffix minimal yang dipotong
+MAX_OVERLAP_CHARS = 400
+MIN_TRUNCATED_TOKENS = 60      # sisa budget minimal untuk memotong chunk (kalau kurang, dilewati)
+SEPARATOR = "\n\n---\n\n"
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+SENTENCE_END_RE = re.compile(r"[.!?;:\n]")
+STOPWORDS = {
+    "yang", "di", "ke", "dari", "dan", "atau", "untuk", "dengan", "pada", "ini", "itu", "dalam",
+    "adalah", "sebagai", "oleh", "akan", "tidak", "juga", "serta", "dapat", "secara", "saya",
+    "jabatan", "kompetensi", "soal", "jawaban", "kasus",
+}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(s: str) -> list[str]:
+    return [t for t in TOKEN_RE.findall((s or "").lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def estimate_tokens(s: str) -> int:
+    """Estimasi kasar jumlah token (~4 karakter per token)."""
+    return max(1, len(s) // 4)
+
+
+def _shingles(tokens: list[str], n: int = 3) -> set:
+    return {tuple(tokens[i:i + n]) for i in range(max(1, len(tokens) - n + 1))}
+
+
+def _trim_overlap(previous: list[str], text: str) -> str:
+    """Buang prefix `text` yang sama dengan suffix chunk yang sudah dipilih (chunk_overlap splitter)."""
+    for prev in previous:
+        tail = prev[-MAX_OVERLAP_CHARS:]
+        for i in range(len(tail) - MIN_OVERLAP_CHARS + 1):
+            if text.startswith(tail[i:]):
+                return text[len(tail) - i:].lstrip()
+    return text
+
+
+def dedupe(docs: list[Document]) -> list[Document]:
+    """Buang chunk identik / hampir identik (urutan asal dipertahankan)."""
+    kept, kept_shingles, seen = [], [], set()
+    for d in docs:
+        key = d.id or d.page_content
+        if key in seen or not d.page_content.strip():
+            continue
+        seen.add(key)
+        sh = _shingles(tokenize(d.page_content))
+        # containment: sebagian besar shingle chunk ini sudah ada di chunk yang disimpan
+        if any(len(sh & other) / max(1, len(sh)) >= NEAR_DUPLICATE for other in kept_shingles):
+            continue
+        kept.append(d)
+        kept_shingles.append(sh)
+    return kept
+
+
+def rerank(query: str, docs: list[Document]) -> list[tuple[Document, float]]:
+    """Skor = bobot * BM25 (dinormalisasi) + (1 - bobot) * peringkat vektor asal."""
+    if not docs:
+        return []
+    q_terms = set(tokenize(query))
+    doc_tokens = [tokenize(d.page_content) for d in docs]
+    n = len(docs)
+    avgdl = sum(len(t) for t in doc_tokens) / n or 1.0
+    df = Counter(term for toks in doc_tokens for term in set(toks) if term in q_terms)
+    bm25 = []
+    for toks in doc_tokens:
+        tf = Counter(t for t in toks if t in q_terms)
+        score = 0.0
+        for term, f in tf.items():
+            idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+            score += idf * f * (BM25_K1 + 1) / (f + BM25_K1 * (1 - BM25_B + BM25_B * len(toks) / avgdl))
+        bm25.append(score)
+    top = max(bm25) or 1.0
+    scored = [
+        (d, LEXICAL_WEIGHT * (bm25[i] / top) + (1 - LEXICAL_WEIGHT) * (1 - i / n))
+        for i, d in enumerate(docs)
+    ]
+    return sorted(scored, key=lambda x: -x[1])
+
+
+def _truncate(text: str, budget_tokens: int) -> str:
+    cut = text[: budget_tokens * 4]
+    ends = [m.end() for m in SENTENCE_END_RE.finditer(cut)]
+    return cut[: ends[-1]].rstrip() if ends else cut.rstrip()
+
+
+def pack_context(query: str, docs: list[Document], budget_tokens: int) -> tuple[str, list[dict]]:
+    """
+    Dedup + rerank + isi sampai budget. Return (teks konteks, daftar chunk yang dipakai:
+    id, source, score, tokens, truncated).
+    """
+    parts: list[str] = []
+    used: list[dict] = []
+    remaining = budget_tokens
+    for doc, score in rerank(query, dedupe(docs)):
+        text = _trim_overlap(parts, doc.page_content.strip())
+        if not text:
+            continue
+        tokens = estimate_tokens(text)
+        truncated = False
+        if tokens > remaining:
+            if remaining < MIN_TRUNCATED_TOKENS:
+                continue
+            text = _truncate(text, remaining)
+            tokens = estimate_tokens(text)
+            truncated = True
+        parts.append(text)
+        used.append(
+            {
+                "id": doc.id,
+                "source": doc.metadata.get("source"),
+                "page": doc.metadata.get("page"),
+                "score": round(score, 4),
+                "tokens": tokens,
+                "truncated": truncated,
+            }
+        )
+        remaining -= tokens
+        if remaining < MIN_TRUNCATED_TOKENS:
+            break
+    return SEPARATOR.join(parts), used
@@ -0,0 +1,150 @@
+# core/profile.py - penilaian profil lengkap: semua kompetensi satu jabatan sekaligus + analisis gap
+#
+# Alih-alih menilai kompetensi satu per satu, semua kompetensi yang dijawab peserta dinilai
+# bersamaan (fan-out di thread pool), sehingga satu profil selesai kira-kira dalam waktu penilaian
+# paling lambat, bukan jumlah semuanya. Query semua kompetensi di-embed dulu dalam satu request
+# batch (cache embedding), jadi retrieval tiap penilaian tidak lagi menunggu embedding sendiri-sendiri,
+# dan query yang sama hanya di-embed sekali. Hasilnya lalu masuk ke satu panggilan
+# COMPETENCY_GAP_ANALYSIS_PROMPT.
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Iterator
+
+from pydantic import BaseModel, Field
+
+from app.kualitatif.core.assessment import AssessmentStream, stream_answer_rag_free, stream_answer_rag_structured
+from app.kualitatif.core.catalog import get_catalog
+from app.kualitatif.core.llm import get_llm
+from app.kualitatif.core.prompt import COMPETENCY_GAP_ANALYSIS_PROMPT
+from app.kualitatif.core.results import AssessmentResult
+
+PROFILE_MAX_WORKERS = 8
+
+
+class ProfileResult(BaseModel):
+    nama: str
+    jabatan: str
+    results: dict[str, AssessmentResult] = Field(default_factory=dict, description="Hasil per kompetensi")
+    errors: dict[str, str] = Field(default_factory=dict, description="Error per kompetensi")
+    level_target: dict[str, int] = Field(default_factory=dict)
+    assess_s: float | None = Field(default=None, description="Wall-time fan-out penilaian (detik)")
+    slowest_s: float | None = Field(default=None, description="Penilaian tunggal paling lambat (detik)")
+
+
+def _embeddings_of(retriever) -> Any | None:
+    """Model embedding di balik retriever (DualCollectionRetriever atau index lokal)."""
+    dual = getattr(retriever, "dual", None)
+    return getattr(dual, "embeddings", None) or getattr(retriever, "embeddings", None)
+
+
+def prefetch_query_embeddings(streams: list[AssessmentStream], retrievers) -> None:
+    """Embed query semua penilaian dalam satu batch (hanya kalau cache embedding mendukung)."""
+    for retriever in retrievers:
+        embeddings = _embeddings_of(retriever)
+        if embeddings is not None and hasattr(embeddings, "embed_queries"):
+            embeddings.embed_queries([s.query for s in streams])
+            return
+
+
+def assess_profile(
+    jabatan_name: str,
+    nama_peserta: str,
+    answers: dict[str, dict],
+    permenpan_retriever: Any | None,
+    skj_retriever: Any | None,
+    on_result=None,
+    llm: Any | None = None,
+    max_workers: int = PROFILE_MAX_WORKERS,
+) -> ProfileResult:
+    """
+    Nilai semua kompetensi di `answers` bersamaan.
+    answers: {kompetensi: {"jawaban": ..., "soal_id": ...}} atau {... "kasus": ...} (mode kasus bebas).
+    `on_result(kompetensi, AssessmentResult | Exception)` dipanggil di thread pemanggil tiap satu selesai.
+    """
+    profile = ProfileResult(nama=nama_peserta, jabatan=jabatan_name)
+    streams: dict[str, AssessmentStream] = {}
+    for kompetensi, answer in answers.items():
+        common = dict(
+            jabatan_name=jabatan_name,
+            kompetensi_name=kompetensi,
+            jawaban_peserta=answer["jawaban"],
+            nama_peserta=nama_peserta,
+            permenpan_retriever=permenpan_retriever,
+            skj_retriever=skj_retriever,
+            llm=llm,
+        )
+        try:
+            if answer.get("soal_id"):
+                streams[kompetensi] = stream_answer_rag_structured(soal_id=answer["soal_id"], **common)
+            else:
+                streams[kompetensi] = stream_answer_rag_free(kasus_text=answer.get("kasus", ""), **common)
+            profile.level_target[kompetensi] = int(streams[kompetensi].komp["level_target"])
+        except ValueError as e:
+            profile.errors[kompetensi] = str(e)
+            if on_result is not None:
+                on_result(kompetensi, e)
+    if not streams:
+        return profile
+
+    started = time.perf_counter()
+    try:
+        prefetch_query_embeddings(list(streams.values()), (permenpan_retriever, skj_retriever))
+    except Exception:
+        pass  # embedding per penilaian tetap jalan seperti biasa
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(streams)), thread_name_prefix="rag-profile") as pool:
+        futures = {pool.submit(stream.consume): kompetensi for kompetensi, stream in streams.items()}
+        for future in as_completed(futures):
+            kompetensi = futures[future]
+            try:
+                profile.results[kompetensi] = future.result()
+                outcome = profile.results[kompetensi]
+            except Exception as e:
+                profile.errors[kompetensi] = str(e)
+                outcome = e
+            if on_result is not None:
+                on_result(kompetensi, outcome)
+    profile.assess_s = time.perf_counter() - started
+    profile.slowest_s = max((s.total_s or 0.0) for s in streams.values())
+    return profile
+
+
+# ================== ANALISIS GAP ==================
+
+def gap_analysis_inputs(profile: ProfileResult) -> dict:
+    catalog = get_catalog()
+    kompetensi = catalog.kompetensi(profile.jabatan)
+    context = json.dumps(
+        {
+            "jabatan": profile.jabatan,
+            "kompetensi": {
+                name: {"deskripsi": kompetensi.get(name, {}).get("deskripsi", ""), "level_target": target}
+                for name, target in profile.level_target.items()
+            },
+        },
+        ensure_ascii=False,
+    )
+    hasil = "\n".join(
+        f"- {name}: level {r.level_prediksi} (target {profile.level_target.get(name)}). "
+        f"Ringkasan: {r.ringkasan_perilaku} Gap: {r.gap}"
+        for name, r in sorted(profile.results.items())
+    )
+    return {
+        "context": context,
+        "nama": profile.nama,
+        "jabatan": profile.jabatan,
+        "level_sekarang": ", ".join(f"{n}: {r.level_prediksi}" for n, r in sorted(profile.results.items())),
+        "level_target": ", ".join(f"{n}: {profile.level_target.get(n)}" for n in sorted(profile.results)),
+        "hasil_assessment": hasil,
+    }
+
+
+def stream_gap_analysis(profile: ProfileResult, llm: Any | None = None) -> Iterator[str]:
+    """Satu panggilan COMPETENCY_GAP_ANALYSIS_PROMPT untuk seluruh profil (token di-stream)."""
+    if not profile.results:
+        return
+    chain = COMPETENCY_GAP_ANALYSIS_PROMPT | (llm if llm is not None else get_llm())
+    for chunk in chain.stream(gap_analysis_inputs(profile)):
+        if chunk.content:
+            yield chunk.content
@@ -0,0 +1,114 @@
+# core/reembed.py - migrasi: embed ulang koleksi PGVector dengan model embedding aktif
+#
+# Id chunk di ingestion = hash konten (bukan model), jadi mengganti model embedding
+# (mis. RAG_EMBEDDING_BACKEND=local) tidak otomatis meng-embed ulang koleksi. Perintah ini
+# mengambil teks semua chunk, meng-embed ulang secara batch (di luar transaksi), lalu mengganti
+# vektor dalam SATU transaksi per koleksi, sehingga pencarian tidak pernah melihat campuran
+# dimensi lama & baru. Index ANN koleksi (terikat dimensi lama) ikut dihapus di transaksi yang
+# sama -> pencarian menunggu sampai commit; buat ulang index sesudahnya.
+# Model & dimensi dicatat di cmetadata koleksi.
+#
+# Contoh:
+#   RAG_EMBEDDING_BACKEND=local uv run python -m app.kualitatif.core.reembed --dry-run
+#   RAG_EMBEDDING_BACKEND=local uv run python -m app.kualitatif.core.reembed
+#   uv run python -m app.kualitatif.core.ann create --method hnsw
+#   uv run python -m app.kualitatif.core.local_index export     # kalau memakai backend local index
+import argparse
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+from app.kualitatif.core.ann import ANN_METHODS, QUANTIZATIONS, index_name
+from app.kualitatif.core.db import psycopg3_url
+from app.kualitatif.core.ingest import PERMENPAN_COLLECTION, SKJ_COLLECTION, record_embedding_model
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("VECTOR_DB_URL")
+REEMBED_BATCH = 64
+
+SQL_ROWS = """
+SELECT e.id, e.document
+FROM langchain_pg_embedding e
+JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+WHERE c.name = :name
+ORDER BY e.id
+"""
+SQL_COLLECTION_MODELS = """
+SELECT c.name, c.cmetadata->>'embedding_model' AS model, c.cmetadata->>'embedding_dim' AS dim,
+       EXISTS (SELECT 1 FROM langchain_pg_embedding e WHERE e.collection_id = c.uuid) AS has_rows
+FROM langchain_pg_collection c
+WHERE c.name = ANY(:names)
+"""
+
+
+def reembed_collection(engine, collection: str, embeddings, model: str, batch_size: int = REEMBED_BATCH, dry_run: bool = False) -> dict:
+    with engine.connect() as conn:
+        rows = conn.execute(text(SQL_ROWS), {"name": collection}).all()
+    stats = {"collection": collection, "chunks": len(rows), "model": model}
+    if dry_run or not rows:
+        return stats
+
+    started = time.perf_counter()
+    vectors = []
+    for i in range(0, len(rows), batch_size):
+        vectors += embeddings.embed_documents([r.document for r in rows[i:i + batch_size]])
+        print(f"  [{collection}] {min(i + batch_size, len(rows))}/{len(rows)} chunk ter-embed", file=sys.stderr)
+    stats["embed_s"] = round(time.perf_counter() - started, 2)
+    stats["dim"] = len(vectors[0])
+
+    with engine.begin() as conn:
+        for method in ANN_METHODS:
+            for quantization in QUANTIZATIONS:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index_name(collection, method, quantization)}"))
+        conn.execute(
+            text("UPDATE langchain_pg_embedding SET embedding = CAST(:v AS vector) WHERE id = :id"),
+            [{"id": r.id, "v": "[" + ",".join(map(str, v)) + "]"} for r, v in zip(rows, vectors)],
+        )
+        record_embedding_model(conn, collection, model, stats["dim"])
+    stats["total_s"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+def model_mismatches(database_url: str, model: str, names=(PERMENPAN_COLLECTION, SKJ_COLLECTION)) -> list[str]:
+    """
+    Koleksi berisi yang di-embed dengan model lain, atau yang modelnya tidak tercatat
+    (data lama sebelum ingestion mencatat model -> tidak bisa dipastikan cocok).
+    """
+    engine = create_engine(psycopg3_url(database_url))
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(text(SQL_COLLECTION_MODELS), {"names": list(names)}).all()
+    finally:
+        engine.dispose()
+    return [f"{r.name} ({r.model or 'model tidak tercatat'})" for r in rows if r.has_rows and r.model != model]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Embed ulang koleksi PGVector dengan model embedding aktif.")
+    parser.add_argument("--collection", nargs="+", default=[PERMENPAN_COLLECTION, SKJ_COLLECTION])
+    parser.add_argument("--batch-size", type=int, default=REEMBED_BATCH)
+    parser.add_argument("--dry-run", action="store_true", help="Hanya hitung chunk, tanpa embed/update")
+    args = parser.parse_args(argv)
+    if not DATABASE_URL:
+        print("VECTOR_DB_URL tidak ditemukan di .env", file=sys.stderr)
+        return 1
+
+    from app.kualitatif.core.embeddings import EMBEDDING_MODEL, get_embeddings
+
+    engine = create_engine(psycopg3_url(DATABASE_URL))
+    embeddings = None if args.dry_run else get_embeddings()
+    for name in args.collection:
+        result = reembed_collection(engine, name, embeddings, EMBEDDING_MODEL, args.batch_size, args.dry_run)
+        print(json.dumps(result, ensure_ascii=False))
+    if not args.dry_run:
+        print("Selesai. Buat ulang index ANN (core.ann create) dan ekspor ulang index lokal kalau dipakai.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+# core/results.py - hasil penilaian terstruktur, persisten & terdeduplikasi
+#
+# Output LLM (LEVEL_PREDIKSI / RINGKASAN_PERILAKU / ALASAN / GAP / REKOMENDASI) di-parse menjadi
+# AssessmentResult lalu disimpan di Postgres (tabel assessment_results). Input yang identik
+# (hash input prompt + model + versi template) langsung mengembalikan hasil tersimpan tanpa
+# retrieval & panggilan LLM ulang. Kalau format output rusak, hanya langkah formatting yang diulang.
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from dotenv import load_dotenv
+from pydantic import BaseModel, Field
+from sqlalchemy import create_engine, text
+
+from langchain_core.prompts import PromptTemplate
+
+from app.kualitatif.core.db import psycopg3_url
+
+load_dotenv()
+
+RESULTS_DB_URL = os.getenv("RAG_RESULTS_DB_URL") or os.getenv("VECTOR_DB_URL")
+RESULT_CACHE = os.getenv("RAG_RESULT_CACHE", "1") == "1"
+# Setelah gagal konek, store dianggap tidak tersedia selama ini (detik) sebelum dicoba lagi
+RESULT_STORE_RETRY_S = int(os.getenv("RAG_RESULT_STORE_RETRY_S", "60"))
+FORMAT_RETRIES = 2
+
+LABELS = ("LEVEL_PREDIKSI", "RINGKASAN_PERILAKU", "ALASAN", "GAP", "REKOMENDASI")
+LABEL_RE = re.compile(r"^[\s>*#\-]*(" + "|".join(LABELS) + r")[\s*]*:\s*", re.M)
+LEVEL_RE = re.compile(r"\b([1-5])\b")
+# Untuk stream: angka level pertama setelah label, meski teks berikutnya belum datang
+LEVEL_PARTIAL_RE = re.compile(r"LEVEL_PREDIKSI[\s*]*:[\s*\[]*([1-5])(?!\d)")
+
+
+class AssessmentResult(BaseModel):
+    level_prediksi: int | None = Field(description="Level kompetensi 1-5 hasil prediksi")
+    ringkasan_perilaku: str = Field(default="", description="Ringkasan perilaku peserta")
+    alasan: str = Field(default="", description="Alasan pemetaan level")
+    gap: str = Field(default="", description="Di bawah / sesuai / di atas level target + alasan")
+    rekomendasi: str = Field(default="", description="Rekomendasi pengembangan")
+    raw: str = Field(default="", description="Output mentah LLM")
+    parsed: bool = Field(default=True, description="False kalau format output tetap tidak bisa di-parse")
+    cached: bool = Field(default=False, description="True kalau diambil dari result store")
+    context_permenpan: str = Field(default="", description="Konteks PermenPAN yang dipakai")
+    context_skj: str = Field(default="", description="Konteks SKJ yang dipakai")
+    chunks_used: dict = Field(default_factory=dict, description="Chunk konteks yang dipakai per slot (id, source, skor, token)")
+    ttft_s: float | None = Field(default=None, description="Time-to-first-token (detik), tidak disimpan")
+
+
+class AssessmentParseError(ValueError):
+    """Output LLM tidak mengikuti FORMAT OUTPUT."""
+
+
+def parse_assessment(raw: str) -> AssessmentResult:
+    """Parse output berlabel menjadi AssessmentResult; toleran terhadap markdown (**LABEL**:, bullet)."""
+    matches = list(LABEL_RE.finditer(raw or ""))
+    sections: dict[str, str] = {}
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(raw)
+        sections.setdefault(m.group(1), raw[m.end():end].strip())
+    missing = [label for label in LABELS if label not in sections]
+    if missing:
+        raise AssessmentParseError(f"Label tidak ditemukan: {', '.join(missing)}")
+    level = LEVEL_RE.search(sections["LEVEL_PREDIKSI"])
+    if not level:
+        raise AssessmentParseError(f"LEVEL_PREDIKSI bukan angka 1-5: {sections['LEVEL_PREDIKSI'][:50]!r}")
+    return AssessmentResult(
+        level_prediksi=int(level.group(1)),
+        ringkasan_perilaku=sections["RINGKASAN_PERILAKU"],
+        alasan=sections["ALASAN"],
+        gap=sections["GAP"],
+        rekomendasi=sections["REKOMENDASI"],
+        raw=raw,
+    )
+
+
+def level_from_partial(partial: str) -> int | None:
+    """LEVEL_PREDIKSI dari output yang masih di-stream (None kalau belum muncul)."""
+    m = LEVEL_PARTIAL_RE.search(partial)
+    return int(m.group(1)) if m else None
+
+
+FORMAT_FIX_PROMPT = PromptTemplate(
+    template="""
+Ubah teks penilaian berikut ke FORMAT OUTPUT di bawah. JANGAN mengubah isi penilaian,
+hanya susun ulang ke label yang diminta. LEVEL_PREDIKSI hanya satu angka 1-5.
+
+TEKS PENILAIAN:
+{raw}
+
+FORMAT OUTPUT (WAJIB, JANGAN TAMBAH LABEL LAIN):
+LEVEL_PREDIKSI: [1-5]
+RINGKASAN_PERILAKU: [...]
+ALASAN: [...]
+GAP: [...]
+REKOMENDASI: [...]
+""",
+    input_variables=["raw"],
+)
+
+
+def parse_with_format_retry(raw: str, llm, retries: int = FORMAT_RETRIES) -> AssessmentResult:
+    """Parse; kalau gagal, minta LLM memformat ulang output yang sama (tanpa retrieval/penilaian ulang)."""
+    text_ = raw
+    for attempt in range(retries + 1):
+        try:
+            return parse_assessment(text_)
+        except AssessmentParseError:
+            if attempt == retries:
+                break
+            text_ = (FORMAT_FIX_PROMPT | llm).invoke({"raw": raw}).content
+    return AssessmentResult(level_prediksi=None, raw=raw, parsed=False)
+
+
+# ================== CACHE KEY ==================
+
+def template_version(prompt: PromptTemplate) -> str:
+    return hashlib.sha256(prompt.template.encode("utf-8")).hexdigest()[:12]
+
+
+def llm_identity(llm) -> str:
+    """Identitas LLM yang benar-benar dipakai (kelas + model), bukan sekadar LLM_MODEL default."""
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+    return f"{type(llm).__name__}:{model}" if model else type(llm).__name__
+
+
+def input_hash(mode: str, inputs: dict, model: str, version: str, context: dict | None = None) -> str:
+    """
+    Hash input prompt + identitas LLM + versi template + versi konteks RAG (`context`, lihat
+    assessment.context_version). Konteks RAG sendiri tidak di-hash: isinya bergantung korpus &
+    konfigurasi retrieval, bukan hanya input, jadi versi keduanya yang masuk kunci.
+    """
+    payload = json.dumps(
+        {
+            "mode": mode,
+            "inputs": {k: str(v).strip() for k, v in sorted(inputs.items())},
+            "model": model,
+            "template": version,
+            "context": context,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ================== STORE (POSTGRES) ==================
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS assessment_results (
+    id BIGSERIAL PRIMARY KEY,
+    input_hash TEXT NOT NULL UNIQUE,
+    mode TEXT NOT NULL,
+    nama TEXT NOT NULL,
+    jabatan TEXT NOT NULL,
+    kompetensi TEXT NOT NULL,
+    soal_id TEXT,
+    level_target INTEGER,
+    level_prediksi INTEGER,
+    ringkasan_perilaku TEXT NOT NULL,
+    alasan TEXT NOT NULL,
+    gap TEXT NOT NULL,
+    rekomendasi TEXT NOT NULL,
+    raw TEXT NOT NULL,
+    context_permenpan TEXT NOT NULL,
+    context_skj TEXT NOT NULL,
+    chunks_used JSONB NOT NULL DEFAULT '{}',
+    inputs JSONB NOT NULL,
+    model TEXT NOT NULL,
+    template_version TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+ALTER TABLE assessment_results ADD COLUMN IF NOT EXISTS chunks_used JSONB NOT NULL DEFAULT '{}';
+CREATE INDEX IF NOT EXISTS ix_assessment_results_nama ON assessment_results (nama);
+CREATE INDEX IF NOT EXISTS ix_assessment_results_jabatan_kompetensi ON assessment_results (jabatan, kompetensi);
+CREATE INDEX IF NOT EXISTS ix_assessment_results_kompetensi ON assessment_results (kompetensi);
+"""
+
+RESULT_FIELDS = ("level_prediksi", "ringkasan_perilaku", "alasan", "gap", "rekomendasi", "raw", "context_permenpan", "context_skj")
+
+
+class ResultStore:
+    """Hasil penilaian di Postgres, key = input_hash."""
+
+    def __init__(self, database_url: str):
+        self.engine = create_engine(psycopg3_url(database_url), pool_pre_ping=True)
+        with self.engine.begin() as conn:
+            for stmt in filter(str.strip, SCHEMA_SQL.split(";")):
+                conn.execute(text(stmt))
+
+    def get(self, key: str) -> AssessmentResult | None:
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                text(f"SELECT {', '.join(RESULT_FIELDS)}, chunks_used FROM assessment_results WHERE input_hash = :h"),
+                {"h": key},
+            ).mappings().first()
+        return AssessmentResult(**row, cached=True) if row else None
+
+    def put(self, key: str, mode: str, inputs: dict, result: AssessmentResult, model: str, version: str) -> None:
+        if not result.parsed:
+            return  # output rusak tidak disimpan; klik berikutnya mencoba lagi
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"""
+                    INSERT INTO assessment_results (
+                        input_hash, mode, nama, jabatan, kompetensi, soal_id, level_target,
+                        {', '.join(RESULT_FIELDS)}, chunks_used, inputs, model, template_version
+                    ) VALUES (
+                        :input_hash, :mode, :nama, :jabatan, :kompetensi, :soal_id, :level_target,
+                        {', '.join(':' + f for f in RESULT_FIELDS)}, CAST(:chunks_used AS jsonb), CAST(:inputs AS jsonb),
+                        :model, :template_version
+                    )
+                    ON CONFLICT (input_hash) DO NOTHING
+                    """
+                ),
+                {
+                    "input_hash": key,
+                    "mode": mode,
+                    "nama": inputs.get("nama", ""),
+                    "jabatan": inputs.get("jabatan", ""),
+                    "kompetensi": inputs.get("kompetensi", ""),
+                    "soal_id": inputs.get("soal_id"),
+                    "level_target": int(inputs["level_target"]) if inputs.get("level_target") else None,
+                    **{f: getattr(result, f) for f in RESULT_FIELDS},
+                    "chunks_used": json.dumps(result.chunks_used, ensure_ascii=False, default=str),
+                    "inputs": json.dumps(inputs, ensure_ascii=False, default=str),
+                    "model": model,
+                    "template_version": version,
+                },
+            )
+
+    def history(self, nama: str | None = None, jabatan: str | None = None, kompetensi: str | None = None, limit: int = 100) -> list[dict]:
+        where, params = [], {"limit": limit}
+        for col, val in (("nama", nama), ("jabatan", jabatan), ("kompetensi", kompetensi)):
+            if val:
+                where.append(f"{col} = :{col}")
+                params[col] = val
+        sql = (
+            "SELECT nama, jabatan, kompetensi, mode, soal_id, level_target, level_prediksi, created_at "
+            "FROM assessment_results "
+            + (f"WHERE {' AND '.join(where)} " if where else "")
+            + "ORDER BY created_at DESC LIMIT :limit"
+        )
+        with self.engine.connect() as conn:
+            return [dict(r) for r in conn.execute(text(sql), params).mappings()]
+
+
+_STORE = None
+_STORE_FAILED_AT: float | None = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_result_store() -> ResultStore | None:
+    """Store process-wide; None kalau cache dimatikan atau database tidak tersedia (penilaian tetap jalan)."""
+    global _STORE, _STORE_FAILED_AT
+    if not RESULT_CACHE or not RESULTS_DB_URL:
+        return None
+    with _STORE_LOCK:
+        if _STORE is None:
+            # Database mati: jangan bayar connect timeout di setiap penilaian, tunggu backoff dulu
+            if _STORE_FAILED_AT is not None and time.monotonic() - _STORE_FAILED_AT < RESULT_STORE_RETRY_S:
+                return None
+            try:
+                _STORE = ResultStore(RESULTS_DB_URL)
+            except Exception:
+                _STORE_FAILED_AT = time.monotonic()
+                return None
+        return _STORE
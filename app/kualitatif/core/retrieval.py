@@ -0,0 +1,460 @@
+# core/retrieval.py - retrieval PermenPAN & SKJ sekaligus (bukan berurutan)
+#
+# Mode (env RAG_RETRIEVAL_MODE):
+#   sequential - perilaku lama: dua similarity search PGVector berurutan
+#   async      - query di-embed sekali, lalu pencarian per koleksi jalan bersamaan (SQLAlchemy async + psycopg 3)
+#   sql        - satu statement SQL (UNION ALL per koleksi) yang mengembalikan top-k tiap koleksi
+#   hybrid     - full-text (tsvector) + vektor digabung RRF dalam satu statement, dengan fast path
+#                leksikal tanpa embedding (lihat core/hybrid.py)
+# Mode async & sql memakai ekspresi jarak yang cocok dengan partial index ANN (lihat core/ann.py),
+# plus setting hnsw.ef_search / ivfflat.probes (RAG_HNSW_EF_SEARCH / RAG_IVFFLAT_PROBES).
+#
+# Bandingkan latency:
+#   uv run python -m app.kualitatif.core.retrieval "kemampuan mengambil keputusan" --runs 20
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.kualitatif.core.ann import (
+    QUANTIZATIONS,
+    RESCORE_FACTOR,
+    VECTOR_QUANTIZATION,
+    apply_search_settings_sql,
+    connect_options,
+    distance_expr,
+    rescoring_sql,
+    search_settings,
+    uuid_literal,
+)
+from app.kualitatif.core.db import psycopg3_url
+from app.kualitatif.core.hybrid import (
+    CANDIDATE_POOL,
+    LEXICAL_FASTPATH,
+    RRF_K,
+    anchor_phrase,
+    hybrid_sql,
+    lexical_sql,
+    or_query_text,
+    resolve_text_config,
+    union_sql,
+)
+from app.kualitatif.core.ingest import PERMENPAN_COLLECTION, SKJ_COLLECTION
+from app.kualitatif.core.scope import filter_clause
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("VECTOR_DB_URL")
+RETRIEVAL_MODES = ("sequential", "async", "sql", "hybrid")
+RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "async")
+RETRIEVAL_K = 4
+
+SQL_COLLECTIONS = """
+SELECT c.name, c.uuid::text AS uuid,
+       (SELECT vector_dims(e.embedding) FROM langchain_pg_embedding e WHERE e.collection_id = c.uuid LIMIT 1) AS dim
+FROM langchain_pg_collection c
+WHERE c.name = ANY(:names)
+"""
+
+
+def _order_expr(dim: int | None) -> str:
+    try:
+        return distance_expr(dim)
+    except (TypeError, ValueError):
+        # Dimensi tak diketahui / terlalu besar untuk di-index: jarak eksak pada kolom mentah
+        return "(embedding <=> CAST(:q AS vector))"
+
+
+def _rows_to_docs(rows) -> list[Document]:
+    return [Document(id=str(r.id), page_content=r.document, metadata=r.cmetadata or {}) for r in rows]
+
+
+class _LoopThread:
+    """Event loop asyncio di background thread; engine async terikat ke satu loop yang hidup terus."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="rag-retrieval-loop", daemon=True).start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+class DualCollectionRetriever:
+    """
+    Pencarian ke beberapa koleksi PGVector dengan satu embedding query.
+    `search(query)` -> {collection_name: [Document, ...]}.
+    """
+
+    def __init__(
+        self,
+        database_url: str,
+        embeddings,
+        collections: tuple[str, ...] = (PERMENPAN_COLLECTION, SKJ_COLLECTION),
+        k: int = RETRIEVAL_K,
+        mode: str = RETRIEVAL_MODE,
+        ef_search: int | None = None,
+        probes: int | None = None,
+        lexical_fastpath: bool = LEXICAL_FASTPATH,
+        quantization: str = VECTOR_QUANTIZATION,
+        rescore_factor: int = RESCORE_FACTOR,
+    ):
+        from langchain_postgres import PGVector
+
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"RAG_RETRIEVAL_MODE harus salah satu dari {RETRIEVAL_MODES}, bukan '{mode}'.")
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"RAG_VECTOR_QUANTIZATION harus salah satu dari {QUANTIZATIONS}, bukan '{quantization}'.")
+        self.database_url = psycopg3_url(database_url)
+        self.embeddings = embeddings
+        self.collections = collections
+        self.k = k
+        self.mode = mode
+        self.lexical_fastpath = lexical_fastpath
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.settings = search_settings(**{
+            key: value for key, value in (("ef_search", ef_search), ("probes", probes)) if value is not None
+        })
+        self._settings_sql = apply_search_settings_sql(self.settings)
+        engine_args = {"connect_args": connect_options(self.settings)} if self.settings else None
+        self.stores = {
+            name: PGVector(
+                embeddings=embeddings,
+                collection_name=name,
+                connection=self.database_url,
+                use_jsonb=True,
+                engine_args=engine_args,
+            )
+            for name in collections
+        }
+        self._engine = create_engine(self.database_url, pool_pre_ping=True)
+        self._async_engine = None
+        self._loop = None
+        self._meta: dict[str, dict] = {}
+        self._text_config: str | None = None
+        self._lock = threading.Lock()
+
+    def _collection_meta(self, names) -> dict[str, dict]:
+        """uuid & dimensi per koleksi (sekali per proses)."""
+        missing = [n for n in names if n not in self._meta]
+        if missing:
+            with self._engine.connect() as conn:
+                for r in conn.execute(text(SQL_COLLECTIONS), {"names": missing}).mappings():
+                    self._meta[r["name"]] = dict(r)
+        return {n: self._meta[n] for n in names if n in self._meta}
+
+    def _vector_sql(self, meta: dict, limit_param: str = "k", filter_param: str | None = None) -> str:
+        """Top-:limit_param per koleksi; dengan kuantisasi: kandidat dari index halfvec/biner + skor eksak."""
+        if filter_param:
+            # Irisan metadata: jarak eksak pada kolom mentah (sengaja tidak cocok dengan index ANN),
+            # jadi planner menyaring lewat index GIN dulu, bukan ANN lalu post-filter
+            return (
+                f"SELECT id, document, cmetadata, embedding <=> CAST(:q AS vector) AS distance "
+                f"FROM langchain_pg_embedding WHERE collection_id = {uuid_literal(meta['uuid'])} "
+                f"AND {filter_clause(filter_param)} ORDER BY distance LIMIT :{limit_param}"
+            )
+        if self.quantization != "none" and meta["dim"]:
+            try:
+                return rescoring_sql(meta["uuid"], meta["dim"], self.quantization, limit_param)
+            except ValueError:
+                pass  # dimensi melebihi batas tipe ini -> pencarian biasa
+        return (
+            f"SELECT id, document, cmetadata, {_order_expr(meta['dim'])} AS distance "
+            f"FROM langchain_pg_embedding WHERE collection_id = {uuid_literal(meta['uuid'])} "
+            f"ORDER BY distance LIMIT :{limit_param}"
+        )
+
+    def _collection_sql(self, meta: dict, name_param: str | None = None, filter_param: str | None = None) -> str:
+        label = f"CAST(:{name_param} AS text) AS collection, " if name_param else ""
+        return f"SELECT {label}id, document, cmetadata, distance FROM ({self._vector_sql(meta, 'k', filter_param)}) r"
+
+    @staticmethod
+    def _filter_params(metas: dict[str, dict], filters: dict[str, dict]) -> tuple[list[str | None], dict]:
+        """Nama parameter filter per cabang (f0, f1, ...; None = tanpa filter) + nilainya (JSON)."""
+        names = [f"f{i}" if filters.get(name) else None for i, name in enumerate(metas)]
+        values = {param: json.dumps(filters[name]) for param, name in zip(names, metas) if param}
+        return names, values
+
+    # ---------- mode: sequential ----------
+    def _search_sequential(self, query: str, names, filters: dict[str, dict]) -> dict[str, list[Document]]:
+        return {name: self.stores[name].similarity_search(query, k=self.k, filter=filters.get(name)) for name in names}
+
+    # ---------- mode: async ----------
+    def _ensure_async(self) -> None:
+        if self._async_engine is not None:
+            return
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        with self._lock:
+            if self._async_engine is None:
+                self._loop = _LoopThread()
+                self._async_engine = create_async_engine(self.database_url, pool_pre_ping=True)
+
+    async def _search_one_async(self, meta: dict, literal: str, flt: dict | None) -> list[Document]:
+        params = {"q": literal, "k": self.k, "candidates": self.k * self.rescore_factor}
+        if flt:
+            params["f"] = json.dumps(flt)
+        async with self._async_engine.begin() as conn:
+            if self._settings_sql:
+                await conn.execute(text(self._settings_sql))
+            rows = await conn.execute(text(self._collection_sql(meta, filter_param="f" if flt else None)), params)
+            return _rows_to_docs(rows)
+
+    async def _gather(self, metas: dict[str, dict], literal: str, filters: dict[str, dict]) -> list[list[Document]]:
+        return await asyncio.gather(
+            *(self._search_one_async(meta, literal, filters.get(name)) for name, meta in metas.items())
+        )
+
+    def _search_async(self, query: str, names, filters: dict[str, dict]) -> dict[str, list[Document]]:
+        self._ensure_async()
+        metas = self._collection_meta(names)
+        literal = _vector_literal(self.embeddings.embed_query(query))
+        results = dict(zip(metas, self._loop.run(self._gather(metas, literal, filters))))
+        return {name: results.get(name, []) for name in names}
+
+    # ---------- mode: sql ----------
+    def _search_sql(self, query: str, names, filters: dict[str, dict]) -> dict[str, list[Document]]:
+        metas = self._collection_meta(names)
+        out: dict[str, list[Document]] = {name: [] for name in names}
+        if not metas:
+            return out
+        literal = _vector_literal(self.embeddings.embed_query(query))
+        filter_names, filter_values = self._filter_params(metas, filters)
+        # Top-k per koleksi dalam satu round trip; tiap cabang bisa memakai partial index koleksinya
+        sql = " UNION ALL ".join(
+            f"({self._collection_sql(meta, f'n{i}', filter_names[i])})" for i, meta in enumerate(metas.values())
+        )
+        params = {
+            "q": literal,
+            "k": self.k,
+            "candidates": self.k * self.rescore_factor,
+            **filter_values,
+            **{f"n{i}": name for i, name in enumerate(metas)},
+        }
+        with self._engine.begin() as conn:
+            if self._settings_sql:
+                conn.execute(text(self._settings_sql))
+            rows = conn.execute(text(sql), params).all()
+        for r in rows:
+            out[r.collection].append(_rows_to_docs([r])[0])
+        return out
+
+    # ---------- mode: hybrid ----------
+    def _fts_config(self) -> str:
+        if self._text_config is None:
+            with self._engine.connect() as conn:
+                self._text_config = resolve_text_config(conn)
+        return self._text_config
+
+    def _search_lexical(
+        self, metas: dict[str, dict], config: str, terms: str, anchor: str, filters: dict[str, dict]
+    ) -> dict[str, list[Document]] | None:
+        """
+        Fast path: hasil leksikal saja kalau frasa anchor cocok di >= k chunk pada setiap koleksi
+        (atau di seluruh irisan filter kalau irisannya lebih kecil dari k).
+        """
+        filter_names, filter_values = self._filter_params(metas, filters)
+        sql = union_sql([
+            lexical_sql(meta["uuid"], config, f"n{i}", filter_names[i]) for i, meta in enumerate(metas.values())
+        ])
+        params = {
+            "terms": terms,
+            "anchor": anchor,
+            "k": self.k,
+            **filter_values,
+            **{f"n{i}": name for i, name in enumerate(metas)},
+        }
+        with self._engine.connect() as conn:
+            rows = conn.execute(text(sql), params).all()
+        out: dict[str, list[Document]] = {name: [] for name in metas}
+        needed = {name: self.k for name in metas}
+        for r in rows:
+            out[r.collection].append(_rows_to_docs([r])[0])
+            if r.slice_size is not None:
+                needed[r.collection] = min(self.k, r.slice_size)
+        if all(docs and len(docs) >= needed[name] for name, docs in out.items()):
+            return out
+        return None
+
+    def _search_hybrid(self, query: str, names, filters: dict[str, dict]) -> dict[str, list[Document]]:
+        metas = self._collection_meta(names)
+        out: dict[str, list[Document]] = {name: [] for name in names}
+        terms = or_query_text(query)
+        if not metas or not terms:
+            return self._search_sql(query, names, filters)
+        config = self._fts_config()
+        anchor = anchor_phrase(query)
+        if self.lexical_fastpath and anchor:
+            lexical = self._search_lexical(metas, config, terms, anchor, filters)
+            if lexical is not None:
+                return {**out, **lexical}
+
+        literal = _vector_literal(self.embeddings.embed_query(query))
+        filter_names, filter_values = self._filter_params(metas, filters)
+        sql = union_sql([
+            hybrid_sql(meta["uuid"], config, self._vector_sql(meta, "pool", filter_names[i]), f"n{i}", filter_names[i])
+            for i, meta in enumerate(metas.values())
+        ])
+        params = {
+            "q": literal,
+            "terms": terms,
+            **filter_values,
+            "k": self.k,
+            "pool": self.k * CANDIDATE_POOL,
+            "candidates": self.k * CANDIDATE_POOL * self.rescore_factor,
+            "rrf_k": RRF_K,
+            **{f"n{i}": name for i, name in enumerate(metas)},
+        }
+        with self._engine.begin() as conn:
+            if self._settings_sql:
+                conn.execute(text(self._settings_sql))
+            rows = conn.execute(text(sql), params).all()
+        for r in rows:
+            out[r.collection].append(_rows_to_docs([r])[0])
+        return out
+
+    def _search(self, query: str, names: list[str], mode: str, filters: dict[str, dict]) -> dict[str, list[Document]]:
+        if mode == "async" and len(names) > 1:
+            return self._search_async(query, names, filters)
+        if mode == "sql":
+            return self._search_sql(query, names, filters)
+        if mode == "hybrid":
+            return self._search_hybrid(query, names, filters)
+        return self._search_sequential(query, names, filters)
+
+    def search(self, query: str, names=None, mode: str | None = None, filters: dict[str, dict] | None = None) -> dict[str, list[Document]]:
+        """
+        `filters`: {koleksi: filter metadata} (mis. {"skj_index": {"jabatan": ..., "kompetensi": ...}}).
+        Koleksi yang irisannya kosong dicari ulang tanpa filter.
+        """
+        names = list(names or self.collections)
+        mode = mode or self.mode
+        filters = {name: flt for name, flt in (filters or {}).items() if flt and name in names}
+        results = self._search(query, names, mode, filters)
+        empty = [name for name in filters if not results.get(name)]
+        if empty:
+            results.update(self._search(query, empty, mode, {}))
+        return results
+
+    def retriever(self, name: str) -> "CollectionRetriever":
+        return CollectionRetriever(dual=self, collection=name)
+
+
+def _vector_literal(vector) -> str:
+    return "[" + ",".join(map(str, vector)) + "]"
+
+
+class CollectionRetriever(BaseRetriever):
+    """Retriever LangChain biasa untuk satu koleksi; kalau dipasangkan, `retrieve_pair` mencari keduanya sekaligus."""
+
+    dual: Any
+    collection: str
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, filter: dict | None = None
+    ) -> list[Document]:
+        return self.dual.search(query, [self.collection], mode="sequential", filters={self.collection: filter})[self.collection]
+
+
+_PAIR_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-retrieval")
+
+
+def _invoke_scoped(retriever, query: str, flt: dict | None) -> list[Document]:
+    """invoke dengan filter metadata (diteruskan ke retriever yang menerimanya); irisan kosong -> tanpa filter."""
+    if flt:
+        docs = retriever.invoke(query, filter=flt)
+        if docs:
+            return docs
+    return retriever.invoke(query)
+
+
+def retrieve_pair(query: str, first, second, filters=(None, None)) -> tuple[list[Document], list[Document]]:
+    """
+    Ambil dokumen dari dua retriever sekaligus: wall-time = max kedua pencarian, bukan jumlahnya.
+    Retriever yang berbagi DualCollectionRetriever yang sama dicari lewat satu `search`;
+    retriever lain (atau salah satunya None) dijalankan paralel di thread pool.
+    `filters`: (filter metadata retriever pertama, kedua), lihat core/scope.py.
+    """
+    single = second if first is None else first if second is None else None
+    if single is not None and getattr(single, "dual", None) is not None:
+        # Hanya satu koleksi: tetap lewat `search` supaya mode retrieval (sql/hybrid) terpakai
+        flt = filters[0] if single is first else filters[1]
+        docs = single.dual.search(query, [single.collection], filters={single.collection: flt})[single.collection]
+        return (docs, []) if single is first else ([], docs)
+
+    dual = getattr(first, "dual", None)
+    if dual is not None and dual is getattr(second, "dual", None):
+        res = dual.search(
+            query, [first.collection, second.collection],
+            filters={first.collection: filters[0], second.collection: filters[1]},
+        )
+        return res[first.collection], res[second.collection]
+
+    futures = [
+        _PAIR_POOL.submit(_invoke_scoped, r, query, flt) if r is not None else None
+        for r, flt in zip((first, second), filters)
+    ]
+    docs = [f.result() if f is not None else [] for f in futures]
+    return docs[0], docs[1]
+
+
+# ================== LATENCY COMPARISON ==================
+
+def compare_latency(dual: DualCollectionRetriever, queries: list[str], runs: int = 10) -> dict[str, dict]:
+    """p50/p95/mean (ms) per mode. Embedding di-warmup dulu (cache) supaya yang terukur hanya pencarian DB."""
+    for q in queries:
+        dual.embeddings.embed_query(q)
+        for mode in RETRIEVAL_MODES:
+            dual.search(q, mode=mode)
+
+    report = {}
+    for mode in RETRIEVAL_MODES:
+        timings = []
+        for _ in range(runs):
+            for q in queries:
+                started = time.perf_counter()
+                dual.search(q, mode=mode)
+                timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        report[mode] = {
+            "p50_ms": round(statistics.median(timings), 2),
+            "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+            "mean_ms": round(statistics.fmean(timings), 2),
+            "n": len(timings),
+        }
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Bandingkan latency retrieval PermenPAN + SKJ per mode.")
+    parser.add_argument("queries", nargs="+", help="Query uji")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--k", type=int, default=RETRIEVAL_K)
+    args = parser.parse_args(argv)
+    if not DATABASE_URL:
+        print("VECTOR_DB_URL tidak ditemukan di .env", file=sys.stderr)
+        return 1
+
+    from app.kualitatif.core.embeddings import get_embeddings
+
+    dual = DualCollectionRetriever(DATABASE_URL, get_embeddings(), k=args.k)
+    print(json.dumps(compare_latency(dual, args.queries, args.runs), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
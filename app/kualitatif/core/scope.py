@@ -0,0 +1,116 @@
+# core/scope.py - pre-filter metadata (jabatan / kompetensi / level) untuk retrieval
+#
+# Query penilaian hanya menyebut jabatan & kompetensi sebagai teks, sehingga pencarian vektor
+# menyisir seluruh koleksi. Dengan metadata chunk (lihat core/ingest.py), retrieval membatasi
+# pencarian ke irisan yang relevan: SKJ per (jabatan, kompetensi), PermenPAN per kompetensi.
+# Filter berupa `cmetadata @> '{"kompetensi": ...}'`, didukung partial index GIN (jsonb_path_ops)
+# per koleksi. Jarak pada irisan dihitung eksak (bukan lewat index ANN + post-filter), jadi hasilnya
+# tidak kehilangan recall walau irisannya kecil. Kalau irisan kosong (chunk lama belum ber-metadata,
+# kompetensi di luar PermenPAN), pencarian jatuh kembali ke seluruh koleksi.
+#
+#   uv run python -m app.kualitatif.core.scope create
+#   uv run python -m app.kualitatif.core.scope stats
+import argparse
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+from app.kualitatif.core.ann import collection_info, index_name, uuid_literal
+from app.kualitatif.core.db import psycopg3_url
+from app.kualitatif.core.ingest import PERMENPAN_COLLECTION, SKJ_COLLECTION, canonical_kompetensi
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("VECTOR_DB_URL")
+METADATA_FILTER = os.getenv("RAG_METADATA_FILTER", "1") == "1"
+
+SQL_TAG_STATS = """
+SELECT count(*) AS chunks,
+       count(*) FILTER (WHERE e.cmetadata ? 'jabatan') AS jabatan,
+       count(*) FILTER (WHERE e.cmetadata ? 'kompetensi') AS kompetensi,
+       count(*) FILTER (WHERE e.cmetadata ? 'level') AS level
+FROM langchain_pg_embedding e
+JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+WHERE c.name = :name
+"""
+
+
+def scope_filters(jabatan_name: str, kompetensi_name: str) -> tuple[dict | None, dict | None]:
+    """(filter PermenPAN, filter SKJ) untuk satu penilaian; None = tanpa filter."""
+    if not METADATA_FILTER:
+        return None, None
+    kompetensi = canonical_kompetensi(kompetensi_name)
+    permenpan = {"kompetensi": kompetensi} if kompetensi else None
+    return permenpan, {"jabatan": jabatan_name, "kompetensi": kompetensi_name}
+
+
+def filter_clause(param: str) -> str:
+    """Predikat containment JSONB (memakai index GIN jsonb_path_ops koleksi)."""
+    return f"cmetadata @> CAST(:{param} AS jsonb)"
+
+
+def matches(metadata: dict, flt: dict | None) -> bool:
+    """Versi in-process dari `cmetadata @> filter` (index lokal)."""
+    return not flt or all(str(metadata.get(key)) == str(value) for key, value in flt.items())
+
+
+# ================== INDEX GIN METADATA ==================
+
+def create_metadata_index_sql(collection: str, uuid: str) -> str:
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name(collection, 'meta')} "
+        f"ON langchain_pg_embedding USING gin (cmetadata jsonb_path_ops) "
+        f"WHERE collection_id = {uuid_literal(uuid)}"
+    )
+
+
+def ensure_metadata_index(engine, collection: str, rebuild: bool = False) -> dict:
+    with engine.connect() as conn:
+        info = collection_info(conn, collection)
+    if not info or not info["n_rows"]:
+        return {"collection": collection, "status": "skip (koleksi kosong / tidak ada)"}
+
+    started = time.perf_counter()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if rebuild:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name(collection, 'meta')}"))
+        conn.execute(text(create_metadata_index_sql(collection, info["uuid"])))
+        conn.execute(text("ANALYZE langchain_pg_embedding"))
+    return {
+        "collection": collection,
+        "index": index_name(collection, "meta"),
+        "rows": info["n_rows"],
+        "build_s": round(time.perf_counter() - started, 2),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Index & statistik metadata chunk PermenPAN & SKJ.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_create = sub.add_parser("create", help="Buat / pastikan partial index GIN cmetadata per koleksi")
+    p_create.add_argument("--rebuild", action="store_true")
+    p_stats = sub.add_parser("stats", help="Jumlah chunk yang ber-metadata jabatan / kompetensi / level")
+    for p in (p_create, p_stats):
+        p.add_argument("--collection", nargs="+", default=[PERMENPAN_COLLECTION, SKJ_COLLECTION])
+    args = parser.parse_args(argv)
+    if not DATABASE_URL:
+        print("VECTOR_DB_URL tidak ditemukan di .env", file=sys.stderr)
+        return 1
+
+    engine = create_engine(psycopg3_url(DATABASE_URL))
+    for name in args.collection:
+        if args.command == "create":
+            result = ensure_metadata_index(engine, name, args.rebuild)
+        else:
+            with engine.connect() as conn:
+                result = {"collection": name, **conn.execute(text(SQL_TAG_STATS), {"name": name}).mappings().one()}
+        print(json.dumps(result, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,15 @@ from sqlalchemy import create_engine, text, bindparam
 from sqlalchemy.exc import SQLAlchemyError
 from openai import OpenAI
 
+from app.query.core.examples import ExampleBank, EXAMPLE_TOP_K, EXAMPLE_TOKEN_BUDGET
+from app.query.core.value_index import ColumnValueIndex
+from app.query.core.templates import TemplateEngine
+from app.query.core.executor import PreparedExecutor
+from app.query.core.singleflight import LLM_FLIGHT, QUERY_FLIGHT, question_key, query_key
+from app.query.core.saved import SavedQuestionStore, SavedQuestionRunner, watermark_candidates, INTERVAL_OPTIONS
+from app.query.core.governor import apply_tier, choose_tier, plan_cost, QueryRejected
+from app.query.core.planner_stats import load_planner_stats, enrich_schema, schema_for_prompt, render_planner_hints
+
 import os
 from dotenv import load_dotenv
 
@@ -24,6 +33,13 @@ DEFAULT_ROW_LIMIT   = 100
 SQL_STMT_TIMEOUT_MS = 8000
 EXPLAIN_TIMEOUT_MS  = 5000
 SCHEMA_SNIPPET_CHARS = 60000
+# Eksekusi lewat prepared statement psycopg 3 (plan dipakai ulang untuk SQL yang sama)
+USE_PREPARED_STATEMENTS = os.getenv("NL2SQL_PREPARED", "1") == "1"
+PREPARED_CACHE_SIZE = int(os.getenv("NL2SQL_PREPARED_CACHE_SIZE", "64"))
+# Role read-only khusus untuk SQL hasil LLM (lihat governor.readonly_role_setup_sql)
+READONLY_ROLE = os.getenv("NL2SQL_READONLY_ROLE")
+# Statistik planner (pg_class/pg_index/pg_stats) di-cache, dimuat ulang setelah TTL ini
+PLANNER_STATS_TTL_S = int(os.getenv("NL2SQL_PLANNER_STATS_TTL_S", "600"))
 # ==================================================
 
 # Validasi minimal
@@ -39,6 +55,12 @@ def get_engine():
 
 engine = get_engine()
 
+@st.cache_resource(show_spinner=False)
+def get_prepared_executor():
+    return PreparedExecutor(DATABASE_URL, cache_size=PREPARED_CACHE_SIZE)
+
+prepared_executor = get_prepared_executor() if USE_PREPARED_STATEMENTS else None
+
 # ---------------- Utilities ----------------
 BANNED = re.compile(r"\b(insert|update|delete|alter|drop|truncate|create|grant|revoke|comment|vacuum|analyze)\b", re.I)
 IDENT = r'[A-Za-z_][A-Za-z0-9_$]*'
@@ -75,15 +97,21 @@ def run_explain(sql: str, p: dict):
         conn.execute(text(f"SET statement_timeout = {EXPLAIN_TIMEOUT_MS}"))
         return conn.execute(text("EXPLAIN " + sql), p).all()
 
-def run_query(sql: str, p: dict, limit=DEFAULT_ROW_LIMIT) -> pd.DataFrame:
+def run_query(sql: str, p: dict, limit=DEFAULT_ROW_LIMIT, tier: str = "interactive") -> pd.DataFrame:
     safe_sql = sql if " limit " in sql.lower() else f"{sql} LIMIT {limit}"
-    with engine.connect() as conn:
-        conn.execute(text(f"SET statement_timeout = {SQL_STMT_TIMEOUT_MS}"))
-        rs = conn.execute(text(safe_sql), p)
-        cols = rs.keys()
-        rows = rs.fetchall()
+    # Eksekusi identik yang sedang berjalan (SQL + params + tier sama) dipakai bersama
+    cols, rows = QUERY_FLIGHT.do(query_key(safe_sql, p, tier), _fetch, safe_sql, p, tier)
     return pd.DataFrame(rows, columns=cols)
 
+def _fetch(sql: str, p: dict, tier: str):
+    setup = lambda conn: apply_tier(conn, tier, READONLY_ROLE)
+    if prepared_executor is not None:
+        return prepared_executor.execute(sql, p, setup=setup)
+    with engine.connect() as conn:
+        setup(conn)
+        rs = conn.execute(text(sql), p)
+        return list(rs.keys()), rs.fetchall()
+
 # ---------------- Schema snapshot ----------------
 @st.cache_data(ttl=300, show_spinner=False)
 def coerce_schemas(v):
@@ -140,6 +168,19 @@ def load_schema_snapshot(whitelist_schemas=WHITELIST_SCHEMAS, max_cols=4000):
 
 SCHEMA = load_schema_snapshot()
 
+# Perkaya snapshot dengan statistik planner (estimasi baris, index, partisi, selektivitas).
+# Query katalog tidak dijalankan di setiap rerun Streamlit: hasilnya di-cache selama TTL.
+@st.cache_resource(ttl=PLANNER_STATS_TTL_S, show_spinner=False)
+def get_planner_stats(schemas: tuple) -> dict:
+    try:
+        return load_planner_stats(engine, schemas)
+    except SQLAlchemyError:
+        # Opsional: role tanpa akses katalog tetap bisa jalan tanpa hints
+        return {}
+
+enrich_schema(SCHEMA, get_planner_stats(coerce_schemas(WHITELIST_SCHEMAS)))
+PLANNER_HINTS = render_planner_hints(SCHEMA)
+
 # Index nama_tabel -> set(schema) lowercase
 TABLE_TO_SCHEMAS = defaultdict(set)
 for t in SCHEMA["tables"]:
@@ -346,37 +387,63 @@ Rules:
 - WRONG: employee.CURRENT_DATE or WHERE date = employee.NOW()
 - CORRECT: CURRENT_DATE or WHERE date = NOW()
 
-{ENUM_DOC}
+**Performance (use the table hints below):**
+- Tables marked LARGE must be filtered on indexed columns (idx/PK) whenever the question allows it.
+- Use range predicates on indexed date columns (e.g. hire_date >= '2023-01-01' AND hire_date < '2024-01-01') instead of wrapping the column in functions such as EXTRACT() on LARGE tables.
+- For partitioned tables, include a predicate on the partition key so partitions can be pruned.
+- Avoid leading-wildcard LIKE/ILIKE on LARGE tables; when listing rows from a LARGE table, add ORDER BY on an indexed column and a LIMIT.
 
-Examples:
-1. Single table query:
-   Q: "Show employees hired in 2023"
-   A: {{"sql": "SELECT emp_id, first_name, last_name, hire_date FROM employee.employees WHERE EXTRACT(YEAR FROM hire_date) = 2023", "params": [], "explanation": "Menampilkan daftar karyawan yang bergabung di tahun 2023"}}
+{ENUM_DOC}
 
-2. Join query:
-   Q: "Show employees with their department names"
-   A: {{"sql": "SELECT e.emp_id, e.first_name, d.dept_name FROM employee.employees e JOIN employee.departments d ON e.dept_id = d.dept_id", "params": [], "explanation": "Menampilkan nama karyawan beserta departemen tempat mereka bekerja"}}
+**Table hints (estimated rows; indexes; partition keys; selective / low-cardinality columns):**
+{PLANNER_HINTS}
 
-3. Enum handling:
-   Q: "Show employees who are interns"
-   A: {{"sql": "SELECT emp_id, first_name, last_name, status FROM employee.employees WHERE status = 'intern'", "params": [], "explanation": "Menampilkan daftar karyawan dengan status magang"}}
+SCHEMA: {truncate_for_prompt(json.dumps(schema_for_prompt(SCHEMA)), SCHEMA_SNIPPET_CHARS)}
+"""
 
-4. Current date query:
-   Q: "Show leave requests this year"
-   A: {{"sql": "SELECT emp_id, leave_type, start_date FROM employee.leave_requests WHERE EXTRACT(YEAR FROM start_date) = EXTRACT(YEAR FROM CURRENT_DATE)", "params": [], "explanation": "Menampilkan pengajuan cuti yang diajukan tahun ini"}}
+@st.cache_resource(show_spinner=False)
+def get_example_bank():
+    return ExampleBank()
 
-5. Aggregation query:
-   Q: "How many employees per department?"
-   A: {{"sql": "SELECT d.dept_name, COUNT(e.emp_id) as employee_count FROM employee.employees e JOIN employee.departments d ON e.dept_id = d.dept_id GROUP BY d.dept_id, d.dept_name", "params": [], "explanation": "Menghitung jumlah karyawan di setiap departemen"}}
+example_bank = get_example_bank()
 
-SCHEMA: {truncate_for_prompt(json.dumps(SCHEMA), SCHEMA_SNIPPET_CHARS)}
-"""
+@st.cache_resource(show_spinner=False)
+def get_value_index():
+    return ColumnValueIndex(engine, SCHEMA)
+
+value_index = get_value_index()
+value_index.maybe_refresh()
+
+def build_system_prompt(nl_query: str) -> str:
+    """SYSTEM + nilai kolom yang relevan + contoh few-shot yang paling mirip (dalam budget token)."""
+    parts = [SYSTEM]
+    value_hints = value_index.render_for_prompt(nl_query)
+    if value_hints:
+        parts.append(value_hints)
+    examples = example_bank.render(nl_query, k=EXAMPLE_TOP_K, token_budget=EXAMPLE_TOKEN_BUDGET)
+    if examples:
+        parts.append(examples)
+    return "\n".join(parts)
+
+def ground_values(sql: str, pmap: dict) -> tuple[str, dict, list[dict]]:
+    """Rewrite literal/parameter yang tidak ada di DB ke nilai terdekat dari value index."""
+    sql, notes = value_index.ground_literals(sql)
+    pmap, param_notes = value_index.ground_params(sql, pmap)
+    return sql, pmap, notes + param_notes
+
+def format_value_rewrites(notes: list[dict]) -> str:
+    done = [f"{n['column']}: {n['literal']!r} → {n['rewritten']!r}" for n in notes if n.get("rewritten")]
+    return ("Nilai disesuaikan dengan data — " + "; ".join(done)) if done else ""
+
+def format_value_suggestions(notes: list[dict]) -> str:
+    sugg = [f"{n['column']}: {', '.join(repr(v) for v in n['suggestions'])}" for n in notes if n.get("suggestions")]
+    return ("Mungkin maksud Anda — " + "; ".join(sugg)) if sugg else ""
 
 def llm_propose_sql(nl_query: str) -> dict:
     resp = client.chat.completions.create(
         model=MODEL_NAME,
         messages=[
-            {"role": "system", "content": SYSTEM},
+            {"role": "system", "content": build_system_prompt(nl_query)},
             {"role": "user", "content": nl_query},
         ],
         temperature=0.1,
@@ -390,6 +457,35 @@ def llm_propose_sql(nl_query: str) -> dict:
             raise RuntimeError("LLM tidak mengembalikan JSON yang valid.")
         return json.loads(m.group(0))
 
+@st.cache_resource(show_spinner=False)
+def get_template_engine():
+    return TemplateEngine(SCHEMA, ENUM_INDEX, ENUM_SYNONYMS)
+
+template_engine = get_template_engine()
+
+def propose_sql(nl_query: str) -> dict:
+    """Fast path template (tanpa LLM) untuk pola umum; fallback ke LLM kalau confidence rendah."""
+    args = template_engine.propose(nl_query)
+    if args is not None:
+        return args
+    # Pertanyaan identik yang sedang diproses session lain berbagi satu panggilan LLM
+    args = dict(LLM_FLIGHT.do(question_key(nl_query), llm_propose_sql, nl_query))
+    args.setdefault("source", "llm")
+    return args
+
+def run_saved_sql(sql: str, p: dict, limit: int) -> pd.DataFrame:
+    """Eksekusi untuk pertanyaan tersimpan/terjadwal: EXPLAIN -> tier 'scheduled' -> run."""
+    tier = choose_tier("scheduled", plan_cost(run_explain(sql, p)))
+    return run_query(sql, p, limit=limit, tier=tier)
+
+@st.cache_resource(show_spinner=False)
+def get_saved_runner():
+    runner = SavedQuestionRunner(SavedQuestionStore(), run_saved_sql)
+    runner.start()
+    return runner
+
+saved_runner = get_saved_runner()
+
 # ---------------- UI ----------------
 st.set_page_config(page_title="NL2SQL", page_icon="🧠", layout="wide")
 st.title("🧠 NL2SQL")
@@ -410,6 +506,9 @@ with tab_detail:
             st.write("Schemata terlihat:", schemata)
             st.write(f"Jumlah tabel di {DEFAULT_SCHEMA}:", cnt)
             st.write(f"Tabel terdeteksi oleh snapshot: {len(SCHEMA['tables'])}")
+            if prepared_executor is not None:
+                st.write("Prepared statements (psycopg, server-side):", prepared_executor.stats())
+            st.write("Single-flight (hasil dipakai bersama):", {"llm": LLM_FLIGHT.shared, "query": QUERY_FLIGHT.shared})
         except Exception as e:
             st.error(f"Gagal diagnostik: {e}")
 
@@ -421,18 +520,20 @@ with tab_detail:
     )
 
     if st.button("Jalankan", type="primary", use_container_width=True):
+        # Pasangan pertanyaan->SQL sebelumnya tidak berlaku lagi (run ini bisa gagal di tengah jalan)
+        st.session_state.detail_last = None
         if not q.strip():
             st.warning("Masukkan pertanyaan.")
             st.stop()
 
-        with st.spinner("Menghasilkan SQL dari LLM..."):
+        with st.spinner("Menghasilkan SQL..."):
             try:
-                args = llm_propose_sql(q.strip())
+                args = propose_sql(q.strip())
             except Exception as e:
                 st.error(f"Gagal memanggil LLM: {e}")
                 st.stop()
 
-        with st.expander("LLM raw JSON", expanded=False):
+        with st.expander(f"Raw JSON ({args.get('source', 'llm')})", expanded=False):
             st.code(json.dumps(args, indent=2), language="json")
 
         sql_raw = (args.get("sql") or "").strip()
@@ -464,10 +565,17 @@ with tab_detail:
 
         # Normalize params
         sql_norm, pmap = normalize_params_style(sql_final, params_raw)
+        sql_norm, pmap, value_notes = ground_values(sql_norm, pmap)
         st.markdown("### SQL - normalized untuk eksekusi")
         st.code(sql_norm, language="sql")
         with st.expander("Parameter map"):
             st.json(pmap)
+        if value_notes:
+            rewrites = format_value_rewrites(value_notes)
+            if rewrites:
+                st.info(rewrites)
+            with st.expander("Grounding nilai kolom"):
+                st.json(value_notes)
 
         # EXPLAIN
         with st.spinner("EXPLAIN..."):
@@ -479,12 +587,26 @@ with tab_detail:
                 st.error(f"SQL invalid saat EXPLAIN: {e}")
                 st.stop()
 
+        # Resource tier dari estimasi cost + entry point
+        try:
+            tier = choose_tier("detail", plan_cost(plan))
+        except QueryRejected as e:
+            st.error(str(e))
+            st.stop()
+        st.caption(f"Resource tier: {tier}")
+
         # Eksekusi
         with st.spinner("Menjalankan query..."):
             try:
-                df = run_query(sql_norm, pmap, limit=DEFAULT_ROW_LIMIT)
+                df = run_query(sql_norm, pmap, limit=DEFAULT_ROW_LIMIT, tier=tier)
+                st.session_state.detail_last = {
+                    "question": q.strip(), "sql": sql_final, "params": params_raw, "explanation": explanation,
+                }
                 if df.empty:
                     st.info("Tidak ada hasil.")
+                    suggestion = format_value_suggestions(value_notes)
+                    if suggestion:
+                        st.caption(suggestion)
                 else:
                     st.markdown("### Hasil")
                     st.dataframe(df, use_container_width=True, hide_index=True)
@@ -499,6 +621,15 @@ with tab_detail:
             except SQLAlchemyError as e:
                 st.error(f"DB error: {e}")
 
+    # Simpan pasangan pertanyaan->SQL yang sudah benar ke bank contoh few-shot
+    # Hanya kalau pertanyaan di input masih yang menghasilkan SQL tersebut
+    detail_last = st.session_state.get("detail_last")
+    if detail_last and detail_last["question"] == q.strip():
+        if st.button("👍 Simpan sebagai contoh", key="accept_detail", use_container_width=True):
+            example_bank.add(**detail_last)
+            st.session_state.detail_last = None
+            st.success("Contoh disimpan ke bank few-shot.")
+
 # ========== TAB CHATBOT ==========
 with tab_chat:
     # Initialize loading state
@@ -528,6 +659,44 @@ with tab_chat:
             if st.button(label, key=f"shortcut_{i}", use_container_width=True):
                 st.session_state.selected_shortcut = query
 
+    # Pertanyaan tersimpan: hasil dibaca dari penyimpanan lokal (instan), di-update terjadwal
+    saved_list = saved_runner.store.all()
+    if saved_list:
+        with st.expander(f"⭐ Pertanyaan tersimpan ({len(saved_list)})"):
+            saved_by_id = {sq["id"]: sq for sq in saved_list}
+            sel_id = st.selectbox(
+                "Pilih pertanyaan",
+                options=list(saved_by_id),
+                format_func=lambda sid: saved_by_id[sid]["question"],
+                key="saved_select",
+            )
+            sel = saved_by_id[sel_id]
+            interval_labels = list(INTERVAL_OPTIONS)
+            current = next((k for k, v in INTERVAL_OPTIONS.items() if v == sel["interval_s"]), interval_labels[0])
+            new_label = st.selectbox("Jadwal", interval_labels, index=interval_labels.index(current), key=f"saved_interval_{sel_id}")
+            if INTERVAL_OPTIONS[new_label] != sel["interval_s"]:
+                saved_runner.store.set_interval(sel_id, INTERVAL_OPTIONS[new_label])
+            info = f"Watermark: {sel['watermark_col']} > {sel['watermark_value']}" if sel["watermark_col"] else "Mode: eksekusi penuh"
+            if sel["last_run_at"]:
+                info += " · terakhir dijalankan " + pd.Timestamp(sel["last_run_at"], unit="s").strftime("%Y-%m-%d %H:%M")
+            st.caption(info)
+            if sel["last_error"]:
+                st.warning(f"Run terakhir gagal: {sel['last_error']}")
+            st.dataframe(saved_runner.store.results(sel_id), use_container_width=True, hide_index=True)
+            c_run, c_del = st.columns(2)
+            with c_run:
+                if st.button("🔄 Jalankan sekarang", key=f"saved_run_{sel_id}", use_container_width=True):
+                    try:
+                        saved_runner.run(sel_id)
+                    except Exception as e:
+                        st.error(f"Gagal menjalankan: {e}")
+                    else:
+                        st.rerun()
+            with c_del:
+                if st.button("🗑️ Hapus", key=f"saved_del_{sel_id}", use_container_width=True):
+                    saved_runner.store.delete(sel_id)
+                    st.rerun()
+
     st.markdown("---")
 
     if "chat_messages" not in st.session_state:
@@ -538,7 +707,7 @@ with tab_chat:
     
     with chat_container:
         # render history
-        for m in st.session_state.chat_messages:
+        for i, m in enumerate(st.session_state.chat_messages):
             with st.chat_message(m["role"]):
                 if m["role"] == "assistant" and isinstance(m["content"], dict):
                     # render paket hasil (tanpa SQL dan EXPLAIN untuk chatbot)
@@ -551,6 +720,26 @@ with tab_chat:
                             st.dataframe(pkg["df"], use_container_width=True, hide_index=True)
                         else:
                             st.info("Tidak ada hasil.")
+                    # Feedback: jawaban yang diterima masuk ke bank contoh few-shot
+                    if pkg.get("sql") and not pkg.get("accepted"):
+                        if st.button("👍 Jawaban sesuai", key=f"accept_{i}"):
+                            example_bank.add(pkg["question"], pkg["sql"], pkg.get("params"), pkg.get("text", ""))
+                            pkg["accepted"] = True
+                            st.rerun()
+                    # Simpan sebagai pertanyaan terjadwal (hasil berikutnya incremental bila bisa)
+                    if pkg.get("sql_norm") and not pkg.get("saved"):
+                        if st.button("⭐ Simpan & jadwalkan", key=f"save_{i}"):
+                            saved_id = saved_runner.store.save(
+                                pkg["question"], pkg["sql_norm"], pkg.get("pmap", {}),
+                                watermark_candidates(pkg["sql_norm"], SCHEMA),
+                            )
+                            try:
+                                saved_runner.run(saved_id)
+                            except Exception:
+                                # Error tercatat di last_error dan tampil di panel pertanyaan tersimpan
+                                pass
+                            pkg["saved"] = True
+                            st.rerun()
                 else:
                     st.write(m["content"])
 
@@ -588,7 +777,7 @@ with tab_chat:
             
             # Proses pipeline
             try:
-                args = llm_propose_sql(user_query.strip())
+                args = propose_sql(user_query.strip())
                 sql_raw = (args.get("sql") or "").strip()
                 params_raw = args.get("params", [])
                 explanation = args.get("explanation", "")
@@ -607,10 +796,11 @@ with tab_chat:
                     })
                 else:
                     sql_norm, pmap = normalize_params_style(sql_final, params_raw)
+                    sql_norm, pmap, value_notes = ground_values(sql_norm, pmap)
 
-                    # EXPLAIN (hanya untuk validasi, tidak disimpan)
+                    # EXPLAIN (validasi + estimasi cost untuk resource tier, tidak disimpan)
                     try:
-                        _ = run_explain(sql_norm, pmap)
+                        plan = run_explain(sql_norm, pmap)
                     except SQLAlchemyError as e:
                         st.session_state.chat_messages.append({
                             "role": "assistant",
@@ -622,9 +812,11 @@ with tab_chat:
                         st.rerun()
 
                     # RUN
+                    # Chat hanya boleh tier interactive; query yang lebih mahal ditolak (QueryRejected)
+                    tier = choose_tier("chat", plan_cost(plan))
                     df = None
                     try:
-                        df = run_query(sql_norm, pmap, limit=DEFAULT_ROW_LIMIT)
+                        df = run_query(sql_norm, pmap, limit=DEFAULT_ROW_LIMIT, tier=tier)
                     except SQLAlchemyError as e:
                         st.session_state.chat_messages.append({
                             "role": "assistant",
@@ -638,11 +830,23 @@ with tab_chat:
                     # Render hasil (tanpa SQL dan EXPLAIN)
                     pkg = {
                         "text": explanation or "Berikut hasil query:",
+                        "question": user_query.strip(),
+                        "sql": sql_final,
+                        "params": params_raw,
+                        "sql_norm": sql_norm,
+                        "pmap": pmap,
                     }
                     if isinstance(df, pd.DataFrame):
                         pkg["df"] = df
                     else:
                         pkg["df"] = pd.DataFrame()
+                    rewrites = format_value_rewrites(value_notes)
+                    if rewrites:
+                        pkg["text"] += f"\n\n{rewrites}"
+                    if pkg["df"].empty:
+                        suggestion = format_value_suggestions(value_notes)
+                        if suggestion:
+                            pkg["text"] += f"\n\n{suggestion}"
 
                     st.session_state.chat_messages.append({"role": "assistant", "content": pkg})
 
@@ -0,0 +1,197 @@
+# core/examples.py - bank contoh few-shot (pertanyaan -> SQL) yang sudah diterima user
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+EXAMPLE_DB_PATH = os.getenv("NL2SQL_EXAMPLE_DB", os.path.join(DATA_DIR, "examples.sqlite"))
+EXAMPLE_TOP_K = 3
+EXAMPLE_TOKEN_BUDGET = 600
+
+# BM25 parameter standar
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Contoh awal (dulu di-hardcode di SYSTEM), dipakai untuk mengisi bank yang masih kosong
+SEED_EXAMPLES = [
+    {
+        "question": "Show employees hired in 2023",
+        "sql": "SELECT emp_id, first_name, last_name, hire_date FROM employee.employees WHERE hire_date >= DATE '2023-01-01' AND hire_date < DATE '2024-01-01'",
+        "explanation": "Menampilkan daftar karyawan yang bergabung di tahun 2023",
+    },
+    {
+        "question": "Show employees with their department names",
+        "sql": "SELECT e.emp_id, e.first_name, d.dept_name FROM employee.employees e JOIN employee.departments d ON e.dept_id = d.dept_id",
+        "explanation": "Menampilkan nama karyawan beserta departemen tempat mereka bekerja",
+    },
+    {
+        "question": "Show employees who are interns",
+        "sql": "SELECT emp_id, first_name, last_name, status FROM employee.employees WHERE status = 'intern'",
+        "explanation": "Menampilkan daftar karyawan dengan status magang",
+    },
+    {
+        "question": "Show leave requests this year",
+        "sql": "SELECT emp_id, leave_type, start_date FROM employee.leave_requests WHERE start_date >= date_trunc('year', CURRENT_DATE) AND start_date < date_trunc('year', CURRENT_DATE) + INTERVAL '1 year'",
+        "explanation": "Menampilkan pengajuan cuti yang diajukan tahun ini",
+    },
+    {
+        "question": "How many employees per department?",
+        "sql": "SELECT d.dept_name, COUNT(e.emp_id) as employee_count FROM employee.employees e JOIN employee.departments d ON e.dept_id = d.dept_id GROUP BY d.dept_id, d.dept_name",
+        "explanation": "Menghitung jumlah karyawan di setiap departemen",
+    },
+]
+
+# SQL seed lama (EXTRACT(YEAR ...) tidak bisa memakai index tanggal) -> pengganti range setengah terbuka.
+# Bank yang sudah terisi seed lama ikut diperbarui, selama SQL-nya belum diubah user.
+LEGACY_SEED_SQL = {
+    "SELECT emp_id, first_name, last_name, hire_date FROM employee.employees WHERE EXTRACT(YEAR FROM hire_date) = 2023": SEED_EXAMPLES[0]["sql"],
+    "SELECT emp_id, leave_type, start_date FROM employee.leave_requests WHERE EXTRACT(YEAR FROM start_date) = EXTRACT(YEAR FROM CURRENT_DATE)": SEED_EXAMPLES[3]["sql"],
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9_]+")
+STOPWORDS = {
+    # Indonesia
+    "yang", "di", "ke", "dari", "dan", "atau", "untuk", "dengan", "pada", "ini", "itu",
+    "apa", "siapa", "saja", "tolong", "semua", "berapa", "adalah", "sebagai",
+    # English
+    "the", "a", "an", "of", "in", "on", "for", "to", "and", "or", "with", "is", "are",
+    "what", "who", "which", "show", "me", "all",
+}
+
+
+def tokenize(s: str) -> list[str]:
+    return [t for t in TOKEN_RE.findall((s or "").lower()) if t not in STOPWORDS]
+
+
+def normalize_question(s: str) -> str:
+    return " ".join(TOKEN_RE.findall((s or "").lower()))
+
+
+def estimate_tokens(s: str) -> int:
+    """Estimasi kasar jumlah token (~4 karakter per token)."""
+    return max(1, len(s) // 4)
+
+
+def render_example(i: int, ex: dict) -> str:
+    answer = json.dumps(
+        {"sql": ex["sql"], "params": ex.get("params") or [], "explanation": ex.get("explanation", "")},
+        ensure_ascii=False,
+    )
+    return f'{i}. Q: "{ex["question"]}"\n   A: {answer}'
+
+
+class ExampleBank:
+    """
+    Bank contoh pertanyaan->SQL yang disimpan di SQLite lokal.
+    Indeks leksikal (BM25) disimpan di memori dan di-update setiap ada contoh baru.
+    """
+
+    def __init__(self, path: str = EXAMPLE_DB_PATH, seed: list[dict] | None = SEED_EXAMPLES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS examples (
+                id INTEGER PRIMARY KEY,
+                question TEXT NOT NULL,
+                question_norm TEXT NOT NULL UNIQUE,
+                sql TEXT NOT NULL,
+                params TEXT NOT NULL DEFAULT '[]',
+                explanation TEXT NOT NULL DEFAULT '',
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        if seed and self._conn.execute("SELECT COUNT(*) FROM examples").fetchone()[0] == 0:
+            for ex in seed:
+                self._upsert(ex["question"], ex["sql"], ex.get("params"), ex.get("explanation", ""))
+            self._conn.commit()
+        self._conn.executemany("UPDATE examples SET sql = ? WHERE sql = ?", [(new, old) for old, new in LEGACY_SEED_SQL.items()])
+        self._conn.commit()
+        self._rebuild()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _upsert(self, question: str, sql: str, params, explanation: str) -> None:
+        self._conn.execute(
+            """
+            INSERT INTO examples (question, question_norm, sql, params, explanation, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(question_norm) DO UPDATE SET
+                sql = excluded.sql, params = excluded.params, explanation = excluded.explanation
+            """,
+            (question, normalize_question(question), sql, json.dumps(params or []), explanation or "", time.time()),
+        )
+
+    def _rebuild(self) -> None:
+        rows = self._conn.execute("SELECT id, question, sql, params, explanation FROM examples").fetchall()
+        docs = {}
+        postings = defaultdict(dict)
+        for r in rows:
+            ex = {
+                "question": r["question"],
+                "sql": r["sql"],
+                "params": json.loads(r["params"] or "[]"),
+                "explanation": r["explanation"],
+            }
+            # Indeks pertanyaan saja; SQL ikut sedikit agar nama tabel/kolom juga bisa match
+            terms = tokenize(r["question"]) + tokenize(r["sql"])[:20]
+            ex["_len"] = len(terms) or 1
+            docs[r["id"]] = ex
+            for term, tf in Counter(terms).items():
+                postings[term][r["id"]] = tf
+        self._docs = docs
+        self._postings = postings
+        self._avgdl = (sum(d["_len"] for d in docs.values()) / len(docs)) if docs else 1.0
+
+    def add(self, question: str, sql: str, params=None, explanation: str = "") -> None:
+        """Simpan pasangan pertanyaan->SQL yang diterima user (upsert per pertanyaan)."""
+        if not question.strip() or not sql.strip():
+            return
+        with self._lock:
+            self._upsert(question.strip(), sql.strip(), params, explanation)
+            self._conn.commit()
+            self._rebuild()
+
+    def search(self, question: str, k: int = EXAMPLE_TOP_K) -> list[tuple[float, dict]]:
+        """Top-k contoh paling mirip (BM25) untuk sebuah pertanyaan."""
+        docs, postings, avgdl = self._docs, self._postings, self._avgdl
+        n = len(docs)
+        scores = defaultdict(float)
+        for term in set(tokenize(question)):
+            plist = postings.get(term)
+            if not plist:
+                continue
+            idf = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for doc_id, tf in plist.items():
+                dl = docs[doc_id]["_len"]
+                scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl))
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+        return [(score, docs[doc_id]) for doc_id, score in ranked]
+
+    def select(self, question: str, k: int = EXAMPLE_TOP_K, token_budget: int = EXAMPLE_TOKEN_BUDGET) -> list[dict]:
+        """Ambil contoh teratas yang masih muat di dalam budget token."""
+        chosen, used = [], 0
+        for _, ex in self.search(question, k):
+            cost = estimate_tokens(render_example(len(chosen) + 1, ex))
+            if used + cost > token_budget:
+                continue
+            chosen.append(ex)
+            used += cost
+        return chosen
+
+    def render(self, question: str, k: int = EXAMPLE_TOP_K, token_budget: int = EXAMPLE_TOKEN_BUDGET) -> str:
+        examples = self.select(question, k, token_budget)
+        if not examples:
+            return ""
+        return "Examples:\n" + "\n\n".join(render_example(i, ex) for i, ex in enumerate(examples, start=1))
@@ -0,0 +1,73 @@
+# core/executor.py - eksekusi query dengan server-side prepared statement (psycopg 3)
+# Query yang sama (beda parameter saja) memakai ulang plan yang sudah di-prepare di
+# koneksi tersebut, jadi parse + planning tidak diulang di hot path.
+import re
+import threading
+
+import psycopg
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DBAPIError
+
+# Satu implementasi konversi URL untuk kedua modul (prepare hanya didukung di psycopg 3)
+from app.kualitatif.core.db import psycopg3_url
+
+PREPARED_CACHE_SIZE = 64
+
+# :p1 / :pkey -> %(p1)s, tapi jangan sentuh cast Postgres (::date)
+PARAM_RE = re.compile(r"(?<![:\w]):(\w+)\b")
+
+
+def to_pyformat(sql: str) -> str:
+    """Ubah placeholder gaya SQLAlchemy (:p1) ke gaya psycopg (%(p1)s)."""
+    return PARAM_RE.sub(r"%(\1)s", sql.replace("%", "%%"))
+
+
+class PreparedExecutor:
+    """
+    Executor yang menjalankan SELECT dengan `prepare=True`. Yang di-prepare di server diatur
+    sepenuhnya oleh LRU milik psycopg per koneksi (key: query + tipe parameter, batas
+    `prepared_max`); statement yang ter-evict di-DEALLOCATE oleh psycopg.
+    """
+
+    def __init__(self, database_url: str, cache_size: int = PREPARED_CACHE_SIZE):
+        self.cache_size = cache_size
+        # prepare_threshold=None: tidak ada auto-prepare, hanya query yang kita tandai prepare=True
+        self.engine = create_engine(
+            psycopg3_url(database_url),
+            pool_pre_ping=True,
+            connect_args={"prepare_threshold": None},
+        )
+        event.listen(self.engine, "connect", self._on_connect)
+        self._stats_lock = threading.Lock()
+        self.executions = 0
+
+    def _on_connect(self, dbapi_conn, _record):
+        dbapi_conn.prepared_max = self.cache_size
+
+    def execute(self, sql: str, params: dict, setup=None) -> tuple[list[str], list[tuple]]:
+        """
+        Jalankan SELECT sebagai prepared statement. Return: (nama kolom, rows).
+        `setup(conn)` dipanggil lebih dulu di transaksi yang sama (mis. limit resource governor).
+        """
+        with self.engine.connect() as conn:
+            if setup is not None:
+                setup(conn)
+            query = to_pyformat(sql)
+            with self._stats_lock:
+                self.executions += 1
+            raw = conn.connection.driver_connection
+            try:
+                with raw.cursor() as cur:
+                    cur.execute(query, params or {}, prepare=True)
+                    cols = [d.name for d in cur.description]
+                    rows = cur.fetchall()
+            except psycopg.Error as e:
+                # Samakan dengan jalur text() supaya pemanggil cukup menangkap SQLAlchemyError
+                raise DBAPIError.instance(sql, params, e, psycopg.Error)
+        return cols, rows
+
+    def stats(self) -> dict:
+        """Jumlah eksekusi + statement yang benar-benar ter-prepare di server (satu koneksi pool)."""
+        with self.engine.connect() as conn:
+            prepared = conn.execute(text("SELECT count(*) FROM pg_prepared_statements")).scalar_one()
+        return {"executions": self.executions, "prepared_on_connection": prepared, "prepared_max": self.cache_size}
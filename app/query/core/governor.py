@@ -0,0 +1,120 @@
+# core/governor.py - resource governor per query untuk SQL hasil LLM
+# Setiap query dijalankan di transaksi READ ONLY dengan limit sesi sesuai tier
+# (interactive / export / batch). Tier dipilih dari estimasi cost EXPLAIN dan entry point.
+import re
+
+from sqlalchemy import text
+
+RESOURCE_TIERS = {
+    "interactive": {
+        "max_cost": 100_000,
+        "statement_timeout": "8s",
+        "work_mem": "16MB",
+        "temp_file_limit": "64MB",
+        "lock_timeout": "1s",
+        "idle_in_transaction_session_timeout": "15s",
+    },
+    "export": {
+        "max_cost": 2_000_000,
+        "statement_timeout": "60s",
+        "work_mem": "64MB",
+        "temp_file_limit": "1GB",
+        "lock_timeout": "2s",
+        "idle_in_transaction_session_timeout": "60s",
+    },
+    "batch": {
+        "max_cost": 20_000_000,
+        "statement_timeout": "300s",
+        "work_mem": "128MB",
+        "temp_file_limit": "4GB",
+        "lock_timeout": "5s",
+        "idle_in_transaction_session_timeout": "300s",
+    },
+}
+TIER_ORDER = ["interactive", "export", "batch"]
+
+# entry point -> (tier minimal, tier maksimal yang boleh dipakai)
+ENTRY_POINT_TIERS = {
+    "chat": ("interactive", "interactive"),
+    "detail": ("interactive", "export"),
+    "scheduled": ("export", "batch"),
+}
+
+SESSION_SETTINGS = ("statement_timeout", "work_mem", "lock_timeout", "idle_in_transaction_session_timeout")
+PLAN_COST_RE = re.compile(r"cost=[\d.]+\.\.([\d.]+)")
+
+
+class QueryRejected(RuntimeError):
+    """Query terlalu mahal untuk tier maksimal entry point-nya."""
+
+
+def plan_cost(plan_rows) -> float:
+    """Total cost node teratas dari output EXPLAIN (teks)."""
+    for r in plan_rows:
+        m = PLAN_COST_RE.search(" ".join(map(str, r)))
+        if m:
+            return float(m.group(1))
+    return 0.0
+
+
+def choose_tier(entry_point: str, est_cost: float) -> str:
+    """Tier teringan (>= minimal entry point) yang max_cost-nya cukup untuk estimasi cost."""
+    floor, ceiling = ENTRY_POINT_TIERS.get(entry_point, ("interactive", "interactive"))
+    for name in TIER_ORDER[TIER_ORDER.index(floor):TIER_ORDER.index(ceiling) + 1]:
+        if est_cost <= RESOURCE_TIERS[name]["max_cost"]:
+            return name
+    raise QueryRejected(
+        f"Estimasi cost query ({est_cost:,.0f}) melebihi batas tier '{ceiling}' "
+        f"({RESOURCE_TIERS[ceiling]['max_cost']:,}). Persempit filter, jalankan di tab detail, atau jadwalkan sebagai pertanyaan tersimpan."
+    )
+
+
+def _can_set_temp_file_limit(conn) -> bool:
+    # temp_file_limit hanya bisa di-SET superuser atau role dengan GRANT SET ON PARAMETER (PG15+).
+    # Dicek sekali per koneksi DBAPI.
+    cached = conn.info.get("can_set_temp_file_limit")
+    if cached is None:
+        try:
+            with conn.begin_nested():
+                cached = bool(conn.execute(text("SELECT has_parameter_privilege('temp_file_limit', 'SET')")).scalar())
+        except Exception:
+            cached = bool(conn.execute(text("SELECT rolsuper FROM pg_roles WHERE rolname = current_user")).scalar())
+        conn.info["can_set_temp_file_limit"] = cached
+    return cached
+
+
+def apply_tier(conn, tier: str, readonly_role: str | None = None) -> None:
+    """
+    Terapkan limit tier ke transaksi yang sedang berjalan (SET LOCAL -> hilang saat commit/rollback).
+    Harus dipanggil sebelum query lain di transaksi tersebut.
+    """
+    cfg = RESOURCE_TIERS[tier]
+    conn.execute(text("SET TRANSACTION READ ONLY"))
+    names = list(SESSION_SETTINGS)
+    if _can_set_temp_file_limit(conn):
+        names.append("temp_file_limit")
+    select_list = ", ".join(f"set_config('{n}', :{n}, true)" for n in names)
+    conn.execute(text(f"SELECT {select_list}"), {n: cfg[n] for n in names})
+    if readonly_role:
+        quoted = '"' + readonly_role.replace('"', '""') + '"'
+        conn.execute(text(f"SET LOCAL ROLE {quoted}"))
+
+
+def readonly_role_setup_sql(role: str, schemas, login_role: str) -> str:
+    """DDL (dijalankan sekali oleh DBA) untuk role read-only khusus NL2SQL."""
+    lines = [
+        f'CREATE ROLE "{role}" NOLOGIN;',
+        f'ALTER ROLE "{role}" SET default_transaction_read_only = on;',
+    ]
+    for s in schemas:
+        lines += [
+            f'GRANT USAGE ON SCHEMA "{s}" TO "{role}";',
+            f'GRANT SELECT ON ALL TABLES IN SCHEMA "{s}" TO "{role}";',
+            f'ALTER DEFAULT PRIVILEGES IN SCHEMA "{s}" GRANT SELECT ON TABLES TO "{role}";',
+        ]
+    lines += [
+        f'GRANT "{role}" TO "{login_role}";',
+        "-- PG15+: izinkan login role membatasi temp file per query",
+        f'GRANT SET ON PARAMETER temp_file_limit TO "{login_role}";',
+    ]
+    return "\n".join(lines)
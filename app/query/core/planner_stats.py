@@ -0,0 +1,148 @@
+# core/planner_stats.py - statistik planner (ukuran tabel, index, partisi, selektivitas kolom)
+# untuk memperkaya schema snapshot, supaya LLM tahu tabel mana yang besar dan
+# predikat mana yang bisa memakai index.
+from sqlalchemy import text
+
+LARGE_TABLE_ROWS = 100_000
+LOW_CARDINALITY = 20
+HINT_MAX_ITEMS = 8          # maks. index / kolom yang disebut per daftar
+HINT_MAX_CHARS = 400        # maks. panjang hint per tabel
+
+TABLES_SQL = """
+SELECT n.nspname AS schema, c.relname AS name, c.relkind AS kind,
+       -- reltuples = -1: belum pernah di-VACUUM/ANALYZE -> NULL (tidak diketahui), bukan 0 baris
+       CASE WHEN c.relkind = 'p' THEN
+            (SELECT CASE WHEN count(*) = 0 THEN 0
+                         WHEN bool_or(ch.reltuples < 0) THEN NULL
+                         ELSE SUM(ch.reltuples) END
+             FROM pg_inherits i JOIN pg_class ch ON ch.oid = i.inhrelid WHERE i.inhparent = c.oid)
+            WHEN c.reltuples < 0 THEN NULL
+            ELSE c.reltuples END::bigint AS est_rows,
+       CASE WHEN c.relkind = 'p' THEN pg_get_partkeydef(c.oid) END AS partition_key
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = ANY(:schemas) AND c.relkind IN ('r', 'p', 'm') AND NOT c.relispartition
+"""
+
+INDEXES_SQL = """
+SELECT n.nspname AS schema, t.relname AS table_name, am.amname AS method,
+       ix.indisprimary AS is_primary, ix.indisunique AS is_unique,
+       ARRAY(SELECT pg_get_indexdef(ix.indexrelid, k + 1, true)
+             FROM generate_subscripts(ix.indkey, 1) AS k ORDER BY k) AS columns,
+       pg_get_expr(ix.indpred, ix.indrelid) AS predicate
+FROM pg_index ix
+JOIN pg_class t ON t.oid = ix.indrelid
+JOIN pg_class i ON i.oid = ix.indexrelid
+JOIN pg_am am ON am.oid = i.relam
+JOIN pg_namespace n ON n.oid = t.relnamespace
+WHERE n.nspname = ANY(:schemas) AND ix.indisvalid
+"""
+
+COLUMN_STATS_SQL = """
+SELECT schemaname AS schema, tablename AS table_name, attname AS column_name, n_distinct, null_frac
+FROM pg_stats
+WHERE schemaname = ANY(:schemas)
+"""
+
+
+def load_planner_stats(engine, schemas) -> dict:
+    """Return: {"schema.table": {"est_rows", "partition_key", "indexes", "columns"}}; est_rows None = belum di-analyze."""
+    schemas = list(schemas)
+    stats = {}
+    with engine.connect() as conn:
+        for r in conn.execute(text(TABLES_SQL), {"schemas": schemas}).mappings():
+            stats[f"{r['schema']}.{r['name']}"] = {
+                "est_rows": None if r["est_rows"] is None else int(r["est_rows"]),
+                "partition_key": r["partition_key"],
+                "indexes": [],
+                "columns": {},
+            }
+        for r in conn.execute(text(INDEXES_SQL), {"schemas": schemas}).mappings():
+            t = stats.get(f"{r['schema']}.{r['table_name']}")
+            if t is not None:
+                t["indexes"].append({
+                    "method": r["method"],
+                    "primary": r["is_primary"],
+                    "unique": r["is_unique"],
+                    "columns": list(r["columns"]),
+                    "predicate": r["predicate"],
+                })
+        for r in conn.execute(text(COLUMN_STATS_SQL), {"schemas": schemas}).mappings():
+            t = stats.get(f"{r['schema']}.{r['table_name']}")
+            if t is None:
+                continue
+            n_distinct = r["n_distinct"] or 0
+            # n_distinct negatif = fraksi dari jumlah baris
+            distinct = n_distinct if n_distinct >= 0 else -n_distinct * (t["est_rows"] or 0)
+            t["columns"][r["column_name"]] = {"distinct": int(distinct), "null_frac": round(r["null_frac"] or 0, 3)}
+    return stats
+
+
+def enrich_schema(schema: dict, stats: dict) -> dict:
+    """Tempelkan statistik planner ke setiap tabel di schema snapshot (in place)."""
+    for t in schema["tables"]:
+        s = stats.get(f"{t['schema']}.{t['name']}")
+        if s:
+            t["stats"] = s
+    return schema
+
+
+def schema_for_prompt(schema: dict) -> dict:
+    """Schema snapshot tanpa statistik (statistik dirender terpisah dan lebih ringkas)."""
+    return {"tables": [{k: v for k, v in t.items() if k != "stats"} for t in schema["tables"]]}
+
+
+def _fmt_rows(n: int | None) -> str:
+    if n is None:
+        return "unknown"
+    if n >= 1_000_000:
+        return f"{n / 1_000_000:.1f}M"
+    if n >= 1_000:
+        return f"{n / 1_000:.0f}k"
+    return str(n)
+
+
+def _fmt_index(ix: dict) -> str:
+    cols = ",".join(ix["columns"])
+    kind = "PK" if ix["primary"] else ("unique" if ix["unique"] else ix["method"])
+    out = f"{kind}({cols})"
+    if ix["predicate"]:
+        out += f" WHERE {ix['predicate']}"
+    return out
+
+
+def _capped(items: list[str], limit: int = HINT_MAX_ITEMS) -> str:
+    out = ", ".join(items[:limit])
+    return out + (f", +{len(items) - limit} more" if len(items) > limit else "")
+
+
+def render_planner_hints(schema: dict) -> str:
+    """Satu baris ringkas per tabel (maks. HINT_MAX_CHARS): estimasi baris, index, kunci partisi, kolom selektif."""
+    lines = []
+    for t in schema["tables"]:
+        s = t.get("stats")
+        if not s:
+            continue
+        rows = s["est_rows"]
+        if rows is None:
+            parts = ["rows unknown (not analyzed)"]
+        else:
+            parts = [f"~{_fmt_rows(rows)} rows" + (" (LARGE)" if rows >= LARGE_TABLE_ROWS else "")]
+        if s["partition_key"]:
+            parts.append(f"partitioned by {s['partition_key']}")
+        if s["indexes"]:
+            parts.append("idx: " + _capped([_fmt_index(ix) for ix in s["indexes"]]))
+        else:
+            parts.append("no indexes")
+        cols = s["columns"]
+        selective = [c for c, v in cols.items() if rows and v["distinct"] >= 0.5 * rows]
+        low_card = [f"{c}({v['distinct']})" for c, v in cols.items() if 0 < v["distinct"] <= LOW_CARDINALITY]
+        if selective:
+            parts.append("selective: " + _capped(selective))
+        if low_card:
+            parts.append("low-cardinality: " + _capped(low_card))
+        line = f"{t['schema']}.{t['name']}: " + "; ".join(parts)
+        if len(line) > HINT_MAX_CHARS:
+            line = line[: HINT_MAX_CHARS - 3].rstrip() + "..."
+        lines.append(line)
+    return "\n".join(lines)
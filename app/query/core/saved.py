@@ -0,0 +1,285 @@
+# core/saved.py - pertanyaan tersimpan yang dijalankan terjadwal, dengan hasil incremental
+# Untuk query baris-per-baris pada tabel dengan kolom watermark yang monoton (id, created_at,
+# hire_date), setiap run hanya mengambil baris baru sejak run terakhir lalu di-append ke
+# hasil tersimpan. Query lain (agregasi, top-N) tetap dijalankan penuh dan hasilnya diganti,
+# begitu juga query dengan predikat waktu relatif (CURRENT_DATE, NOW(), INTERVAL, date_trunc):
+# arti "minggu ini" bergeser, jadi baris lama tidak boleh dipertahankan.
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from app.query.core.examples import DATA_DIR
+
+SAVED_DB_PATH = os.getenv("NL2SQL_SAVED_DB", os.path.join(DATA_DIR, "saved_questions.sqlite"))
+SAVED_DEFAULT_INTERVAL_S = 24 * 3600
+SAVED_MAX_ROWS = 50_000          # batas baris tersimpan per pertanyaan (baris terlama dibuang)
+SAVED_INCREMENT_LIMIT = 10_000   # batas baris baru per run incremental
+SCHEDULER_TICK_S = 30
+
+INTERVAL_OPTIONS = {
+    "Setiap jam": 3600,
+    "Harian": 24 * 3600,
+    "Mingguan": 7 * 24 * 3600,
+}
+
+# Urutan prioritas kandidat watermark: timestamp insert, id (sequence), lalu tanggal bisnis
+WATERMARK_NAMES = ("created_at", "inserted_at", "created_date")
+WATERMARK_BUSINESS_DATES = ("hire_date",)
+WATERMARK_TYPES = {"integer", "bigint", "smallint", "date", "timestamp without time zone", "timestamp with time zone"}
+NOT_INCREMENTAL = re.compile(r"\b(group\s+by|limit|offset|distinct|count|sum|avg|min|max|union|intersect|except|window|over)\b", re.I)
+RELATIVE_TIME = re.compile(
+    r"\b(current_date|current_time|current_timestamp|localtime|localtimestamp|interval|date_trunc|"
+    r"now\s*\(|age\s*\(|clock_timestamp|statement_timestamp|transaction_timestamp)",
+    re.I,
+)
+FROM_TABLE = re.compile(r"\bFROM\s+(\w+)\.(\w+)", re.I)
+
+
+def watermark_candidates(sql: str, schema: dict) -> list[str]:
+    """Kolom watermark yang mungkin untuk SQL ini (hanya query baris-per-baris, tanpa agregasi/LIMIT)."""
+    if NOT_INCREMENTAL.search(sql) or RELATIVE_TIME.search(sql):
+        return []
+    m = FROM_TABLE.search(sql)
+    if not m:
+        return []
+    table = next((t for t in schema["tables"] if t["schema"] == m.group(1) and t["name"] == m.group(2)), None)
+    if not table:
+        return []
+    cols = {c["name"]: c for c in table["columns"] if c["type"] in WATERMARK_TYPES}
+    out = [n for n in WATERMARK_NAMES if n in cols]
+    # id: PK integer dari statistik planner, atau nama "id" / "<tabel>_id" / kolom *_id pertama
+    pk_cols = [
+        ix["columns"][0] for ix in table.get("stats", {}).get("indexes", [])
+        if ix["primary"] and len(ix["columns"]) == 1
+    ]
+    for name in pk_cols + ["id"] + [c["name"] for c in table["columns"] if c["name"].endswith("_id")][:1]:
+        if name in cols and cols[name]["type"] in {"integer", "bigint", "smallint"} and name not in out:
+            out.append(name)
+    out += [n for n in WATERMARK_BUSINESS_DATES if n in cols]
+    return out
+
+
+def incremental_sql(sql: str, watermark_col: str) -> str:
+    return (
+        f'SELECT * FROM ({sql}) AS q WHERE q."{watermark_col}" > :wm_last '
+        f'ORDER BY q."{watermark_col}" LIMIT {SAVED_INCREMENT_LIMIT}'
+    )
+
+
+class SavedQuestionStore:
+    """Penyimpanan pertanyaan tersimpan + hasilnya (SQLite lokal)."""
+
+    def __init__(self, path: str = SAVED_DB_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS saved_questions (
+                id INTEGER PRIMARY KEY,
+                question TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                params TEXT NOT NULL DEFAULT '{}',
+                interval_s INTEGER NOT NULL,
+                watermark_candidates TEXT NOT NULL DEFAULT '[]',
+                watermark_col TEXT,
+                watermark_value TEXT,
+                columns TEXT,
+                last_run_at REAL,
+                next_run_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS saved_results (
+                id INTEGER PRIMARY KEY,
+                saved_id INTEGER NOT NULL,
+                row TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_saved_results_saved_id ON saved_results (saved_id, id);
+            CREATE INDEX IF NOT EXISTS ix_saved_questions_next_run ON saved_questions (next_run_at);
+            """
+        )
+        self._conn.commit()
+
+    def save(self, question: str, sql: str, params: dict, candidates: list[str], interval_s: int = SAVED_DEFAULT_INTERVAL_S) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                """
+                INSERT INTO saved_questions (question, sql, params, interval_s, watermark_candidates, next_run_at, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (question, sql, json.dumps(params or {}, default=str), interval_s, json.dumps(candidates), 0, time.time()),
+            )
+            self._conn.commit()
+            return cur.lastrowid
+
+    def all(self) -> list[dict]:
+        rows = self._conn.execute("SELECT * FROM saved_questions ORDER BY created_at DESC").fetchall()
+        return [dict(r) for r in rows]
+
+    def get(self, saved_id: int) -> dict | None:
+        r = self._conn.execute("SELECT * FROM saved_questions WHERE id = ?", (saved_id,)).fetchone()
+        return dict(r) if r else None
+
+    def due(self, now: float) -> list[dict]:
+        rows = self._conn.execute("SELECT * FROM saved_questions WHERE next_run_at <= ?", (now,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def set_interval(self, saved_id: int, interval_s: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE saved_questions SET interval_s = ?, next_run_at = COALESCE(last_run_at, 0) + ? WHERE id = ?",
+                (interval_s, interval_s, saved_id),
+            )
+            self._conn.commit()
+
+    def delete(self, saved_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM saved_results WHERE saved_id = ?", (saved_id,))
+            self._conn.execute("DELETE FROM saved_questions WHERE id = ?", (saved_id,))
+            self._conn.commit()
+
+    def results(self, saved_id: int) -> pd.DataFrame:
+        """Hasil tersimpan (instan, tanpa menyentuh database utama)."""
+        saved = self.get(saved_id)
+        rows = self._conn.execute("SELECT row FROM saved_results WHERE saved_id = ? ORDER BY id", (saved_id,)).fetchall()
+        columns = json.loads(saved["columns"]) if saved and saved["columns"] else None
+        return pd.DataFrame([json.loads(r["row"]) for r in rows], columns=columns)
+
+    def record_run(self, saved: dict, df: pd.DataFrame, replace: bool, watermark_col: str | None, watermark_value) -> None:
+        now = time.time()
+        payload = [json.dumps(list(row), default=str) for row in df.itertuples(index=False, name=None)]
+        with self._lock:
+            if replace:
+                self._conn.execute("DELETE FROM saved_results WHERE saved_id = ?", (saved["id"],))
+            self._conn.executemany(
+                "INSERT INTO saved_results (saved_id, row, fetched_at) VALUES (?, ?, ?)",
+                [(saved["id"], p, now) for p in payload],
+            )
+            # Buang baris terlama kalau melebihi batas
+            self._conn.execute(
+                """
+                DELETE FROM saved_results WHERE saved_id = ? AND id NOT IN (
+                    SELECT id FROM saved_results WHERE saved_id = ? ORDER BY id DESC LIMIT ?
+                )
+                """,
+                (saved["id"], saved["id"], SAVED_MAX_ROWS),
+            )
+            self._conn.execute(
+                """
+                UPDATE saved_questions
+                SET columns = ?, watermark_col = ?, watermark_value = ?, last_run_at = ?, next_run_at = ?, last_error = NULL
+                WHERE id = ?
+                """,
+                (
+                    json.dumps(list(map(str, df.columns))),
+                    watermark_col,
+                    None if watermark_value is None else str(watermark_value),
+                    now,
+                    now + saved["interval_s"],
+                    saved["id"],
+                ),
+            )
+            self._conn.commit()
+
+    def record_error(self, saved: dict, error: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE saved_questions SET last_error = ?, last_run_at = ?, next_run_at = ? WHERE id = ?",
+                (error, now, now + saved["interval_s"], saved["id"]),
+            )
+            self._conn.commit()
+
+
+class SavedQuestionRunner:
+    """
+    Menjalankan pertanyaan tersimpan (manual atau terjadwal di background thread).
+    `execute(sql, params, limit) -> DataFrame` disediakan oleh app (sudah termasuk governor/EXPLAIN).
+    """
+
+    def __init__(self, store: SavedQuestionStore, execute, tick_s: int = SCHEDULER_TICK_S):
+        self.store = store
+        self.execute = execute
+        self.tick_s = tick_s
+        self._run_lock = threading.Lock()
+        self._locks: dict[int, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._thread = None
+
+    def _lock_for(self, saved_id: int) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(saved_id, threading.Lock())
+
+    def run(self, saved_id: int, only_if_due: bool = False) -> pd.DataFrame | None:
+        """
+        Jalankan satu pertanyaan tersimpan. Manual & scheduler memakai lock per pertanyaan, dan
+        watermark dibaca ulang setelah lock didapat -> baris yang sama tidak pernah di-append dua kali.
+        `only_if_due`: lewati (return None) kalau sudah dijalankan sejak dipilih scheduler.
+        """
+        with self._lock_for(saved_id):
+            saved = self.store.get(saved_id)
+            if saved is None:
+                raise ValueError(f"Pertanyaan tersimpan {saved_id} tidak ditemukan.")
+            if only_if_due and saved["next_run_at"] > time.time():
+                return None
+            return self._run_locked(saved)
+
+    def _run_locked(self, saved: dict) -> pd.DataFrame:
+        params = json.loads(saved["params"] or "{}")
+        wm_col, wm_value = saved["watermark_col"], saved["watermark_value"]
+        if RELATIVE_TIME.search(saved["sql"]):
+            wm_col, wm_value = None, None   # pertanyaan lama yang terlanjur incremental -> refresh penuh
+        try:
+            if wm_col and wm_value is not None:
+                # Incremental: hanya baris baru sejak watermark terakhir, di-append.
+                # Catatan: watermark pakai ">" sehingga baris baru dengan nilai watermark yang
+                # sama persis dengan run sebelumnya (mis. hire_date yang sama) tidak terambil.
+                df = self.execute(incremental_sql(saved["sql"], wm_col), {**params, "wm_last": wm_value}, SAVED_INCREMENT_LIMIT)
+                replace = False
+                if not df.empty:
+                    wm_value = df[wm_col].max()
+            else:
+                # Run penuh pertama (atau query non-incremental): hasil diganti seluruhnya
+                df = self.execute(saved["sql"], params, SAVED_MAX_ROWS)
+                replace = True
+                candidates = [c for c in json.loads(saved["watermark_candidates"] or "[]") if c in df.columns]
+                if RELATIVE_TIME.search(saved["sql"]):
+                    candidates = []
+                # Hasil yang terpotong limit tidak bisa dijadikan titik awal watermark
+                wm_col = candidates[0] if candidates and len(df) < SAVED_MAX_ROWS else None
+                wm_value = df[wm_col].max() if wm_col and not df.empty else None
+        except Exception as e:
+            self.store.record_error(saved, str(e))
+            raise
+        self.store.record_run(saved, df, replace, wm_col, wm_value)
+        return df
+
+    def run_due(self) -> None:
+        with self._run_lock:
+            for saved in self.store.due(time.time()):
+                try:
+                    self.run(saved["id"], only_if_due=True)
+                except Exception:
+                    # Error sudah dicatat di last_error; lanjut ke pertanyaan berikutnya
+                    continue
+
+    def start(self) -> None:
+        """Mulai scheduler di background thread (sekali per proses)."""
+        if self._thread is not None:
+            return
+
+        def _loop():
+            while True:
+                self.run_due()
+                time.sleep(self.tick_s)
+
+        self._thread = threading.Thread(target=_loop, name="saved-question-scheduler", daemon=True)
+        self._thread.start()
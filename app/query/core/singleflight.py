@@ -0,0 +1,79 @@
+# core/singleflight.py - penggabungan (coalescing) request identik yang sedang berjalan
+# Kalau banyak session Streamlit menanyakan hal yang sama bersamaan (mis. klik shortcut
+# di awal hari kerja), hanya satu panggilan LLM / eksekusi DB yang benar-benar jalan;
+# yang lain menunggu dan menerima hasil yang sama.
+import json
+import re
+import threading
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Satu eksekusi per key yang sedang in-flight; pemanggil lain untuk key yang sama ikut menunggu."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict = {}
+        self.shared = 0   # jumlah pemanggil yang mendapat hasil dari eksekusi pemanggil lain
+
+    def do(self, key, fn, *args, **kwargs):
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self._calls[key] = call
+                else:
+                    self.shared += 1
+
+            if leader:
+                break
+            call.event.wait()
+            if call.error is None:
+                return call.result
+            if isinstance(call.error, Exception):
+                raise call.error
+            # Leader dihentikan (mis. StopException / RerunException Streamlit di session-nya,
+            # KeyboardInterrupt): bukan kegagalan query, jadi penunggu mengeksekusi ulang sendiri.
+            with self._lock:
+                self.shared -= 1
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # Hapus dulu dari tabel in-flight, baru bangunkan yang menunggu;
+            # request berikutnya (setelah selesai) akan mengeksekusi ulang.
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+
+WS_RE = re.compile(r"\s+")
+
+
+def question_key(question: str) -> tuple:
+    """Key untuk pertanyaan NL: lowercase, whitespace dirapikan, tanda baca akhir dibuang."""
+    return ("question", WS_RE.sub(" ", question.strip().lower()).rstrip(" ?!."))
+
+
+def query_key(sql: str, params, *extra) -> tuple:
+    """Key untuk eksekusi SQL: SQL (whitespace dinormalisasi) + parameter + opsi eksekusi."""
+    return ("query", WS_RE.sub(" ", sql.strip()), json.dumps(params, sort_keys=True, default=str), *extra)
+
+
+# Instance process-wide (modul hanya di-import sekali per proses Streamlit)
+LLM_FLIGHT = SingleFlight()
+QUERY_FLIGHT = SingleFlight()
@@ -0,0 +1,362 @@
+# core/templates.py - fast path tanpa LLM untuk pola pertanyaan analitik yang umum
+# Pola yang dikenali (Indonesia & Inggris):
+#   - list semua X                 "tampilkan semua karyawan", "show all employees"
+#   - X dengan filter enum         "karyawan dengan status tetap", "employees who are interns"
+#   - hitung X (per Y)             "berapa jumlah karyawan di setiap departemen", "count employees per status"
+#   - top N X berdasarkan Y        "10 karyawan dengan gaji tertinggi", "top 5 employees by salary"
+#   - X yang direkrut tahun Z      "karyawan yang direkrut tahun 2023", "employees hired in 2023"
+# Template hanya dipakai kalau semua kata di pertanyaan dipahami; ada satu kata sisa saja atau kata
+# negasi / pengecualian ("tidak", "selain", "not", ...) -> pipeline jatuh ke llm_propose_sql.
+import re
+
+TEMPLATE_MIN_CONFIDENCE = 1.0     # = tidak boleh ada kata sisa
+DEFAULT_TOP_N = 10
+
+WORD_RE = re.compile(r"[a-z0-9_]+")
+YEAR_RE = re.compile(r"\b((?:19|20)\d{2})\b")
+NUMBER_RE = re.compile(r"\b(\d{1,4})\b")
+
+# Kata Indonesia -> kandidat nama tabel (dicocokkan ke schema snapshot)
+TABLE_SYNONYMS = {
+    "karyawan": ["employees", "employee"],
+    "pegawai": ["employees", "employee"],
+    "staf": ["employees", "employee"],
+    "departemen": ["departments", "department"],
+    "divisi": ["departments", "divisions"],
+    "perusahaan": ["companies", "company"],
+    "cuti": ["leave_requests", "leaves"],
+    "jabatan": ["positions", "jobs", "titles"],
+    "proyek": ["projects"],
+    "gaji": ["salaries"],
+}
+
+# Kata -> kandidat nama kolom (dicocokkan ke kolom tabel)
+COLUMN_SYNONYMS = {
+    "gaji": ["salary", "base_salary", "gaji"],
+    "salary": ["salary", "base_salary"],
+    "nama": ["name", "first_name", "full_name"],
+    "umur": ["age"],
+    "usia": ["age"],
+    "status": ["status", "employment_status"],
+    "departemen": ["dept_name", "department", "dept_id"],
+    "department": ["dept_name", "department", "dept_id"],
+    "jabatan": ["title", "position", "job_title"],
+    "tanggal": ["date"],
+    "id": ["id"],
+}
+
+# Kata kerja -> kandidat kolom tanggal
+DATE_VERBS = {
+    "direkrut": ["hire_date", "hired_at", "join_date"],
+    "rekrut": ["hire_date", "hired_at", "join_date"],
+    "bergabung": ["hire_date", "join_date", "joined_at"],
+    "masuk": ["hire_date", "join_date"],
+    "hired": ["hire_date", "hired_at", "join_date"],
+    "joined": ["join_date", "hire_date", "joined_at"],
+    "dibuat": ["created_at", "created_date"],
+    "created": ["created_at", "created_date"],
+    "mulai": ["start_date"],
+    "started": ["start_date"],
+}
+
+DESC_WORDS = {"tertinggi", "terbesar", "terbanyak", "teratas", "tertua", "highest", "largest", "most", "top", "desc", "descending", "terbaru", "latest", "newest"}
+ASC_WORDS = {"terendah", "terkecil", "tersedikit", "termuda", "lowest", "smallest", "least", "asc", "ascending", "terlama", "oldest"}
+COUNT_WORDS = {"berapa", "jumlah", "banyaknya", "count", "many", "total", "hitung"}
+LIST_WORDS = {"tampilkan", "daftar", "list", "show", "lihat", "siapa", "cari", "display", "give"}
+GROUP_WORDS = {"per", "setiap", "tiap", "masing", "each"}
+ORDER_WORDS = {"urutkan", "urut", "sort", "order", "sorted", "ordered"}
+# Negasi / pengecualian membalik arti filter -> selalu serahkan ke LLM
+NEGATION_WORDS = {"tidak", "bukan", "selain", "kecuali", "tanpa", "non", "not", "except", "without", "excluding"}
+DATE_TYPES = {"date", "timestamp without time zone", "timestamp with time zone"}
+
+# Kata "pengisi" yang boleh diabaikan tanpa menurunkan confidence
+FILLER = {
+    "yang", "di", "ke", "dari", "dan", "untuk", "dengan", "pada", "ini", "itu", "apa", "saja", "semua",
+    "seluruh", "tolong", "ada", "adalah", "sedang", "berdasarkan", "secara", "tahun", "orang", "data",
+    "the", "a", "an", "of", "in", "on", "for", "to", "and", "with", "is", "are", "all", "who", "which",
+    "me", "by", "how", "what", "year", "were", "was", "there", "please", "sedang", "kan", "masing",
+}
+
+
+def _words(s: str) -> list[str]:
+    return WORD_RE.findall((s or "").lower())
+
+
+def _singular(w: str) -> str:
+    return w[:-1] if w.endswith("s") and not w.endswith("ss") else w
+
+
+class TemplateEngine:
+    """Intent parser + SQL template engine berbasis schema snapshot dan ENUM_INDEX."""
+
+    def __init__(self, schema: dict, enum_index: dict, synonym_map: dict, min_confidence: float = TEMPLATE_MIN_CONFIDENCE):
+        self.min_confidence = min_confidence
+        self.tables = {}
+        for t in schema["tables"]:
+            key = f"{t['schema']}.{t['name']}"
+            self.tables[key] = {"name": t["name"].lower(), "columns": {c["name"].lower(): c for c in t["columns"]}}
+        # (table_key, kolom) -> {frasa (lowercase) -> nilai enum}
+        self.enum_phrases = {}
+        for (table_key, col), values in enum_index.items():
+            phrases = {}
+            for v in values:
+                phrases[v.lower()] = v
+                for syn in synonym_map.get(v.lower(), []):
+                    phrases[syn.lower()] = v
+            self.enum_phrases[(table_key, col)] = phrases
+
+    # ---------- resolusi nama ----------
+    def resolve_table(self, word: str) -> str | None:
+        for cand in TABLE_SYNONYMS.get(word, []) + [word]:
+            for key, t in self.tables.items():
+                name = t["name"]
+                if name == cand or _singular(name) == _singular(cand) or name.split("_")[0] == _singular(cand):
+                    return key
+        return None
+
+    def resolve_column(self, table_key: str, word: str) -> str | None:
+        cols = self.tables[table_key]["columns"]
+        for cand in COLUMN_SYNONYMS.get(word, []) + [word]:
+            if cand in cols:
+                return cand
+            for c in cols:
+                if cand in c.split("_"):
+                    return c
+        return None
+
+    def _date_column(self, table_key: str, verbs: list[str]) -> str | None:
+        cols = self.tables[table_key]["columns"]
+        for v in verbs:
+            for cand in DATE_VERBS.get(v, []):
+                if cand in cols:
+                    return cand
+        date_cols = [c for c, info in cols.items() if info["type"] in DATE_TYPES]
+        return date_cols[0] if len(date_cols) == 1 else None
+
+    def _label_column(self, table_key: str) -> str | None:
+        cols = self.tables[table_key]["columns"]
+        for c in cols:
+            if c.endswith("_name") or c == "name":
+                return c
+        return None
+
+    def _display_columns(self, table_key: str, extra: list[str]) -> str:
+        cols = list(self.tables[table_key]["columns"])
+        picked = [c for c in cols if c.endswith("_id")][:1]
+        picked += [c for c in cols if "name" in c]
+        picked += [c for c in extra if c]
+        seen = []
+        for c in picked:
+            if c not in seen:
+                seen.append(c)
+        return ", ".join(seen) if len(seen) > 1 else "*"
+
+    def _join_key(self, left: str, right: str) -> str | None:
+        lcols, rcols = self.tables[left]["columns"], self.tables[right]["columns"]
+        shared = [c for c in rcols if c in lcols and c.endswith("_id")]
+        return shared[0] if shared else None
+
+    # ---------- parser ----------
+    def parse(self, question: str) -> dict | None:
+        words = _words(question)
+        if not words or any(w in NEGATION_WORDS for w in words):
+            return None
+        used = set()
+
+        # Entitas utama = kata pertama yang bisa di-resolve ke tabel (bukan target "per Y")
+        group_idx = next((i for i, w in enumerate(words) if w in GROUP_WORDS), None)
+        table_key = None
+        for i, w in enumerate(words):
+            if group_idx is not None and i > group_idx:
+                break
+            table_key = self.resolve_table(w)
+            if table_key:
+                used.add(i)
+                break
+        if not table_key:
+            return None
+
+        intent = "list"
+        if any(w in COUNT_WORDS for w in words) and not any(w in DESC_WORDS | ASC_WORDS for w in words):
+            intent = "count"
+        used |= {i for i, w in enumerate(words) if w in COUNT_WORDS | LIST_WORDS | FILLER}
+
+        filters = []          # (kolom, nilai)
+        explanation_bits = []
+
+        # Filter enum: cocokkan frasa nilai/sinonim di pertanyaan
+        text_q = " ".join(words)
+        for (tkey, col), phrases in self.enum_phrases.items():
+            if tkey != table_key:
+                continue
+            for phrase in sorted(phrases, key=len, reverse=True):
+                m = re.search(rf"\b{re.escape(phrase)}\b", text_q)
+                if m:
+                    filters.append((col, phrases[phrase]))
+                    explanation_bits.append(f"{col} '{phrases[phrase]}'")
+                    start = len(text_q[:m.start()].split())
+                    used |= set(range(start, start + len(phrase.split())))
+                    col_word = next((i for i, w in enumerate(words) if w == col.lower()), None)
+                    if col_word is not None:
+                        used.add(col_word)
+                    break
+
+        # Filter tahun
+        year = None
+        year_col = None
+        for i, w in enumerate(words):
+            if YEAR_RE.fullmatch(w):
+                verbs = [x for x in words if x in DATE_VERBS]
+                year_col = self._date_column(table_key, verbs)
+                if not year_col:
+                    return None
+                year = int(w)
+                used.add(i)
+                used |= {j for j, x in enumerate(words) if x in DATE_VERBS}
+                explanation_bits.append(f"{year_col} di tahun {year}")
+                break
+
+        # Group by (hanya untuk intent count)
+        group = None
+        if group_idx is not None:
+            used.add(group_idx)
+            target_idx = group_idx + 1
+            if target_idx < len(words) and words[target_idx] == "masing":
+                target_idx += 1
+            if target_idx < len(words):
+                target = words[target_idx]
+                used.add(target_idx)
+                gcol = self.resolve_column(table_key, target)
+                gtable = self.resolve_table(target)
+                if gtable and gtable != table_key:
+                    jk = self._join_key(table_key, gtable)
+                    if not jk:
+                        return None
+                    group = ("table", gtable, jk, self._label_column(gtable) or jk)
+                elif gcol:
+                    group = ("column", gcol)
+                else:
+                    return None
+            intent = "count"
+
+        # Top N / urutan
+        order_col, order_dir, limit = None, None, None
+        dir_idx = next((i for i, w in enumerate(words) if w in DESC_WORDS | ASC_WORDS), None)
+        order_idx = next((i for i, w in enumerate(words) if w in ORDER_WORDS), None)
+        if intent != "count" and (dir_idx is not None or order_idx is not None):
+            # kolom urut: kata sebelum kata arah ("gaji tertinggi") atau setelah "by/berdasarkan/urutkan"
+            candidates = []
+            if dir_idx is not None:
+                candidates += [dir_idx - 1, dir_idx + 1]
+                order_dir = "DESC" if words[dir_idx] in DESC_WORDS else "ASC"
+                used.add(dir_idx)
+            if order_idx is not None:
+                used.add(order_idx)
+                candidates += [order_idx + 1, order_idx + 2]
+            for w in ("by", "berdasarkan"):
+                if w in words:
+                    candidates.append(words.index(w) + 1)
+            for i in candidates:
+                if 0 <= i < len(words) and i not in used:
+                    order_col = self.resolve_column(table_key, words[i])
+                    if order_col:
+                        used.add(i)
+                        break
+            if not order_col:
+                return None
+            # arah eksplisit setelah kolom ("company_id ascending")
+            if order_dir is None:
+                order_dir = "ASC"
+            for i, w in enumerate(words):
+                if not YEAR_RE.fullmatch(w) and NUMBER_RE.fullmatch(w) and i not in used:
+                    limit = min(int(w), 1000)
+                    used.add(i)
+                    break
+            if limit is None and dir_idx is not None and words[dir_idx] not in {"asc", "ascending", "desc", "descending"}:
+                limit = DEFAULT_TOP_N
+
+        # Confidence: setiap kata yang tidak dipahami menurunkan confidence (propose butuh 1.0)
+        leftover = [w for i, w in enumerate(words) if i not in used and w not in FILLER]
+        confidence = max(0.0, 1.0 - 0.25 * len(leftover))
+
+        return {
+            "intent": intent,
+            "table": table_key,
+            "filters": filters,
+            "year": (year_col, year) if year else None,
+            "group": group,
+            "order": (order_col, order_dir) if order_col else None,
+            "limit": limit,
+            "confidence": confidence,
+            "leftover": leftover,
+            "explanation_bits": explanation_bits,
+        }
+
+    # ---------- SQL ----------
+    def render(self, parsed: dict) -> dict:
+        tkey = parsed["table"]
+        group = parsed["group"]
+        # Kolom dikualifikasi alias hanya kalau ada JOIN
+        p = "e." if group and group[0] == "table" else ""
+        params = []
+        where = []
+        for col, value in parsed["filters"]:
+            params.append(value)
+            where.append(f"{p}{col} = :p{len(params)}")
+        if parsed["year"]:
+            # Range predicate (bukan EXTRACT) supaya index pada kolom tanggal tetap terpakai
+            col, year = parsed["year"]
+            params += [f"{year}-01-01", f"{year + 1}-01-01"]
+            where.append(f"{p}{col} >= :p{len(params) - 1} AND {p}{col} < :p{len(params)}")
+
+        entity = tkey.split(".")[-1]
+        desc = ""
+        if group and group[0] == "table":
+            _, gtable, jk, label = group
+            sql = (
+                f"SELECT g.{label}, COUNT(*) AS jumlah FROM {tkey} e JOIN {gtable} g ON e.{jk} = g.{jk}"
+                + (f" WHERE {' AND '.join(where)}" if where else "")
+                + f" GROUP BY g.{jk}, g.{label} ORDER BY jumlah DESC"
+            )
+            desc = f"Menghitung jumlah {entity} di setiap {gtable.split('.')[-1]}"
+        elif group:
+            gcol = group[1]
+            sql = (
+                f"SELECT {gcol}, COUNT(*) AS jumlah FROM {tkey}"
+                + (f" WHERE {' AND '.join(where)}" if where else "")
+                + f" GROUP BY {gcol} ORDER BY jumlah DESC"
+            )
+            desc = f"Menghitung jumlah {entity} per {gcol}"
+        elif parsed["intent"] == "count":
+            sql = f"SELECT COUNT(*) AS jumlah FROM {tkey}" + (f" WHERE {' AND '.join(where)}" if where else "")
+            desc = f"Menghitung jumlah {entity}"
+        else:
+            extra = [c for c, _ in parsed["filters"]]
+            if parsed["year"]:
+                extra.append(parsed["year"][0])
+            if parsed["order"]:
+                extra.append(parsed["order"][0])
+            sql = f"SELECT {self._display_columns(tkey, extra)} FROM {tkey}"
+            if where:
+                sql += f" WHERE {' AND '.join(where)}"
+            if parsed["order"]:
+                col, direction = parsed["order"]
+                sql += f" ORDER BY {col} {direction}"
+            if parsed["limit"]:
+                sql += f" LIMIT {parsed['limit']}"
+            desc = f"Menampilkan daftar {entity}"
+            if parsed["order"]:
+                desc += f" diurutkan berdasarkan {parsed['order'][0]}"
+        if parsed["explanation_bits"]:
+            desc += " dengan " + " dan ".join(parsed["explanation_bits"])
+        return {"sql": sql, "params": params, "explanation": desc}
+
+    def propose(self, question: str) -> dict | None:
+        """SQL dari template kalau semua kata dipahami, selain itu None (pakai LLM)."""
+        parsed = self.parse(question)
+        if not parsed or parsed["leftover"] or parsed["confidence"] < self.min_confidence:
+            return None
+        out = self.render(parsed)
+        out["source"] = "template"
+        out["confidence"] = parsed["confidence"]
+        return out
@@ -0,0 +1,302 @@
+# core/value_index.py - indeks nilai distinct kolom teks ber-kardinalitas rendah
+# Dipakai untuk "grounding" literal yang ditulis LLM (mis. dept_name = 'IT')
+# ke nilai yang benar-benar ada di database ('Information Technology').
+import re
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import text
+
+TEXT_TYPES = {"text", "character varying", "character", "citext"}
+VALUE_INDEX_MAX_DISTINCT = 200     # kolom dengan nilai distinct lebih banyak dari ini dilewati
+VALUE_INDEX_TTL_S = 3600           # indeks di-refresh (di background) setelah umur ini
+VALUE_INDEX_SCAN_TIMEOUT_MS = 3000
+VALUE_MATCH_THRESHOLD = 0.45       # similarity trigram minimal untuk hint nilai di prompt
+VALUE_SUGGEST_THRESHOLD = 0.25     # similarity minimal untuk disarankan (fuzzy tidak pernah di-rewrite)
+
+# Hanya predikat positif (= / IN) yang di-ground; `<>`, `!=`, `NOT IN` dibiarkan apa adanya
+LITERAL_EQ = re.compile(r"((?:\w+\.)*(\w+))(\s*=\s*)'((?:[^']|'')*)'", re.I)
+LITERAL_IN = re.compile(r"((?:\w+\.)*(\w+))(\s+IN\s*\()([^)]*)\)", re.I)
+PARAM_EQ = re.compile(r"((?:\w+\.)*(\w+))\s*=\s*:(\w+)\b", re.I)
+TABLE_REF = re.compile(
+    r'\b(?:FROM|JOIN)\s+((?:"?\w+"?\.)?"?\w+"?)'
+    r"(?:\s+(?:AS\s+)?(?!(?:ON|USING|WHERE|JOIN|INNER|LEFT|RIGHT|FULL|CROSS|NATURAL|GROUP|ORDER|LIMIT|HAVING|UNION)\b)(\w+))?",
+    re.I,
+)
+QUOTED = re.compile(r"'((?:[^']|'')*)'")
+WORD_RE = re.compile(r"\w+", re.U)
+QUOTE_CHARS = str.maketrans({"\u2018": "'", "\u2019": "'", "`": "'", "\u201c": '"', "\u201d": '"'})
+
+
+def normalize_value(s: str) -> str:
+    """Bentuk pembanding untuk rewrite otomatis: lowercase, whitespace dirapikan, kutip diseragamkan."""
+    return " ".join((s or "").translate(QUOTE_CHARS).lower().split())
+
+
+def initials(s: str) -> str:
+    return "".join(w[0] for w in WORD_RE.findall(s)).lower()
+
+
+def trigrams(s: str) -> set[str]:
+    """Trigram ala pg_trgm: per kata, lowercase, diberi padding 2 spasi di depan dan 1 di belakang."""
+    grams = set()
+    for w in WORD_RE.findall((s or "").lower()):
+        padded = f"  {w} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def table_refs(sql: str) -> dict[str, str]:
+    """alias / nama tabel (lowercase) -> nama tabel seperti ditulis di FROM / JOIN (tanpa quote)."""
+    refs = {}
+    for m in TABLE_REF.finditer(sql):
+        name = m.group(1).replace('"', "").lower()
+        refs[name] = name
+        refs[name.rsplit(".", 1)[-1]] = name
+        if m.group(2):
+            refs[m.group(2).lower()] = name
+    return refs
+
+
+def similarity(a: set[str], b: set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class ColumnValueIndex:
+    """
+    Indeks lokal nilai distinct untuk kolom teks ber-kardinalitas rendah.
+    Dicari dengan trigram similarity (inverted index trigram -> nilai) sehingga cepat
+    walaupun ada ribuan nilai. Nilai dikunci per (schema.tabel, kolom): kolom bernama sama
+    di tabel berbeda punya kosakata sendiri.
+    """
+
+    def __init__(self, engine, schema: dict, max_distinct: int = VALUE_INDEX_MAX_DISTINCT, ttl_s: int = VALUE_INDEX_TTL_S):
+        self.engine = engine
+        self.schema = schema
+        self.max_distinct = max_distinct
+        self.ttl_s = ttl_s
+        self.refreshed_at = 0.0
+        self._refreshing = threading.Lock()
+        self._swap(defaultdict(list))
+
+    # ---------- build ----------
+    def _candidate_columns(self) -> list[tuple[str, str, str]]:
+        cols = []
+        for t in self.schema["tables"]:
+            for c in t["columns"]:
+                if c["type"] in TEXT_TYPES and "enum_values" not in c:
+                    cols.append((t["schema"], t["name"], c["name"]))
+        return cols
+
+    def _load_stats(self, conn) -> dict:
+        """n_distinct dari pg_stats supaya kolom ber-kardinalitas tinggi tidak perlu di-scan."""
+        schemas = sorted({t["schema"] for t in self.schema["tables"]})
+        if not schemas:
+            return {}
+        rows = conn.execute(
+            text(
+                """
+                SELECT s.schemaname, s.tablename, s.attname, s.n_distinct, c.reltuples
+                FROM pg_stats s
+                JOIN pg_namespace n ON n.nspname = s.schemaname
+                JOIN pg_class c ON c.relnamespace = n.oid AND c.relname = s.tablename
+                WHERE s.schemaname = ANY(:schemas)
+                """
+            ),
+            {"schemas": schemas},
+        ).all()
+        stats = {}
+        for schema, table, col, n_distinct, reltuples in rows:
+            # n_distinct negatif = fraksi dari jumlah baris
+            est = n_distinct if n_distinct >= 0 else -n_distinct * max(reltuples, 0)
+            stats[(schema, table, col)] = est
+        return stats
+
+    def refresh(self) -> None:
+        values = defaultdict(list)
+        with self.engine.connect() as conn:
+            conn.execute(text(f"SET statement_timeout = {VALUE_INDEX_SCAN_TIMEOUT_MS}"))
+            stats = self._load_stats(conn)
+            for schema, table, col in self._candidate_columns():
+                est = stats.get((schema, table, col))
+                if est is not None and est > self.max_distinct:
+                    continue
+                try:
+                    rows = conn.execute(
+                        text(f'SELECT DISTINCT "{col}" FROM "{schema}"."{table}" WHERE "{col}" IS NOT NULL LIMIT :lim'),
+                        {"lim": self.max_distinct + 1},
+                    ).scalars().all()
+                except Exception:
+                    conn.rollback()
+                    conn.execute(text(f"SET statement_timeout = {VALUE_INDEX_SCAN_TIMEOUT_MS}"))
+                    continue
+                if len(rows) > self.max_distinct:
+                    continue
+                values[(f"{schema}.{table}".lower(), col.lower())].extend(str(v) for v in rows)
+        self._swap(values)
+        self.refreshed_at = time.time()
+
+    def _swap(self, values: dict) -> None:
+        entries = []
+        grams_index = defaultdict(list)
+        by_col = defaultdict(list)
+        tables_by_col = defaultdict(list)
+        for (table_key, col), items in values.items():
+            tables_by_col[col].append(table_key)
+            for v in items:
+                idx = len(entries)
+                grams = trigrams(v)
+                entries.append((table_key, col, v, grams))
+                by_col[(table_key, col)].append(idx)
+                for g in grams:
+                    grams_index[g].append(idx)
+        # Swap atomik: reader lama tetap memakai snapshot lama
+        self._entries, self._grams_index, self._by_col, self._tables_by_col = entries, grams_index, by_col, tables_by_col
+
+    def maybe_refresh(self) -> None:
+        """Refresh di background thread kalau indeks sudah kadaluarsa; query tetap dilayani indeks lama."""
+        if time.time() - self.refreshed_at < self.ttl_s:
+            return
+        if not self._refreshing.acquire(blocking=False):
+            return
+
+        def _run():
+            try:
+                self.refresh()
+            except Exception:
+                # Gagal refresh tidak boleh mengganggu pipeline; coba lagi setelah TTL berikutnya
+                self.refreshed_at = time.time()
+            finally:
+                self._refreshing.release()
+
+        threading.Thread(target=_run, daemon=True).start()
+
+    # ---------- lookup ----------
+    def resolve(self, ref: str, col: str, refs: dict[str, str]) -> tuple[str, str] | None:
+        """
+        Kunci (schema.tabel, kolom) untuk referensi kolom di SQL (`ref` = `alias.kolom` / `kolom`).
+        None kalau kolom tidak terindeks atau tabelnya tidak bisa dipastikan.
+        """
+        col = col.lower()
+        tables = self._tables_by_col.get(col, [])
+        qualifier = ref[: -len(col)].rstrip(".").lower() if "." in ref else ""
+        if qualifier:
+            names = {refs.get(qualifier, refs.get(qualifier.rsplit(".", 1)[-1], qualifier))}
+        else:
+            # Kolom tanpa alias: ambil dari tabel di FROM / JOIN (atau satu-satunya tabel yang punya kolom itu)
+            names = set(refs.values()) or set(tables)
+        hits = [t for t in tables if t in names or t.split(".", 1)[-1] in names]
+        return (hits[0], col) if len(hits) == 1 else None
+
+    def match(self, key: tuple[str, str], literal: str, limit: int = 3) -> list[tuple[str, float]]:
+        """Nilai kolom (schema.tabel, kolom) yang paling mirip dengan literal, urut dari skor tertinggi."""
+        entries = self._entries
+        q = trigrams(literal)
+        scored = {}
+        for idx in self._by_col.get(key, []):
+            _, _, v, grams = entries[idx]
+            score = similarity(q, grams)
+            # Singkatan (mis. 'IT' -> 'Information Technology') tidak punya trigram yang sama
+            abbr = initials(v)
+            if len(abbr) > 1 and abbr == literal.strip().lower():
+                score = max(score, VALUE_MATCH_THRESHOLD + 0.05)
+            if score > scored.get(v, 0.0):
+                scored[v] = score
+        return sorted(scored.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+
+    def _ground_one(self, key: tuple[str, str], literal: str, notes: list) -> str:
+        """
+        Rewrite hanya kalau literal jelas menunjuk satu nilai: sama setelah normalisasi
+        (huruf besar/kecil, whitespace, kutip) atau singkatan dari inisialnya ('IT').
+        Kemiripan trigram saja tidak cukup ('Engineer' bukan 'Software Engineer'): hanya disarankan.
+        """
+        col = key[1]
+        raw = literal.replace("''", "'")
+        values = {self._entries[idx][2] for idx in self._by_col.get(key, [])}
+        if raw in values or "%" in raw:
+            return literal
+        norm = normalize_value(raw)
+        exact = [v for v in values if normalize_value(v) == norm]
+        if not exact and len(norm) > 1 and " " not in norm:
+            exact = [v for v in values if initials(v) == norm]
+        if len(exact) == 1:
+            notes.append({"column": col, "literal": raw, "rewritten": exact[0]})
+            return exact[0].replace("'", "''")
+        candidates = self.match(key, raw)
+        suggestions = [v for v, s in candidates if s >= VALUE_SUGGEST_THRESHOLD]
+        if suggestions:
+            notes.append({"column": col, "literal": raw, "suggestions": suggestions})
+        return literal
+
+    def ground_literals(self, sql: str) -> tuple[str, list[dict]]:
+        """
+        Rewrite literal di `col = '...'` dan `col IN (...)` ke nilai yang ada di DB.
+        Return: (sql baru, catatan rewrite/saran).
+        """
+        notes = []
+        if not self._by_col:
+            return sql, notes
+        refs = table_refs(sql)
+
+        def _eq(m):
+            key = self.resolve(m.group(1), m.group(2), refs)
+            if key is None:
+                return m.group(0)
+            return f"{m.group(1)}{m.group(3)}'{self._ground_one(key, m.group(4), notes)}'"
+
+        def _in(m):
+            key = self.resolve(m.group(1), m.group(2), refs)
+            if key is None:
+                return m.group(0)
+            body = QUOTED.sub(lambda q: f"'{self._ground_one(key, q.group(1), notes)}'", m.group(4))
+            return f"{m.group(1)}{m.group(3)}{body})"
+
+        sql = LITERAL_EQ.sub(_eq, sql)
+        sql = LITERAL_IN.sub(_in, sql)
+        return sql, notes
+
+    def ground_params(self, sql: str, pmap: dict) -> tuple[dict, list[dict]]:
+        """Sama seperti ground_literals, tapi untuk nilai parameter `col = :p1`."""
+        notes = []
+        if not self._by_col or not pmap:
+            return pmap, notes
+        pmap = dict(pmap)
+        refs = table_refs(sql)
+        for m in PARAM_EQ.finditer(sql):
+            col_key, key = self.resolve(m.group(1), m.group(2), refs), m.group(3)
+            if col_key is not None and isinstance(pmap.get(key), str):
+                pmap[key] = self._ground_one(col_key, pmap[key].replace("'", "''"), notes).replace("''", "'")
+        return pmap, notes
+
+    def candidates_for_question(self, question: str, limit: int = 12, threshold: float = VALUE_MATCH_THRESHOLD) -> list[tuple[str, str, str]]:
+        """Nilai kolom yang disebut (mirip) di pertanyaan, untuk dimasukkan ke prompt: (table, column, value)."""
+        entries, grams_index = self._entries, self._grams_index
+        if not entries:
+            return []
+        words = WORD_RE.findall((question or "").lower())
+        best = {}
+        # n-gram kata 1..3 dari pertanyaan dibandingkan ke semua nilai lewat inverted index trigram
+        for n in (1, 2, 3):
+            for i in range(len(words) - n + 1):
+                q = trigrams(" ".join(words[i:i + n]))
+                shared = defaultdict(int)
+                for g in q:
+                    for idx in grams_index.get(g, ()):
+                        shared[idx] += 1
+                for idx, cnt in shared.items():
+                    score = cnt / (len(q) + len(entries[idx][3]) - cnt)
+                    if score >= threshold and score > best.get(idx, 0.0):
+                        best[idx] = score
+        ranked = sorted(best.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+        return [(entries[idx][0], entries[idx][1], entries[idx][2]) for idx, _ in ranked]
+
+    def render_for_prompt(self, question: str, limit: int = 12) -> str:
+        hits = self.candidates_for_question(question, limit)
+        if not hits:
+            return ""
+        lines = [f"  {table}.{col} = '{value}'" for table, col, value in hits]
+        return "**Known column values matching the question (use these exact literals):**\n" + "\n".join(lines)
@@ -0,0 +1,110 @@
+# Paritas jalur NumPy index lokal (core/local_index.py) tanpa Postgres & API embedding:
+# korpus sintetis di-embed dengan HashingEmbeddings (core/bench.py) lalu ditulis ke direktori sementara.
+import random
+
+import numpy as np
+import pytest
+
+from app.kualitatif.core.bench import HashingEmbeddings
+from app.kualitatif.core.local_index import LocalVectorIndex, quantize_int8, write_index
+
+COLLECTION = "skj_index"
+JABATAN = ["Analis Kebijakan", "Pranata Komputer", "Auditor", "Perencana"]
+KOMPETENSI = ["Integritas", "Kerjasama", "Komunikasi", "Orientasi pada Hasil", "Pengambilan Keputusan"]
+WORDS = (
+    "menyusun laporan anggaran koordinasi tim pelayanan publik evaluasi program data sistem informasi "
+    "keputusan risiko target kinerja jujur aturan konsisten negosiasi konflik rapat presentasi audit "
+    "temuan rekomendasi perencanaan strategi inovasi pengawasan mentoring umpan balik prioritas"
+).split()
+QUERIES = [
+    "menyusun laporan anggaran",
+    "koordinasi tim dan konflik",
+    "keputusan berisiko dengan data terbatas",
+    "pelayanan publik yang jujur",
+    "audit temuan dan rekomendasi",
+    "target kinerja unit",
+    "presentasi hasil evaluasi program",
+    "mentoring dan umpan balik",
+]
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = random.Random(7)
+    ids, documents, metadatas = [], [], []
+    for i in range(240):
+        jabatan, kompetensi = rng.choice(JABATAN), rng.choice(KOMPETENSI)
+        ids.append(f"chunk-{i}")
+        documents.append(f"{kompetensi} {jabatan}: " + " ".join(rng.choices(WORDS, k=12)))
+        metadatas.append({"jabatan": jabatan, "kompetensi": kompetensi})
+    embeddings = HashingEmbeddings()
+    vectors = np.asarray(embeddings.embed_documents(documents), dtype=np.float32)
+    return embeddings, ids, documents, metadatas, vectors
+
+
+@pytest.fixture(scope="module")
+def indexes(corpus, tmp_path_factory):
+    embeddings, ids, documents, metadatas, vectors = corpus
+    out = {}
+    for dtype in ("float32", "int8"):
+        directory = str(tmp_path_factory.mktemp(dtype))
+        write_index(directory, COLLECTION, ids, documents, metadatas, vectors, dtype=dtype, model=embeddings.model_name)
+        out[dtype] = LocalVectorIndex(directory, COLLECTION, expected_model=embeddings.model_name)
+    return out
+
+
+def _brute_force(vectors: np.ndarray, query, rows: list[int], k: int) -> list[tuple[int, float]]:
+    q = np.asarray(query, dtype=np.float32)
+    q = q / np.linalg.norm(q)
+    sims = {i: float(vectors[i] @ q / np.linalg.norm(vectors[i])) for i in rows}
+    return sorted(sims.items(), key=lambda kv: kv[1], reverse=True)[:k]
+
+
+def test_quantize_int8_round_trip_error():
+    matrix = np.random.default_rng(0).normal(size=(64, 128)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    q, scales = quantize_int8(matrix)
+    restored = q.astype(np.float32) * scales[:, None]
+
+    assert q.dtype == np.int8 and scales.shape == (64,)
+    # Galat per elemen paling besar setengah langkah kuantisasi baris itu
+    assert np.all(np.abs(restored - matrix) <= scales[:, None] / 2 + 1e-6)
+    cosine = np.sum(restored * matrix, axis=1) / np.linalg.norm(restored, axis=1)
+    assert cosine.min() > 0.999
+
+
+def test_int8_top_k_agrees_with_float32(corpus, indexes):
+    embeddings = corpus[0]
+    k = 5
+    overlaps, top1 = [], []
+    for query in QUERIES:
+        vector = embeddings.embed_query(query)
+        exact = [pos for pos, _ in indexes["float32"].search_by_vector(vector, k)]
+        quant = [pos for pos, _ in indexes["int8"].search_by_vector(vector, k)]
+        overlaps.append(len(set(exact) & set(quant)) / k)
+        top1.append(exact[0] == quant[0])
+
+    assert np.mean(overlaps) >= 0.9
+    assert np.mean(top1) >= 0.85
+
+
+def test_filtered_search_matches_brute_force(corpus, indexes):
+    embeddings, _, _, metadatas, vectors = corpus
+    index = indexes["float32"]
+    flt = {"jabatan": "Auditor", "kompetensi": "Integritas"}
+    rows = [i for i, m in enumerate(metadatas) if m["jabatan"] == "Auditor" and m["kompetensi"] == "Integritas"]
+    assert rows
+
+    for query in QUERIES:
+        vector = embeddings.embed_query(query)
+        for k in (3, len(rows) + 5):
+            got = index.search_by_vector(vector, k, flt)
+            expected = _brute_force(vectors, vector, rows, k)
+            assert [pos for pos, _ in got] == [pos for pos, _ in expected]
+            np.testing.assert_allclose([s for _, s in got], [s for _, s in expected], rtol=1e-5, atol=1e-6)
+            assert all(metadatas[pos]["jabatan"] == "Auditor" for pos, _ in got)
+
+
+def test_filtered_search_empty_slice(corpus, indexes):
+    vector = corpus[0].embed_query(QUERIES[0])
+    assert indexes["float32"].search_by_vector(vector, 4, {"jabatan": "Tidak Ada"}) == []